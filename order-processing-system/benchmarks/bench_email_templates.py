@@ -0,0 +1,299 @@
+"""Compare notification rendering throughput before and after precompiled templates.
+
+Renders every event type through the current SNSNotifier and through a
+verbatim copy of the renderer it replaced, checks both produce identical
+emails, then reports renders per second for growing item lists. Each
+simulated order renders the four notifications a successful order sends.
+
+    python benchmarks/bench_email_templates.py --items 0 10 100 1000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ecs-processor" / "app"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import notifier  # noqa: E402
+from notifier import SNSNotifier  # noqa: E402
+
+LIFECYCLE = ["PROCESSING", "PAYMENT_CONFIRMED", "FULFILLED", "COMPLETED"]
+EVENT_TYPES = ["ORDER_CREATED", "PROCESSING", "PAYMENT_CONFIRMED", "PAYMENT_FAILED", "FULFILLED", "COMPLETED", "CANCELLED", "FAILED", "REFUNDED"]
+
+
+class LegacyTemplates:
+    # Verbatim copy of SNSNotifier's renderer before templates were precompiled
+    def _format_email_body(
+        self,
+        order_id: str,
+        event_type: str,
+        message: str,
+        customer_name: str = None,
+        customer_email: str = None,
+        items: List[Dict] = None,
+        total_amount: float = None,
+        attributes: Optional[dict] = None
+    ) -> str:
+        timestamp = datetime.utcnow().strftime("%B %d, %Y at %I:%M %p UTC")
+        
+        status_emoji = {
+            "ORDER_CREATED": "🛒",
+            "PROCESSING": "⚙️",
+            "PAYMENT_CONFIRMED": "💳",
+            "PAYMENT_FAILED": "❌",
+            "FULFILLED": "📦",
+            "COMPLETED": "✅",
+            "CANCELLED": "🚫",
+            "FAILED": "⚠️"
+        }
+        
+        status_title = {
+            "ORDER_CREATED": "Order Received",
+            "PROCESSING": "Order Processing",
+            "PAYMENT_CONFIRMED": "Payment Confirmed",
+            "PAYMENT_FAILED": "Payment Failed",
+            "FULFILLED": "Order Shipped",
+            "COMPLETED": "Order Completed",
+            "CANCELLED": "Order Cancelled",
+            "FAILED": "Order Issue"
+        }
+        
+        status_message = {
+            "ORDER_CREATED": "We've received your order and it's being prepared for processing.",
+            "PROCESSING": "Your order is now being processed. We'll update you on the progress.",
+            "PAYMENT_CONFIRMED": "Great news! Your payment has been successfully processed.",
+            "PAYMENT_FAILED": "Unfortunately, we couldn't process your payment. Please check your payment details.",
+            "FULFILLED": "Your order has been packed and is on its way!",
+            "COMPLETED": "Your order has been completed successfully. Thank you for your purchase!",
+            "CANCELLED": "Your order has been cancelled as requested.",
+            "FAILED": "We encountered an issue with your order. Our team is looking into it."
+        }
+        
+        emoji = status_emoji.get(event_type, "📋")
+        title = status_title.get(event_type, "Order Update")
+        friendly_message = status_message.get(event_type, message)
+        
+        # Header
+        email_body = f"""
+╔══════════════════════════════════════════════════════════════╗
+                    {emoji} {title.upper()} {emoji}
+╚══════════════════════════════════════════════════════════════╝
+
+"""
+        
+        # Customer greeting
+        if customer_name:
+            email_body += f"Hello {customer_name},\n\n"
+        else:
+            email_body += "Hello,\n\n"
+        
+        email_body += f"{friendly_message}\n\n"
+        
+        # Order details box
+        email_body += f"""
+┌──────────────────────────────────────────────────────────────┐
+│                      ORDER DETAILS                           │
+├──────────────────────────────────────────────────────────────┤
+│  Order Number:  #{order_id[:8].upper()}                              
+│  Order Date:    {timestamp}
+│  Status:        {title}
+"""
+        if customer_email:
+            email_body += f"│  Email:         {customer_email}\n"
+        
+        email_body += "└──────────────────────────────────────────────────────────────┘\n"
+        
+        # Items table
+        if items and len(items) > 0:
+            email_body += """
+┌──────────────────────────────────────────────────────────────┐
+│                       ORDER ITEMS                            │
+├──────────────────────────────────────────────────────────────┤
+"""
+            for item in items:
+                product_name = item.get('product_name', 'Unknown Item')
+                quantity = item.get('quantity', 1)
+                unit_price = item.get('unit_price', 0)
+                subtotal = item.get('subtotal', quantity * unit_price)
+                
+                # Truncate long product names
+                if len(product_name) > 30:
+                    product_name = product_name[:27] + "..."
+                
+                email_body += f"│  {product_name:<32}\n"
+                email_body += f"│      {quantity} x ${unit_price:,.2f}                          ${subtotal:,.2f}\n"
+                email_body += "│\n"
+            
+            email_body += "├──────────────────────────────────────────────────────────────┤\n"
+            
+            if total_amount is not None:
+                email_body += f"│  SUBTOTAL:                                       ${total_amount:,.2f}\n"
+                email_body += f"│  SHIPPING:                                       $0.00\n"
+                email_body += f"│  TAX:                                            $0.00\n"
+                email_body += "├──────────────────────────────────────────────────────────────┤\n"
+                email_body += f"│  TOTAL:                                          ${total_amount:,.2f}\n"
+            
+            email_body += "└──────────────────────────────────────────────────────────────┘\n"
+        
+        # Status-specific additional content
+        if event_type == "COMPLETED":
+            email_body += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🎉 Thank you for your purchase!
+
+We hope you enjoy your order. If you have any questions or need
+assistance, our customer support team is here to help.
+
+📧 Support: support@orderprocessing.com
+📞 Phone: 1-800-123-4567
+🌐 Website: www.orderprocessing.com
+
+We appreciate your business and look forward to serving you again!
+
+"""
+        elif event_type == "PAYMENT_FAILED":
+            email_body += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+⚠️  WHAT TO DO NEXT:
+
+   1. Verify your payment details are correct
+   2. Ensure sufficient funds are available
+   3. Try placing your order again
+
+If you continue to experience issues, please contact our support team.
+
+📧 Support: support@orderprocessing.com
+📞 Phone: 1-800-123-4567
+
+"""
+        elif event_type == "FULFILLED":
+            email_body += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📦 SHIPPING INFORMATION
+
+Your order is on its way! Estimated delivery: 3-5 business days
+
+Track your package using your Order Number above.
+
+"""
+        elif event_type == "PAYMENT_CONFIRMED":
+            email_body += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💳 Your payment has been processed successfully.
+
+Your order will be prepared for shipping shortly. You'll receive
+another notification when your order ships.
+
+"""
+        
+        # Footer
+        email_body += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+This is an automated message from Order Processing System.
+Please do not reply directly to this email.
+
+© 2025 Order Processing Inc. All rights reserved.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+        
+        return email_body
+
+    def _get_subject(self, event_type: str, order_id: str) -> str:
+        short_id = order_id[:8].upper()
+        subjects = {
+            "ORDER_CREATED": f"🛒 Order Confirmed - #{short_id}",
+            "PROCESSING": f"⚙️ Processing Your Order - #{short_id}",
+            "PAYMENT_CONFIRMED": f"💳 Payment Received - #{short_id}",
+            "PAYMENT_FAILED": f"❌ Payment Issue - #{short_id}",
+            "FULFILLED": f"📦 Your Order Has Shipped! - #{short_id}",
+            "COMPLETED": f"✅ Order Delivered - #{short_id}",
+            "CANCELLED": f"🚫 Order Cancelled - #{short_id}",
+            "FAILED": f"⚠️ Order Issue - #{short_id}"
+        }
+        return subjects.get(event_type, f"📋 Order Update - #{short_id}")
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls(2025, 12, 15, 23, 31, 32)
+
+
+def make_items(count: int) -> List[Dict]:
+    return [
+        {
+            "product_name": f"Benchmark product with a fairly long name {i}",
+            "quantity": 1 + i % 4,
+            "unit_price": 12.5 + i,
+            "subtotal": (1 + i % 4) * (12.5 + i)
+        }
+        for i in range(count)
+    ]
+
+
+def check_identical(current: SNSNotifier, legacy: LegacyTemplates):
+    cases = [
+        dict(customer_name="Jane", customer_email="jane@example.com", items=make_items(3), total_amount=99.5),
+        dict(customer_name=None, customer_email=None, items=[], total_amount=None),
+        dict(customer_name="Jane", customer_email="", items=make_items(2), total_amount=None)
+    ]
+    for event_type in EVENT_TYPES:
+        for case in cases:
+            kwargs = dict(order_id="550e8400-e29b-41d4-a716-446655440000", event_type=event_type, message="Custom message", **case)
+            assert current._format_email_body(**kwargs) == legacy._format_email_body(**kwargs), f"Body differs for {event_type}"
+            assert current._get_subject(event_type, kwargs["order_id"]) == legacy._get_subject(event_type, kwargs["order_id"]), f"Subject differs for {event_type}"
+
+
+def renders_per_second(render, items: List[Dict], duration: float) -> float:
+    # Each simulated order goes through the notifications a successful order sends
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        order_id = str(uuid.uuid4())
+        for event_type in LIFECYCLE:
+            render(
+                order_id=order_id,
+                event_type=event_type,
+                message="Custom message",
+                customer_name="Jane",
+                customer_email="jane@example.com",
+                items=items,
+                total_amount=123.45
+            )
+        count += len(LIFECYCLE)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds to render per case")
+    args = parser.parse_args()
+
+    current = SNSNotifier("arn:aws:sns:us-east-1:000000000000:benchmark")
+    legacy = LegacyTemplates()
+
+    notifier.datetime = FrozenDatetime
+    globals()["datetime"] = FrozenDatetime
+    check_identical(SNSNotifier("arn:aws:sns:us-east-1:000000000000:benchmark"), legacy)
+    print("Rendered output is identical for all event types")
+
+    print(f"{'items':>6} {'legacy/s':>12} {'current/s':>12} {'speedup':>8}")
+    for count in args.items:
+        items = make_items(count)
+        before = renders_per_second(legacy._format_email_body, items, args.duration)
+        after = renders_per_second(current._format_email_body, items, args.duration)
+        print(f"{count:>6} {before:>12,.0f} {after:>12,.0f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
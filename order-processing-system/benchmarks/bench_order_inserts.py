@@ -0,0 +1,124 @@
+"""Compare per-item INSERTs with the bulk insert used by create-order.
+
+Runs both strategies against a real PostgreSQL database (configured with the
+same DB_HOST / DB_NAME / DB_USERNAME / DB_PASSWORD variables as the services)
+for a range of item counts and rolls every transaction back afterwards.
+Point it at RDS from inside the VPC to see the effect of network round trips.
+
+    python benchmarks/bench_order_inserts.py --items 1 10 50 200 1000 --repeat 20
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_create_order_handler():
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    spec = importlib.util.spec_from_file_location("create_order_handler", ROOT / "lambdas" / "create-order" / "handler.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    statements = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.statements += 1
+        return super().execute(query, vars)
+
+
+def make_order(item_count: int) -> dict:
+    items = [
+        {
+            "id": str(uuid.uuid4()),
+            "product_name": f"Benchmark item {i}",
+            "quantity": 1 + i % 5,
+            "unit_price": 9.99,
+            "subtotal": round((1 + i % 5) * 9.99, 2)
+        }
+        for i in range(item_count)
+    ]
+    return {
+        "order_id": str(uuid.uuid4()),
+        "customer_email": "bench@example.com",
+        "customer_name": "Benchmark",
+        "total_amount": round(sum(item["subtotal"] for item in items), 2),
+        "created_at": datetime.utcnow(),
+        "items": items
+    }
+
+
+def insert_per_item(cur, order: dict):
+    # The statement-per-row path create-order used before bulk inserts
+    cur.execute(
+        "INSERT INTO orders (id, customer_email, customer_name, total_amount, status, created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (order["order_id"], order["customer_email"], order["customer_name"], order["total_amount"], "PENDING", order["created_at"], order["created_at"])
+    )
+    for item in order["items"]:
+        cur.execute(
+            "INSERT INTO order_items (id, order_id, product_name, quantity, unit_price, subtotal) VALUES (%s, %s, %s, %s, %s, %s)",
+            (item["id"], order["order_id"], item["product_name"], item["quantity"], item["unit_price"], item["subtotal"])
+        )
+    cur.execute(
+        "INSERT INTO order_status_log (id, order_id, status, message) VALUES (%s, %s, %s, %s)",
+        (str(uuid.uuid4()), order["order_id"], "PENDING", "Order created and queued for processing")
+    )
+
+
+def measure(conn, strategy, item_count: int, repeat: int):
+    timings = []
+    CountingCursor.statements = 0
+    for _ in range(repeat):
+        order = make_order(item_count)
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            strategy(cur, order)
+        timings.append((time.perf_counter() - start) * 1000)
+        conn.rollback()
+    return statistics.median(timings), max(timings), CountingCursor.statements / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    handler = load_create_order_handler()
+    conn = psycopg2.connect(
+        host=os.environ.get("DB_HOST", "localhost"),
+        database=os.environ.get("DB_NAME", "orderdb"),
+        user=os.environ.get("DB_USERNAME", "postgres"),
+        password=os.environ.get("DB_PASSWORD", ""),
+        cursor_factory=CountingCursor
+    )
+    handler.create_tables_if_not_exist(conn)
+
+    strategies = [
+        ("per-item", insert_per_item),
+        ("bulk", lambda cur, order: handler.insert_orders(cur, [order]))
+    ]
+
+    print(f"{'items':>6} {'strategy':>9} {'stmts':>6} {'p50 ms':>9} {'max ms':>9}")
+    for item_count in args.items:
+        for name, strategy in strategies:
+            # Warm up plans and the connection before measuring
+            measure(conn, strategy, item_count, 2)
+            p50, worst, statements = measure(conn, strategy, item_count, args.repeat)
+            print(f"{item_count:>6} {name:>9} {statements:>6.0f} {p50:>9.2f} {worst:>9.2f}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
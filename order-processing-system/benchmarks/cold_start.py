@@ -0,0 +1,164 @@
+"""Measure Lambda handler init time, with and without the fast path.
+
+Each sample imports a handler in a fresh interpreter, the same work Lambda reports
+as Init Duration. With --invoke it then serves one hot request (POST /orders or
+GET /orders/{id} for a random id), which needs the usual DB_HOST / DB_NAME /
+DB_USERNAME / DB_PASSWORD variables and inserts one order per create-order sample.
+--baseline REF measures the handlers as they are at a git revision as well, e.g.
+the commit before a change. --profile lists the slowest imports from
+`python -X importtime`.
+
+    python benchmarks/cold_start.py --samples 20 --baseline HEAD~1 --profile
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+FUNCTIONS = ["create-order", "get-order-status"]
+
+# Runs in the fresh interpreter; prints one JSON line
+SAMPLE = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("handler", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+result = {"init": time.perf_counter() - start}
+if len(sys.argv) > 2:
+    start = time.perf_counter()
+    response = module.handler(json.loads(sys.argv[2]), None)
+    result["first_request"] = time.perf_counter() - start
+    result["status"] = response["statusCode"]
+print(json.dumps(result))
+"""
+
+
+def hot_event(function: str) -> dict:
+    if function == "create-order":
+        method, path = "POST", "/orders"
+        body = json.dumps({
+            "customer_email": "cold-start@example.com",
+            "customer_name": "Cold Start",
+            "items": [{"product_name": "Item", "quantity": 1, "unit_price": 4.99}]
+        })
+    else:
+        method, path, body = "GET", f"/orders/{uuid.uuid4()}", None
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": f"/dev{path}",
+        "rawQueryString": "",
+        "headers": {"content-type": "application/json", "host": "localhost"},
+        "requestContext": {
+            "http": {"method": method, "path": f"/dev{path}", "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1", "userAgent": "cold-start"},
+            "stage": "dev",
+            "requestId": "cold-start"
+        },
+        "body": body,
+        "isBase64Encoded": False
+    }
+
+
+def checkout(ref: str, directory: Path) -> Dict[str, Path]:
+    paths = {}
+    for function in FUNCTIONS:
+        source = subprocess.run(
+            ["git", "show", f"{ref}:./lambdas/{function}/handler.py"],
+            cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout
+        path = directory / function / "handler.py"
+        path.parent.mkdir(parents=True)
+        path.write_text(source)
+        paths[function] = path
+    return paths
+
+
+def sample(path: Path, env: dict, event: dict = None) -> dict:
+    args = [sys.executable, "-c", SAMPLE, str(path)]
+    if event:
+        args.append(json.dumps(event))
+    output = subprocess.run(args, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_profile(path: Path, env: dict, top: int):
+    # -X importtime writes "import time: self [us] | cumulative | module" to stderr
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import runpy; runpy.run_path({str(path)!r})"],
+        env=env, capture_output=True, text=True
+    ).stderr
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)$", line)
+        # Top-level imports only (indented once); their cumulative time covers what they pull in
+        if match and len(match.group(2)) == 1:
+            packages[match.group(3).split(".")[0]] += int(match.group(1))
+    total = sum(packages.values())
+    print(f"  {'package':<28} {'ms':>8} {'share':>6}")
+    for name, micros in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {name:<28} {micros / 1000:>8.1f} {micros / total:>6.0%}")
+
+
+def summarize(values):
+    values = sorted(values)
+    return statistics.median(values) * 1000, values[min(len(values) - 1, int(len(values) * 0.9))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=10, help="Fresh interpreters per variant")
+    parser.add_argument("--function", choices=FUNCTIONS, action="append", help="Default: both")
+    parser.add_argument("--baseline", help="Also measure the handlers at this git revision")
+    parser.add_argument("--invoke", action="store_true", help="Time the first hot request too (needs PostgreSQL)")
+    parser.add_argument("--profile", action="store_true", help="Show the slowest top-level imports")
+    parser.add_argument("--top", type=int, default=12, help="Packages to list with --profile")
+    args = parser.parse_args()
+    functions = args.function or FUNCTIONS
+
+    env = dict(os.environ)
+    env.setdefault("AWS_REGION", "us-east-1")
+    env.setdefault("AWS_DEFAULT_REGION", env["AWS_REGION"])
+    env.setdefault("ORDER_ENQUEUE_MODE", "outbox")
+
+    with tempfile.TemporaryDirectory() as directory:
+        variants = []
+        if args.baseline:
+            baseline = checkout(args.baseline, Path(directory))
+            variants.append((args.baseline, baseline, {}))
+        current = {function: ROOT / "lambdas" / function / "handler.py" for function in FUNCTIONS}
+        variants.append(("fast path off", current, {"FAST_PATH_ENABLED": "false"}))
+        variants.append(("fast path on", current, {"FAST_PATH_ENABLED": "true"}))
+
+        print(f"{'function':<18} {'variant':<16} {'init p50':>9} {'init p90':>9} {'1st req p50':>12} {'1st req p90':>12}")
+        for function in functions:
+            for name, paths, overrides in variants:
+                results = [
+                    sample(paths[function], dict(env, **overrides), hot_event(function) if args.invoke else None)
+                    for _ in range(args.samples)
+                ]
+                init = summarize([r["init"] for r in results])
+                line = f"{function:<18} {name:<16} {init[0]:>8.1f}ms {init[1]:>8.1f}ms"
+                if args.invoke:
+                    first = summarize([r["first_request"] for r in results])
+                    line += f" {first[0]:>10.1f}ms {first[1]:>10.1f}ms"
+                print(line)
+
+        if args.profile:
+            for function in functions:
+                for name, paths, overrides in variants:
+                    print(f"\n{function}, {name}: slowest imports")
+                    import_profile(paths[function], dict(env, **overrides), args.top)
+
+
+if __name__ == "__main__":
+    main()
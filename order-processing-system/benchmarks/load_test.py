@@ -0,0 +1,294 @@
+"""End-to-end load test: create-order API -> SQS -> ECS processor -> SNS.
+
+Drives the real create-order FastAPI app and the ECS processor's main loop in
+one process. SQS and SNS are moto in-memory fakes; orders go to a real
+PostgreSQL configured with the usual DB_HOST / DB_NAME / DB_USERNAME /
+DB_PASSWORD variables (the schema is created if missing; benchmark orders are
+left behind for inspection). Payments use the stub gateway with the latency and
+decline rate given on the command line.
+
+Reports orders/sec, p50/p95/p99 for the API call and every processing stage,
+SQL statements and AWS API calls per order. Use --json to save a run and
+compare it with a later one.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_test.py --orders 500 --clients 20 --payment-latency 0.05
+"""
+import argparse
+import importlib.util
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+import boto3
+import psycopg2
+from moto import mock_aws
+
+ROOT = Path(__file__).resolve().parent.parent
+FINAL_STATUSES = ["COMPLETED", "PAYMENT_FAILED", "FAILED", "CANCELLED"]
+# (stage, from status, to status); "CREATED" is orders.created_at
+STAGES = [
+    ("queue wait", "CREATED", "PROCESSING"),
+    ("payment", "PROCESSING", "PAYMENT_CONFIRMED"),
+    ("fulfillment", "PAYMENT_CONFIRMED", "COMPLETED"),
+    ("end to end", "CREATED", "COMPLETED")
+]
+
+sql_statements = Counter()
+aws_calls = Counter()
+uncounted_connect = psycopg2.connect
+
+
+def statement_source() -> str:
+    # Thread name without its index: intake, payment, order-worker, outbox-relay, ...
+    name = threading.current_thread().name
+    if name.startswith("asyncio-portal"):
+        # TestClient runs the FastAPI app on portal threads
+        return "create-order"
+    return re.sub(r"[-_]\d+$", "", name)
+
+
+_counting_cursors = {}
+
+
+def counting_cursor(cursor_class):
+    if cursor_class not in _counting_cursors:
+        class CountingCursor(cursor_class):
+            def execute(self, query, vars=None):
+                sql_statements[statement_source()] += 1
+                return super().execute(query, vars)
+
+        _counting_cursors[cursor_class] = CountingCursor
+    return _counting_cursors[cursor_class]
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        cursor_class = kwargs.pop("cursor_factory", None) or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=counting_cursor(cursor_class), **kwargs)
+
+
+def install_counters():
+    def counting_connect(*args, **kwargs):
+        return uncounted_connect(*args, connection_factory=CountingConnection, **kwargs)
+
+    psycopg2.connect = counting_connect
+
+    def count_call(model, **kwargs):
+        aws_calls[f"{model.service_model.service_name}:{model.name}"] += 1
+
+    boto3.setup_default_session(region_name=os.environ["AWS_REGION"])
+    boto3.DEFAULT_SESSION.events.register("before-call.*.*", count_call)
+
+
+def load_create_order(index: int):
+    # One module per client thread, like separate Lambda containers with their own connection
+    spec = importlib.util.spec_from_file_location(f"create_order_{index}", ROOT / "lambdas" / "create-order" / "handler.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    if len(values) == 1:
+        return {"count": 1, "p50": values[0], "p95": values[0], "p99": values[0]}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"count": len(values), "p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def make_request(index: int, items: int) -> dict:
+    return {
+        "customer_email": f"load-{index}@example.com",
+        "customer_name": f"Load Test {index}",
+        "items": [{"product_name": f"Item {i}", "quantity": 1 + i % 3, "unit_price": 4.99} for i in range(items)]
+    }
+
+
+def drive_api(args, order_ids: List[str], api_latencies: List[float], errors: Counter):
+    from fastapi.testclient import TestClient
+
+    next_index = iter(range(args.orders))
+    lock = threading.Lock()
+
+    def client(index: int):
+        app = TestClient(load_create_order(index).app)
+        while True:
+            with lock:
+                n = next(next_index, None)
+            if n is None:
+                return
+            start = time.perf_counter()
+            response = app.post("/orders", json=make_request(n, args.items))
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 200:
+                    order_ids.append(response.json()["order_id"])
+                    api_latencies.append(elapsed)
+                else:
+                    errors[response.status_code] += 1
+
+    threads = [threading.Thread(target=client, args=(i,), name=f"api-client-{i}") for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def wait_for_orders(conn, order_ids: List[str], timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    done = 0
+    while time.monotonic() < deadline:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM orders WHERE id = ANY(%s::uuid[]) AND status = ANY(%s)", (order_ids, FINAL_STATUSES))
+            done = cur.fetchone()[0]
+        conn.rollback()
+        if done == len(order_ids):
+            break
+        time.sleep(0.25)
+    return done
+
+
+def stage_latencies(conn, order_ids: List[str]) -> Dict[str, List[float]]:
+    reached = defaultdict(dict)
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, created_at FROM orders WHERE id = ANY(%s::uuid[])", (order_ids,))
+        for order_id, created_at in cur.fetchall():
+            reached[order_id]["CREATED"] = created_at
+        # First time each status was reached; a retried order keeps its first attempt
+        cur.execute(
+            "SELECT order_id, status, min(created_at) FROM order_status_log WHERE order_id = ANY(%s::uuid[]) GROUP BY 1, 2",
+            (order_ids,)
+        )
+        for order_id, status, at in cur.fetchall():
+            reached[order_id][status] = at
+    conn.rollback()
+
+    latencies = defaultdict(list)
+    for statuses in reached.values():
+        for stage, start, end in STAGES:
+            if start in statuses and end in statuses:
+                latencies[stage].append((statuses[end] - statuses[start]).total_seconds())
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent API clients")
+    parser.add_argument("--items", type=int, default=3, help="Line items per order")
+    parser.add_argument("--payment-latency", type=float, default=0.05, help="Median stub payment latency (s)")
+    parser.add_argument("--payment-sigma", type=float, default=0.25, help="Log-normal sigma of payment latency")
+    parser.add_argument("--decline-rate", type=float, default=0.0)
+    parser.add_argument("--processing-mode", choices=["pipeline", "sequential"], default="pipeline")
+    parser.add_argument("--enqueue-mode", choices=["outbox", "direct"], default="outbox")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for processing to finish")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # Read by the services at import time
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    os.environ.setdefault("AWS_DEFAULT_REGION", os.environ["AWS_REGION"])
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.update({
+        "PROCESSING_MODE": args.processing_mode,
+        "ORDER_ENQUEUE_MODE": args.enqueue_mode,
+        "PAYMENT_GATEWAY": "stub",
+        "PAYMENT_STUB_LATENCY_MEDIAN": str(args.payment_latency),
+        "PAYMENT_STUB_LATENCY_SIGMA": str(args.payment_sigma),
+        "PAYMENT_STUB_DECLINE_RATE": str(args.decline_rate),
+        "PAYMENT_STUB_ERROR_RATE": "0"
+    })
+
+    with mock_aws():
+        install_counters()
+        queue_url = boto3.client("sqs").create_queue(QueueName="load-test-orders", Attributes={"VisibilityTimeout": "300"})["QueueUrl"]
+        os.environ["SQS_QUEUE_URL"] = queue_url
+        os.environ["SNS_TOPIC_ARN"] = boto3.client("sns").create_topic(Name="load-test-events")["TopicArn"]
+
+        load_create_order(-1).create_tables_if_not_exist(uncounted_connect(
+            host=os.environ.get("DB_HOST", "localhost"),
+            database=os.environ.get("DB_NAME", "orderdb"),
+            user=os.environ.get("DB_USERNAME", "postgres"),
+            password=os.environ.get("DB_PASSWORD", "")
+        ))
+        aws_calls.clear()
+
+        sys.path.insert(0, str(ROOT / "ecs-processor" / "app"))
+        import main as processor_main
+
+        order_ids, api_latencies, errors = [], [], Counter()
+        results = {}
+
+        def run_load():
+            monitor = uncounted_connect(
+                host=processor_main.DB_HOST,
+                database=processor_main.DB_NAME,
+                user=processor_main.DB_USERNAME,
+                password=processor_main.DB_PASSWORD
+            )
+            start = time.perf_counter()
+            drive_api(args, order_ids, api_latencies, errors)
+            results["api_seconds"] = time.perf_counter() - start
+            results["finished"] = wait_for_orders(monitor, order_ids, args.timeout)
+            results["seconds"] = time.perf_counter() - start
+            results["stages"] = stage_latencies(monitor, order_ids)
+            monitor.close()
+
+            processor_main.running = False
+            # Returns the poller from its 20s long poll; the message itself is never processed
+            processor_main.sqs_client.send_message(QueueUrl=queue_url, MessageBody="{}")
+
+        driver = threading.Thread(target=run_load, name="load-driver")
+        driver.start()
+        # main() installs signal handlers, so it has to run on the main thread
+        processor_main.main()
+        driver.join()
+
+    created = len(order_ids)
+    report = {
+        "config": vars(args),
+        "orders_created": created,
+        "orders_finished": results["finished"],
+        "api_errors": dict(errors),
+        "api_orders_per_second": created / results["api_seconds"] if results["api_seconds"] else 0.0,
+        "orders_per_second": results["finished"] / results["seconds"] if results["seconds"] else 0.0,
+        "latency_seconds": {"api": percentiles(api_latencies)},
+        "sql_statements": dict(sql_statements),
+        "aws_calls": dict(aws_calls)
+    }
+    for stage, _, _ in STAGES:
+        report["latency_seconds"][stage] = percentiles(results["stages"].get(stage, []))
+
+    print()
+    print(f"orders: {created} created, {results['finished']} finished in {results['seconds']:.1f}s"
+          f" ({report['orders_per_second']:.1f}/s end to end, {report['api_orders_per_second']:.1f}/s through the API)")
+    if errors:
+        print(f"API errors: {dict(errors)}")
+    print(f"{'stage':>14} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in report["latency_seconds"].items():
+        print(f"{stage:>14} {stats['count']:>6} {stats['p50'] * 1000:>9.1f} {stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+    per_order = max(created, 1)
+    print(f"{'SQL by thread':>28} {'total':>7} {'/order':>7}")
+    for name, count in sorted(sql_statements.items()):
+        print(f"{name:>28} {count:>7} {count / per_order:>7.2f}")
+    print(f"{'AWS API call':>28} {'total':>7} {'/order':>7}")
+    for name, count in sorted(aws_calls.items()):
+        print(f"{name:>28} {count:>7} {count / per_order:>7.2f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
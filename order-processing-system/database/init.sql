@@ -17,20 +17,84 @@ CREATE TABLE IF NOT EXISTS order_items (
     subtotal DECIMAL(10, 2) NOT NULL CHECK (subtotal >= 0)
 );
 
+-- Partitioned by month so old history can be detached or archived instead of
+-- growing forever (see ecs-processor/app/partitions.py). Rows outside every
+-- monthly partition land in order_status_log_default until maintenance moves them.
 CREATE TABLE IF NOT EXISTS order_status_log (
-    id UUID PRIMARY KEY,
+    id UUID NOT NULL,
     order_id UUID NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
     status VARCHAR(50) NOT NULL,
     message TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS order_status_log_default PARTITION OF order_status_log DEFAULT;
+
+-- This month and the next three; partitions.py keeps creating them ahead
+DO $$
+DECLARE
+    month DATE;
+BEGIN
+    FOR month IN
+        SELECT generate_series(date_trunc('month', CURRENT_DATE), date_trunc('month', CURRENT_DATE) + INTERVAL '3 months', INTERVAL '1 month')::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF order_status_log FOR VALUES FROM (%L) TO (%L)',
+            'order_status_log_' || to_char(month, 'YYYY_MM'), month, (month + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END
+$$;
+
+-- Transactional outbox: create-order writes the SQS message here in the same
+-- transaction as the order, and the relay in the order processor sends it
+CREATE TABLE IF NOT EXISTS order_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    order_id UUID NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    message_body TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Order counts and amounts per status, and per status and day the order was placed,
+-- for GET /orders/stats. Triggers on orders append every change to order_stats_deltas,
+-- which is insert-only so concurrent writers never wait on each other; the order
+-- processor folds the deltas into the totals every few seconds (order_stats.py).
+-- Readers add whatever deltas are still pending to the totals.
+CREATE TABLE IF NOT EXISTS order_stats_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    status VARCHAR(50) NOT NULL,
+    day DATE,
+    order_count INTEGER NOT NULL,
+    total_amount DECIMAL(14, 2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS order_status_totals (
+    status VARCHAR(50) PRIMARY KEY,
+    order_count BIGINT NOT NULL,
+    total_amount DECIMAL(16, 2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS order_daily_totals (
+    day DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    order_count BIGINT NOT NULL,
+    total_amount DECIMAL(16, 2) NOT NULL,
+    PRIMARY KEY (day, status)
 );
 
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_orders_customer_email ON orders(customer_email);
 CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at DESC);
+-- Keyset pagination for GET /orders filtered by status or customer
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_email_created_at ON orders(customer_email, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
-CREATE INDEX IF NOT EXISTS idx_order_status_log_order_id ON order_status_log(order_id);
+-- Also serves lookups by order_id alone, so there is no separate order_id index
 CREATE INDEX IF NOT EXISTS idx_order_status_log_created_at ON order_status_log(order_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_order_outbox_unsent ON order_outbox(id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_order_outbox_sent_at ON order_outbox(sent_at) WHERE sent_at IS NOT NULL;
 
 
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -41,8 +105,68 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- Only fill in updated_at for writers that don't set it themselves; the order
+-- processor stamps it with the transition time in the same UPDATE
 DROP TRIGGER IF EXISTS update_orders_updated_at ON orders;
 CREATE TRIGGER update_orders_updated_at
     BEFORE UPDATE ON orders
     FOR EACH ROW
+    WHEN (NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at)
     EXECUTE FUNCTION update_updated_at_column();
+
+-- One delta row per (status, day) a statement touches, however many orders it writes
+CREATE OR REPLACE FUNCTION record_order_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO order_stats_deltas (status, day, order_count, total_amount)
+        SELECT status, created_at::date, count(*), sum(total_amount)
+        FROM new_rows GROUP BY 1, 2;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO order_stats_deltas (status, day, order_count, total_amount)
+        SELECT status, created_at::date, -count(*), -sum(total_amount)
+        FROM old_rows GROUP BY 1, 2;
+    ELSE
+        -- Orders whose status, amount and day didn't change cancel out
+        INSERT INTO order_stats_deltas (status, day, order_count, total_amount)
+        SELECT status, day, sum(order_count), sum(total_amount)
+        FROM (
+            SELECT status, created_at::date AS day, -1 AS order_count, -total_amount AS total_amount FROM old_rows
+            UNION ALL
+            SELECT status, created_at::date, 1, total_amount FROM new_rows
+        ) changes
+        GROUP BY status, day
+        HAVING sum(order_count) <> 0 OR sum(total_amount) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- The triggers go in together with a backfill of the totals from the orders already
+-- there, with writers locked out, so every order is counted exactly once
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'orders_stats_insert' AND tgrelid = 'orders'::regclass) THEN
+        RETURN;
+    END IF;
+    LOCK TABLE orders IN SHARE ROW EXCLUSIVE MODE;
+    IF EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'orders_stats_insert' AND tgrelid = 'orders'::regclass) THEN
+        RETURN;
+    END IF;
+
+    CREATE TRIGGER orders_stats_insert AFTER INSERT ON orders
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION record_order_stats();
+    CREATE TRIGGER orders_stats_update AFTER UPDATE ON orders
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION record_order_stats();
+    CREATE TRIGGER orders_stats_delete AFTER DELETE ON orders
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION record_order_stats();
+
+    DELETE FROM order_stats_deltas;
+    DELETE FROM order_status_totals;
+    DELETE FROM order_daily_totals;
+    INSERT INTO order_status_totals (status, order_count, total_amount)
+    SELECT status, count(*), sum(total_amount) FROM orders GROUP BY status;
+    INSERT INTO order_daily_totals (day, status, order_count, total_amount)
+    SELECT created_at::date, status, count(*), sum(total_amount) FROM orders WHERE created_at IS NOT NULL GROUP BY 1, 2;
+END
+$$;
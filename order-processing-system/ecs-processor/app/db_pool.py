@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect: Callable,
+        max_size: int = 10,
+        idle_timeout: float = 300,
+        health_check_interval: float = 30,
+        checkout_timeout: float = 30
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self._condition = threading.Condition()
+        # (connection, last returned at) in LIFO order, so a few hot connections stay warm
+        # and the rest age out through idle_timeout
+        self._idle: List[Tuple[object, float]] = []
+        self._size = 0
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                self._prune_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(timeout=remaining):
+                        raise PoolTimeout(f"No database connection available within {self.checkout_timeout}s")
+                    continue
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+
+            if self._is_healthy(conn, last_used):
+                return conn
+
+            # A dead idle connection usually means RDS failed over or restarted, so
+            # every other idle connection points at the old instance as well
+            logger.warning("Discarding broken pooled connection and reconnecting")
+            self._close_quietly(conn)
+            self._forget()
+            self._discard_idle()
+
+    def putconn(self, conn):
+        if conn.closed:
+            self._forget()
+            self._discard_idle()
+            return
+
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Discarding pooled connection that failed to reset: {e}")
+                self._close_quietly(conn)
+                self._forget()
+                self._discard_idle()
+                return
+
+        with self._condition:
+            if self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def prune(self):
+        with self._condition:
+            self._prune_locked()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+        logger.info("Database connection pool closed")
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _prune_locked(self):
+        if not self._idle:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [conn for conn, last_used in self._idle if last_used < cutoff]
+        if not expired:
+            return
+        self._idle = [(conn, last_used) for conn, last_used in self._idle if last_used >= cutoff]
+        self._size -= len(expired)
+        for conn in expired:
+            self._close_quietly(conn)
+        logger.debug(f"Closed {len(expired)} idle database connection(s)")
+
+    def _discard_idle(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _forget(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,15 +1,29 @@
-import json
 import logging
 import os
 import signal
 import time
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
 
 import boto3
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-from processor import OrderProcessor
-from notifier import SNSNotifier
+from db_pool import ConnectionPool
+from messages import InvalidMessage, decode_order_message
+from metrics import IN_FLIGHT, ORDERS, SQS_POLL_SECONDS, EMFReporter, start_http_server
+from processor import ALREADY_PROCESSED, IN_PROGRESS, ItemsPrefetch, OrderProcessor
+from notifier import NotificationDispatcher, SNSNotifier
+from order_stats import OrderStatsRollup
+from outbox_relay import OutboxRelay
+from partitions import StatusLogPartitions
+from payment import PaymentClient, create_gateway
+from pipeline import OrderPipeline
+from scaling import SQS_MAX_BATCH, BacklogReporter, poll_parameters
+from sqs_batcher import SQSMessageBatcher
+from supervisor import WorkerSupervisor
+from worker_pool import WorkerPool
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -21,6 +35,90 @@ DB_PASSWORD = os.environ.get("DB_PASSWORD")
 SQS_QUEUE_URL = os.environ.get("SQS_QUEUE_URL")
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "10"))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
+SQS_VISIBILITY_TIMEOUT = int(os.environ.get("SQS_VISIBILITY_TIMEOUT", "300"))
+SQS_HEARTBEAT_MARGIN = int(os.environ.get("SQS_HEARTBEAT_MARGIN", "60"))
+NOTIFICATIONS_ASYNC = os.environ.get("NOTIFICATIONS_ASYNC", "true").lower() == "true"
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get("NOTIFICATION_QUEUE_SIZE", "1000"))
+# Prometheus /metrics endpoint; 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+# Also write metrics to stdout as CloudWatch Embedded Metric Format
+METRICS_EMF_ENABLED = os.environ.get("METRICS_EMF_ENABLED", "false").lower() == "true"
+METRICS_EMF_INTERVAL = float(os.environ.get("METRICS_EMF_INTERVAL", "60"))
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "OrderProcessing")
+# Backlog-per-task metric for ECS target tracking, written as EMF every interval
+SCALING_METRICS_ENABLED = os.environ.get("SCALING_METRICS_ENABLED", "true").lower() == "true"
+SCALING_METRICS_INTERVAL = float(os.environ.get("SCALING_METRICS_INTERVAL", "60"))
+# Used to divide the backlog by the number of running tasks; without them each task assumes it is alone
+ECS_CLUSTER_NAME = os.environ.get("ECS_CLUSTER_NAME")
+ECS_SERVICE_NAME = os.environ.get("ECS_SERVICE_NAME")
+# How long a busy task waits for more free slots so it can receive a fuller batch
+SQS_POLL_LINGER = float(os.environ.get("SQS_POLL_LINGER", "0.25"))
+# "pipeline": separate intake/payment/fulfillment/notification stages joined by bounded
+# queues; "sequential": each of WORKER_CONCURRENCY workers takes one message through every phase
+PROCESSING_MODE = os.environ.get("PROCESSING_MODE", "pipeline").lower()
+PIPELINE_INTAKE_CONCURRENCY = int(os.environ.get("PIPELINE_INTAKE_CONCURRENCY", "4"))
+PIPELINE_PAYMENT_CONCURRENCY = int(os.environ.get("PIPELINE_PAYMENT_CONCURRENCY", "50"))
+PIPELINE_FULFILLMENT_CONCURRENCY = int(os.environ.get("PIPELINE_FULFILLMENT_CONCURRENCY", "6"))
+PIPELINE_NOTIFICATION_CONCURRENCY = int(os.environ.get("PIPELINE_NOTIFICATION_CONCURRENCY", "2"))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "100"))
+# Messages received and not yet acked or released; 0 allows as many as the stages and
+# the intake queue can hold
+PIPELINE_MAX_IN_FLIGHT = int(os.environ.get("PIPELINE_MAX_IN_FLIGHT", "0"))
+# 0 sizes the pool to the threads that hold a connection: intake and fulfillment workers
+# and the SQS heartbeat refreshing claims in the pipeline (payments and notifications
+# don't touch the database), every worker in sequential mode
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "0")) or (
+    PIPELINE_INTAKE_CONCURRENCY + PIPELINE_FULFILLMENT_CONCURRENCY + 1 if PROCESSING_MODE == "pipeline" else WORKER_CONCURRENCY
+)
+# A PROCESSING order untouched for this long is assumed abandoned by a crashed task. The
+# pipeline touches held claims whenever it extends their messages' visibility, every
+# SQS_VISIBILITY_TIMEOUT - SQS_HEARTBEAT_MARGIN seconds, so this must be longer than that.
+CLAIM_STALE_AFTER = float(os.environ.get("CLAIM_STALE_AFTER", str(SQS_VISIBILITY_TIMEOUT)))
+PROCESSED_ORDER_CACHE_SIZE = int(os.environ.get("PROCESSED_ORDER_CACHE_SIZE", "10000"))
+# "stub" or "module:ClassName" of a PaymentGateway implementation
+PAYMENT_GATEWAY = os.environ.get("PAYMENT_GATEWAY", "stub")
+PAYMENT_MAX_CONCURRENCY = int(os.environ.get("PAYMENT_MAX_CONCURRENCY", "100"))
+PAYMENT_TIMEOUT = float(os.environ.get("PAYMENT_TIMEOUT", "10"))
+PAYMENT_MAX_ATTEMPTS = int(os.environ.get("PAYMENT_MAX_ATTEMPTS", "3"))
+PAYMENT_STUB_LATENCY_MEDIAN = float(os.environ.get("PAYMENT_STUB_LATENCY_MEDIAN", "2.0"))
+PAYMENT_STUB_LATENCY_SIGMA = float(os.environ.get("PAYMENT_STUB_LATENCY_SIGMA", "0.25"))
+PAYMENT_STUB_DECLINE_RATE = float(os.environ.get("PAYMENT_STUB_DECLINE_RATE", "0.05"))
+PAYMENT_STUB_ERROR_RATE = float(os.environ.get("PAYMENT_STUB_ERROR_RATE", "0.0"))
+# Relay order_outbox rows written by create-order to SQS from inside this task
+OUTBOX_RELAY_ENABLED = os.environ.get("OUTBOX_RELAY_ENABLED", "true").lower() == "true"
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_RETENTION_HOURS = float(os.environ.get("OUTBOX_RETENTION_HOURS", "24"))
+# Monthly order_status_log partitions: created ahead of time, months past the retention
+# detached (or, with an archive bucket, uploaded to S3 as CSV.gz and dropped); 0 keeps everything
+STATUS_LOG_PARTITIONS_ENABLED = os.environ.get("STATUS_LOG_PARTITIONS_ENABLED", "true").lower() == "true"
+STATUS_LOG_MONTHS_AHEAD = int(os.environ.get("STATUS_LOG_MONTHS_AHEAD", "3"))
+STATUS_LOG_RETENTION_MONTHS = int(os.environ.get("STATUS_LOG_RETENTION_MONTHS", "12"))
+STATUS_LOG_ARCHIVE_BUCKET = os.environ.get("STATUS_LOG_ARCHIVE_BUCKET", "")
+STATUS_LOG_ARCHIVE_PREFIX = os.environ.get("STATUS_LOG_ARCHIVE_PREFIX", "order_status_log/")
+# Fold the order stats deltas written by the orders triggers into the totals read by GET /orders/stats
+ORDER_STATS_ROLLUP_ENABLED = os.environ.get("ORDER_STATS_ROLLUP_ENABLED", "true").lower() == "true"
+ORDER_STATS_ROLLUP_INTERVAL = float(os.environ.get("ORDER_STATS_ROLLUP_INTERVAL", "10"))
+# Worker processes forked by a supervisor, each with its own poll loop, DB pool and AWS
+# clients, so the GIL doesn't hold a task with several vCPUs to one core; "auto" starts
+# one per CPU. Worker settings above (concurrency, pool size, ...) apply to each process.
+PROCESS_COUNT = os.environ.get("PROCESS_COUNT", "1")
+PROCESS_COUNT = len(os.sched_getaffinity(0)) if PROCESS_COUNT == "auto" else int(PROCESS_COUNT)
+# A worker whose poll loop hasn't come round for this long is killed and restarted
+WORKER_HEARTBEAT_TIMEOUT = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", "90"))
+# Under the time ECS waits between SIGTERM and SIGKILL: the container's stopTimeout,
+# 30 seconds unless set
+WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get("WORKER_SHUTDOWN_TIMEOUT", "25"))
+# How long a stopping pipeline waits for orders already past intake; leaves the rest of
+# WORKER_SHUTDOWN_TIMEOUT for flushing deletes and notifications
+PIPELINE_SHUTDOWN_TIMEOUT = float(os.environ.get("PIPELINE_SHUTDOWN_TIMEOUT", str(max(WORKER_SHUTDOWN_TIMEOUT - 5, 1))))
+WORKER_RESTART_MAX_BACKOFF = float(os.environ.get("WORKER_RESTART_MAX_BACKOFF", "60"))
+WORKER_HEALTH_FILE = os.environ.get("WORKER_HEALTH_FILE", "/tmp/order-processor-health.json")
+WORKER_HEALTH_INTERVAL = float(os.environ.get("WORKER_HEALTH_INTERVAL", "10"))
 
 sqs_client = boto3.client("sqs", region_name=AWS_REGION)
 running = True
@@ -33,38 +131,44 @@ def signal_handler(signum, frame):
 
 
 def get_db_connection():
-    return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD, cursor_factory=RealDictCursor)
-
-
-def poll_sqs():
+    return psycopg2.connect(
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USERNAME,
+        password=DB_PASSWORD,
+        cursor_factory=RealDictCursor,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        # Notice connections left dangling by an RDS failover instead of hanging on them
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=3
+    )
+
+
+def poll_sqs(max_messages: int = 10, wait_seconds: int = 20):
     try:
-        response = sqs_client.receive_message(
-            QueueUrl=SQS_QUEUE_URL,
-            MaxNumberOfMessages=10,
-            WaitTimeSeconds=20,
-            MessageAttributeNames=["All"]
-        )
+        with SQS_POLL_SECONDS.time():
+            response = sqs_client.receive_message(
+                QueueUrl=SQS_QUEUE_URL,
+                MaxNumberOfMessages=max(1, min(max_messages, SQS_MAX_BATCH)),
+                WaitTimeSeconds=wait_seconds,
+                MessageAttributeNames=["All"]
+            )
         return response.get("Messages", [])
     except Exception as e:
         logger.error(f"Error polling SQS: {e}")
         return []
 
 
-def delete_message(receipt_handle: str):
+def process_message(message: dict, processor: OrderProcessor, notifier: SNSNotifier, prefetch: Optional[ItemsPrefetch] = None):
     try:
-        sqs_client.delete_message(QueueUrl=SQS_QUEUE_URL, ReceiptHandle=receipt_handle)
-        logger.info("Message deleted from SQS")
-    except Exception as e:
-        logger.error(f"Error deleting message from SQS: {e}")
-
-
-def process_message(message: dict, processor: OrderProcessor, notifier: SNSNotifier):
-    try:
-        body = json.loads(message["Body"])
+        body = decode_order_message(message["Body"])
         order_id = body.get("order_id")
 
         if not order_id:
             logger.error("Message missing order_id")
+            ORDERS.inc(result="invalid")
             return False
 
         # Extract order details from message
@@ -73,109 +177,155 @@ def process_message(message: dict, processor: OrderProcessor, notifier: SNSNotif
         items = body.get("items", [])
         total_amount = body.get("total_amount", 0)
 
-        logger.info(f"Processing order: {order_id}")
-        conn = get_db_connection()
-
-        try:
-            # PROCESSING
-            processor.update_order_status(conn, order_id, "PROCESSING", "Order processing started")
-            notifier.send_notification(
-                order_id=order_id,
-                event_type="PROCESSING",
-                message=f"Order {order_id} is now being processed",
-                customer_name=customer_name,
-                customer_email=customer_email,
-                items=items,
-                total_amount=total_amount
-            )
-
-            # PAYMENT
-            logger.info(f"Processing payment for order {order_id}")
-            payment_success = processor.process_payment(conn, order_id, total_amount)
+        if order_id in processor.processed:
+            logger.info(f"Order {order_id} already processed, skipping duplicate delivery")
+            ORDERS.inc(result="duplicate")
+            return True
 
-            if payment_success:
-                # PAYMENT CONFIRMED
-                processor.update_order_status(conn, order_id, "PAYMENT_CONFIRMED", "Payment processed successfully")
-                notifier.send_notification(
-                    order_id=order_id,
-                    event_type="PAYMENT_CONFIRMED",
-                    message=f"Payment confirmed for order {order_id}",
-                    customer_name=customer_name,
-                    customer_email=customer_email,
-                    items=items,
-                    total_amount=total_amount
-                )
+        logger.info(f"Processing order: {order_id}")
 
-                # FULFILLED
-                logger.info(f"Fulfilling order {order_id}")
-                processor.fulfill_order(conn, order_id)
-                processor.update_order_status(conn, order_id, "FULFILLED", "Order has been fulfilled")
+        with processor.connection() as conn:
+            claimed = False
+            claim_id = str(uuid.uuid4())
+            try:
+                # PROCESSING
+                claim = processor.claim_order(conn, order_id, claim_id)
+                if claim == ALREADY_PROCESSED:
+                    ORDERS.inc(result="duplicate")
+                    return True
+                if claim == IN_PROGRESS:
+                    ORDERS.inc(result="in_progress")
+                    return False
+                claimed = True
+                if body.get("claim_check"):
+                    # Too large to inline; the details come from the order row instead
+                    body = processor.load_order(conn, order_id) or body
+                    customer_name = body.get("customer_name", "Valued Customer")
+                    customer_email = body.get("customer_email", "")
+                    items = body.get("items", [])
+                    total_amount = body.get("total_amount", 0)
                 notifier.send_notification(
                     order_id=order_id,
-                    event_type="FULFILLED",
-                    message=f"Order {order_id} has been fulfilled!",
+                    event_type="PROCESSING",
+                    message=f"Order {order_id} is now being processed",
                     customer_name=customer_name,
                     customer_email=customer_email,
                     items=items,
                     total_amount=total_amount
                 )
 
-                # COMPLETED
-                processor.update_order_status(conn, order_id, "COMPLETED", "Order completed successfully")
-                notifier.send_notification(
-                    order_id=order_id,
-                    event_type="COMPLETED",
-                    message=f"Order {order_id} completed. Thank you!",
-                    customer_name=customer_name,
-                    customer_email=customer_email,
-                    items=items,
-                    total_amount=total_amount
-                )
-            else:
-                # PAYMENT FAILED
-                processor.update_order_status(conn, order_id, "PAYMENT_FAILED", "Payment processing failed")
+                # PAYMENT
+                logger.info(f"Processing payment for order {order_id}")
+                payment_success = processor.process_payment(conn, order_id, total_amount, claim_id)
+
+                if payment_success:
+                    # PAYMENT CONFIRMED
+                    # The remaining transitions are written together once the order completes;
+                    # none of them is visible to readers before the commit anyway
+                    transitions = [("PAYMENT_CONFIRMED", "Payment processed successfully", datetime.utcnow())]
+                    notifier.send_notification(
+                        order_id=order_id,
+                        event_type="PAYMENT_CONFIRMED",
+                        message=f"Payment confirmed for order {order_id}",
+                        customer_name=customer_name,
+                        customer_email=customer_email,
+                        items=items,
+                        total_amount=total_amount
+                    )
+
+                    # FULFILLED
+                    logger.info(f"Fulfilling order {order_id}")
+                    processor.fulfill_order(conn, order_id, items, total_amount, prefetch)
+                    transitions.append(("FULFILLED", "Order has been fulfilled", datetime.utcnow()))
+                    notifier.send_notification(
+                        order_id=order_id,
+                        event_type="FULFILLED",
+                        message=f"Order {order_id} has been fulfilled!",
+                        customer_name=customer_name,
+                        customer_email=customer_email,
+                        items=items,
+                        total_amount=total_amount
+                    )
+
+                    # COMPLETED
+                    transitions.append(("COMPLETED", "Order completed successfully", datetime.utcnow()))
+                    processor.record_transitions(conn, order_id, transitions)
+                    notifier.send_notification(
+                        order_id=order_id,
+                        event_type="COMPLETED",
+                        message=f"Order {order_id} completed. Thank you!",
+                        customer_name=customer_name,
+                        customer_email=customer_email,
+                        items=items,
+                        total_amount=total_amount
+                    )
+                else:
+                    # PAYMENT FAILED
+                    processor.update_order_status(conn, order_id, "PAYMENT_FAILED", "Payment processing failed")
+                    # Committed before the customer hears about it, as in the pipeline; the
+                    # pool rolls back whatever is left uncommitted when the connection returns
+                    conn.commit()
+                    notifier.send_notification(
+                        order_id=order_id,
+                        event_type="PAYMENT_FAILED",
+                        message=f"Payment failed for order {order_id}",
+                        customer_name=customer_name,
+                        customer_email=customer_email,
+                        items=items,
+                        total_amount=total_amount
+                    )
+                    ORDERS.inc(result="payment_failed")
+                    return False
+
+                conn.commit()
+                processor.mark_completed(order_id, body.get("created_at"))
+                ORDERS.inc(result="completed")
+                logger.info(f"Successfully processed order: {order_id}")
+                return True
+
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error processing order {order_id}: {e}")
+                if not claimed:
+                    # Without the claim the row may be another worker's PROCESSING or
+                    # already COMPLETED; leave it and let the message come back
+                    ORDERS.inc(result="failed")
+                    return False
+                processor.update_order_status(conn, order_id, "FAILED", str(e))
                 notifier.send_notification(
                     order_id=order_id,
-                    event_type="PAYMENT_FAILED",
-                    message=f"Payment failed for order {order_id}",
+                    event_type="FAILED",
+                    message=f"Order {order_id} failed: {str(e)}",
                     customer_name=customer_name,
                     customer_email=customer_email,
                     items=items,
                     total_amount=total_amount
                 )
+                conn.commit()
+                ORDERS.inc(result="failed")
                 return False
 
-            conn.commit()
-            logger.info(f"Successfully processed order: {order_id}")
-            return True
-
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error processing order {order_id}: {e}")
-            processor.update_order_status(conn, order_id, "FAILED", str(e))
-            notifier.send_notification(
-                order_id=order_id,
-                event_type="FAILED",
-                message=f"Order {order_id} failed: {str(e)}",
-                customer_name=customer_name,
-                customer_email=customer_email,
-                items=items,
-                total_amount=total_amount
-            )
-            conn.commit()
-            return False
-        finally:
-            conn.close()
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in message: {e}")
+    except InvalidMessage as e:
+        logger.error(f"Invalid message: {e}")
+        ORDERS.inc(result="invalid")
         return False
     except Exception as e:
         logger.error(f"Unexpected error processing message: {e}")
+        ORDERS.inc(result="failed")
         return False
 
 
-def main():
+def handle_message(message: dict, processor: OrderProcessor, notifier: SNSNotifier, batcher: SQSMessageBatcher, prefetch: Optional[ItemsPrefetch] = None):
+    success = process_message(message, processor, notifier, prefetch)
+
+    if success:
+        batcher.ack(message)
+    else:
+        batcher.release(message)
+        logger.warning("Message processing failed, will retry")
+
+
+def main(worker_index: int = 0, heartbeat: Optional[Callable[[], None]] = None):
     global running
 
     signal.signal(signal.SIGTERM, signal_handler)
@@ -184,13 +334,151 @@ def main():
     logger.info("Order Processor started")
     logger.info(f"SQS Queue URL: {SQS_QUEUE_URL}")
     logger.info(f"SNS Topic ARN: {SNS_TOPIC_ARN}")
+    logger.info(f"Processing mode: {PROCESSING_MODE}")
+    if PROCESSING_MODE != "pipeline":
+        logger.info(f"Worker concurrency: {WORKER_CONCURRENCY}")
+    logger.info(f"DB pool size: {DB_POOL_MAX_SIZE}")
+    if PROCESSING_MODE == "pipeline" and CLAIM_STALE_AFTER <= SQS_VISIBILITY_TIMEOUT - SQS_HEARTBEAT_MARGIN:
+        logger.warning(
+            f"CLAIM_STALE_AFTER ({CLAIM_STALE_AFTER:.0f}s) is shorter than the claim refresh interval "
+            f"({SQS_VISIBILITY_TIMEOUT - SQS_HEARTBEAT_MARGIN}s); orders waiting between stages can be taken over by duplicate deliveries"
+        )
 
-    processor = OrderProcessor()
+    # Queue-wide duties only need one process per task; workers other than 0 skip them
+    primary = worker_index == 0
+
+    if METRICS_PORT:
+        # Each worker process has its own registry, so each gets its own port
+        start_http_server(METRICS_PORT + worker_index)
+    emf = None
+    if METRICS_EMF_ENABLED:
+        emf = EMFReporter(METRICS_NAMESPACE, interval=METRICS_EMF_INTERVAL, dimensions={"Service": "order-processor"})
+        emf.start()
+
+    db_pool = ConnectionPool(
+        get_db_connection,
+        max_size=DB_POOL_MAX_SIZE,
+        idle_timeout=DB_POOL_IDLE_TIMEOUT,
+        health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL
+    )
+    payments = PaymentClient(
+        create_gateway(
+            PAYMENT_GATEWAY,
+            latency_median=PAYMENT_STUB_LATENCY_MEDIAN,
+            latency_sigma=PAYMENT_STUB_LATENCY_SIGMA,
+            decline_rate=PAYMENT_STUB_DECLINE_RATE,
+            error_rate=PAYMENT_STUB_ERROR_RATE
+        ),
+        max_concurrency=PAYMENT_MAX_CONCURRENCY,
+        timeout=PAYMENT_TIMEOUT,
+        max_attempts=PAYMENT_MAX_ATTEMPTS
+    )
+    payments.start()
+    processor = OrderProcessor(
+        db_pool,
+        payments,
+        claim_stale_after=CLAIM_STALE_AFTER,
+        processed_cache_size=PROCESSED_ORDER_CACHE_SIZE
+    )
     notifier = SNSNotifier(SNS_TOPIC_ARN, AWS_REGION)
+    if NOTIFICATIONS_ASYNC:
+        notifier = NotificationDispatcher(
+            notifier,
+            max_queue_size=NOTIFICATION_QUEUE_SIZE,
+            workers=PIPELINE_NOTIFICATION_CONCURRENCY if PROCESSING_MODE == "pipeline" else 1
+        )
+        notifier.start()
+    batcher = SQSMessageBatcher(
+        sqs_client,
+        SQS_QUEUE_URL,
+        visibility_timeout=SQS_VISIBILITY_TIMEOUT,
+        heartbeat_margin=SQS_HEARTBEAT_MARGIN,
+        on_extend=processor.refresh_claims
+    )
+    batcher.start()
+    if PROCESSING_MODE == "pipeline":
+        workers = OrderPipeline(
+            processor,
+            notifier,
+            batcher,
+            intake_concurrency=PIPELINE_INTAKE_CONCURRENCY,
+            payment_concurrency=PIPELINE_PAYMENT_CONCURRENCY,
+            fulfillment_concurrency=PIPELINE_FULFILLMENT_CONCURRENCY,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            max_in_flight=PIPELINE_MAX_IN_FLIGHT or None,
+            shutdown_timeout=PIPELINE_SHUTDOWN_TIMEOUT
+        )
+        workers.start()
+        submit = workers.submit
+    else:
+        workers = WorkerPool(WORKER_CONCURRENCY)
+        submit = lambda message, prefetch: workers.submit(handle_message, message, processor, notifier, batcher, prefetch)
+    IN_FLIGHT.set_function(lambda: workers.in_flight)
+    relay = None
+    if OUTBOX_RELAY_ENABLED and primary:
+        relay = OutboxRelay(
+            get_db_connection,
+            sqs_client,
+            SQS_QUEUE_URL,
+            batch_size=OUTBOX_BATCH_SIZE,
+            poll_interval=OUTBOX_POLL_INTERVAL,
+            retention_hours=OUTBOX_RETENTION_HOURS
+        )
+        relay.start()
+    partitions = None
+    if STATUS_LOG_PARTITIONS_ENABLED and primary:
+        partitions = StatusLogPartitions(
+            get_db_connection,
+            months_ahead=STATUS_LOG_MONTHS_AHEAD,
+            retention_months=STATUS_LOG_RETENTION_MONTHS,
+            archive_bucket=STATUS_LOG_ARCHIVE_BUCKET or None,
+            archive_prefix=STATUS_LOG_ARCHIVE_PREFIX,
+            s3_client=boto3.client("s3", region_name=AWS_REGION) if STATUS_LOG_ARCHIVE_BUCKET else None
+        )
+        partitions.start()
+    order_stats = None
+    if ORDER_STATS_ROLLUP_ENABLED and primary:
+        order_stats = OrderStatsRollup(get_db_connection, interval=ORDER_STATS_ROLLUP_INTERVAL)
+        order_stats.start()
+    backlog = None
+    if SCALING_METRICS_ENABLED and primary:
+        def task_throughput():
+            # The other workers poll the same queue with the same settings, so the task
+            # as a whole drains it about PROCESS_COUNT times as fast as this one
+            throughput = workers.throughput()
+            return throughput * PROCESS_COUNT if throughput else throughput
+
+        backlog = BacklogReporter(
+            sqs_client,
+            SQS_QUEUE_URL,
+            task_throughput,
+            METRICS_NAMESPACE,
+            ecs_client=boto3.client("ecs", region_name=AWS_REGION) if ECS_CLUSTER_NAME and ECS_SERVICE_NAME else None,
+            cluster=ECS_CLUSTER_NAME,
+            service=ECS_SERVICE_NAME,
+            interval=SCALING_METRICS_INTERVAL,
+            dimensions={"Service": "order-processor"}
+        )
+        backlog.start()
+    batch_size = min(SQS_MAX_BATCH, workers.concurrency)
 
     while running:
+        if heartbeat:
+            heartbeat()
         try:
-            messages = poll_sqs()
+            db_pool.prune()
+
+            # Only receive what we can start right away so messages don't sit idle
+            # locally while their visibility timeout runs down
+            if not workers.wait_for_slot(timeout=1):
+                continue
+            # With work still running, give it a moment to free up a full batch rather
+            # than paying a receive call for one or two messages
+            if workers.in_flight and workers.free_slots() < batch_size:
+                workers.wait_for_slot(timeout=SQS_POLL_LINGER, slots=batch_size)
+
+            max_messages, wait_seconds = poll_parameters(workers.free_slots(), workers.concurrency, workers.in_flight)
+            messages = poll_sqs(max_messages, wait_seconds)
 
             if not messages:
                 logger.debug("No messages received, continuing to poll...")
@@ -198,24 +486,57 @@ def main():
 
             logger.info(f"Received {len(messages)} message(s)")
 
+            prefetch = ItemsPrefetch(messages)
             for message in messages:
                 if not running:
                     break
 
-                success = process_message(message, processor, notifier)
-
-                if success:
-                    delete_message(message["ReceiptHandle"])
-                else:
-                    logger.warning("Message processing failed, will retry")
+                batcher.track(message)
+                submit(message, prefetch)
 
         except Exception as e:
             logger.error(f"Error in main loop: {e}")
             if running:
                 time.sleep(5)
 
+    if backlog:
+        backlog.close()
+    if relay:
+        relay.close()
+    if partitions:
+        partitions.close()
+    if order_stats:
+        order_stats.close()
+    workers.shutdown()
+    batcher.close()
+    if NOTIFICATIONS_ASYNC:
+        notifier.close()
+    processor.close()
+    payments.close()
+    if emf:
+        emf.close()
     logger.info("Order Processor shutting down gracefully")
 
 
+def run_worker(worker_index: int, heartbeat: Callable[[], None]):
+    global sqs_client
+    # A boto3 client must not be shared across a fork
+    sqs_client = boto3.client("sqs", region_name=AWS_REGION)
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(f"%(asctime)s - worker-{worker_index} - %(name)s - %(levelname)s - %(message)s"))
+    main(worker_index, heartbeat)
+
+
 if __name__ == "__main__":
-    main()
+    if PROCESS_COUNT > 1:
+        WorkerSupervisor(
+            run_worker,
+            PROCESS_COUNT,
+            heartbeat_timeout=WORKER_HEARTBEAT_TIMEOUT,
+            shutdown_timeout=WORKER_SHUTDOWN_TIMEOUT,
+            max_restart_backoff=WORKER_RESTART_MAX_BACKOFF,
+            health_file=WORKER_HEALTH_FILE,
+            health_interval=WORKER_HEALTH_INTERVAL
+        ).run()
+    else:
+        main()
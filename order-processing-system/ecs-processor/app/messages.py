@@ -0,0 +1,50 @@
+import base64
+import binascii
+import json
+import zlib
+
+# Order messages on the queue come in three shapes, all decoded to the version 1 dict:
+#   version 1  the original JSON with full key names and item ids
+#   version 2  JSON with short keys and items as [product_name, quantity, unit_price,
+#              subtotal] lists; prefixed with COMPRESSED_PREFIX when it is zlib-compressed
+#              and base64-encoded, which create-order does past a size threshold
+#   claim check  {"v": 2, "id": ..., "ref": "db"}, sent for orders too large to inline;
+#              the processor reads the order from the database instead
+COMPRESSED_PREFIX = "z:"
+CLAIM_CHECK_REF = "db"
+
+SHORT_KEYS = {
+    "id": "order_id",
+    "e": "customer_email",
+    "n": "customer_name",
+    "t": "total_amount",
+    "c": "created_at"
+}
+ITEM_FIELDS = ("product_name", "quantity", "unit_price", "subtotal")
+
+
+class InvalidMessage(ValueError):
+    pass
+
+
+def decode_order_message(body: str) -> dict:
+    try:
+        if body.startswith(COMPRESSED_PREFIX):
+            body = zlib.decompress(base64.b64decode(body[len(COMPRESSED_PREFIX):], validate=True)).decode()
+        message = json.loads(body)
+    except (binascii.Error, zlib.error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidMessage(f"Undecodable message body: {e}")
+    if not isinstance(message, dict):
+        raise InvalidMessage("Message body is not an object")
+
+    version = message.get("v", 1)
+    if version == 1:
+        return message
+    if version != 2:
+        raise InvalidMessage(f"Unsupported message version {version!r}")
+
+    if message.get("ref") == CLAIM_CHECK_REF:
+        return {"order_id": message.get("id"), "claim_check": True}
+    order = {name: message[key] for key, name in SHORT_KEYS.items() if key in message}
+    order["items"] = [dict(zip(ITEM_FIELDS, item)) for item in message.get("i", [])]
+    return order
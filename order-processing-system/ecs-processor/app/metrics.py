@@ -0,0 +1,279 @@
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a fast DB round trip up to a slow payment with retries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_value(value: float) -> str:
+    # Exact integers for counts; repr keeps full precision for sums
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._function: Optional[Callable[[], float]] = None
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        # Read on every scrape instead of being pushed
+        self._function = function
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        return [(self.name, (), self._function() if self._function else self._value)]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label key -> ([count per bucket, not cumulative], sum)
+        self._values: Dict[LabelKey, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[LabelKey, Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        samples = []
+        for key, (counts, total) in self.snapshot().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", key + (("le", le),), cumulative))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets))
+
+    @property
+    def metrics(self):
+        return list(self._metrics)
+
+    def render(self) -> str:
+        # Prometheus text exposition format 0.0.4
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SQS_POLL_SECONDS = REGISTRY.histogram("order_processor_sqs_poll_seconds", "Time spent in ReceiveMessage, including long-poll waits")
+DB_SECONDS = REGISTRY.histogram("order_processor_db_seconds", "Time spent on order status writes, by operation")
+PAYMENT_SECONDS = REGISTRY.histogram("order_processor_payment_seconds", "Time to settle a payment, including retries")
+FULFILLMENT_SECONDS = REGISTRY.histogram("order_processor_fulfillment_seconds", "Time spent fulfilling an order")
+SNS_PUBLISH_SECONDS = REGISTRY.histogram("order_processor_sns_publish_seconds", "Time per SNS Publish or PublishBatch call")
+ORDER_LATENCY_SECONDS = REGISTRY.histogram(
+    "order_processor_order_latency_seconds",
+    "Time from order creation to the order being completed",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0)
+)
+ORDERS = REGISTRY.counter("order_processor_orders_total", "Deliveries handled, by result")
+RETRIES = REGISTRY.counter("order_processor_retries_total", "Retried external calls, by operation")
+IN_FLIGHT = REGISTRY.gauge("order_processor_in_flight_messages", "SQS messages received and not yet acked or released")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the application log
+        pass
+
+
+def start_http_server(port: int, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on :{port}/metrics")
+    return server
+
+
+def emit_emf(namespace: str, name: str, value, unit: str, dimensions: Optional[Dict[str, str]] = None, timestamp: Optional[int] = None, stream=None):
+    # One CloudWatch Embedded Metric Format line; the awslogs driver ships it and
+    # CloudWatch turns it into a metric datapoint
+    dimensions = dimensions or {}
+    document = {
+        "_aws": {
+            "Timestamp": timestamp or int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [sorted(dimensions)] if dimensions else [[]],
+                "Metrics": [{"Name": name, "Unit": unit}]
+            }]
+        },
+        name: value,
+        **dimensions
+    }
+    stream = stream or sys.stdout
+    stream.write(json.dumps(document) + "\n")
+    stream.flush()
+
+
+# Writes the registry to stdout as CloudWatch Embedded Metric Format, one JSON line per
+# metric series and interval. Counters and histograms are reported as the change since
+# the previous flush; histogram buckets become EMF Values/Counts pairs (bucket upper
+# bound, observations) so CloudWatch can still compute percentiles.
+class EMFReporter:
+    def __init__(self, namespace: str, interval: float = 60, registry: Registry = REGISTRY, dimensions: Optional[Dict[str, str]] = None, stream=None):
+        self.namespace = namespace
+        self.interval = interval
+        self.registry = registry
+        self.dimensions = dimensions or {}
+        self.stream = stream or sys.stdout
+        self._previous: Dict[Tuple[str, LabelKey], object] = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-emf", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+
+    def flush(self):
+        timestamp = int(time.time() * 1000)
+        for metric in self.registry.metrics:
+            for key, value in self._deltas(metric):
+                self._emit(timestamp, metric.name, key, value, "Seconds" if metric.type == "histogram" else "Count")
+
+    def _deltas(self, metric):
+        if metric.type == "gauge":
+            return [((), metric.samples()[0][2])]
+
+        deltas = []
+        if metric.type == "counter":
+            for _, key, value in metric.samples():
+                change = value - self._previous.get((metric.name, key), 0)
+                self._previous[(metric.name, key)] = value
+                if change:
+                    deltas.append((key, change))
+            return deltas
+
+        for key, (counts, _) in metric.snapshot().items():
+            previous = self._previous.get((metric.name, key)) or [0] * len(counts)
+            self._previous[(metric.name, key)] = counts
+            values, value_counts = [], []
+            for bound, now, before in zip(metric.buckets, counts, previous):
+                if now > before:
+                    # The overflow bucket has no upper bound; report it at the largest finite one
+                    values.append(bound if bound != float("inf") else metric.buckets[-2])
+                    value_counts.append(now - before)
+            if values:
+                deltas.append((key, {"Values": values, "Counts": value_counts}))
+        return deltas
+
+    def _emit(self, timestamp: int, name: str, key: LabelKey, value, unit: str):
+        emit_emf(self.namespace, name, value, unit, dict(self.dimensions, **dict(key)), timestamp=timestamp, stream=self.stream)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing EMF metrics: {e}")
@@ -1,18 +1,162 @@
 import json
 import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
 
+from metrics import RETRIES, SNS_PUBLISH_SECONDS
+
 logger = logging.getLogger(__name__)
 
+# (emoji, title, blurb, subject) per event type
+_EVENT_DISPLAY = {
+    "ORDER_CREATED": ("🛒", "Order Received", "We've received your order and it's being prepared for processing.", "Order Confirmed"),
+    "PROCESSING": ("⚙️", "Order Processing", "Your order is now being processed. We'll update you on the progress.", "Processing Your Order"),
+    "PAYMENT_CONFIRMED": ("💳", "Payment Confirmed", "Great news! Your payment has been successfully processed.", "Payment Received"),
+    "PAYMENT_FAILED": ("❌", "Payment Failed", "Unfortunately, we couldn't process your payment. Please check your payment details.", "Payment Issue"),
+    "FULFILLED": ("📦", "Order Shipped", "Your order has been packed and is on its way!", "Your Order Has Shipped!"),
+    "COMPLETED": ("✅", "Order Completed", "Your order has been completed successfully. Thank you for your purchase!", "Order Delivered"),
+    "CANCELLED": ("🚫", "Order Cancelled", "Your order has been cancelled as requested.", "Order Cancelled"),
+    "FAILED": ("⚠️", "Order Issue", "We encountered an issue with your order. Our team is looking into it.", "Order Issue")
+}
+
+# Rendered items tables kept for orders still moving through their lifecycle
+ITEMS_CACHE_SIZE = 256
+
+_SEPARATOR = "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+
+# Status-specific content shown after the order details
+_EVENT_SECTIONS = {
+    "COMPLETED": f"""
+{_SEPARATOR}
+
+🎉 Thank you for your purchase!
+
+We hope you enjoy your order. If you have any questions or need
+assistance, our customer support team is here to help.
+
+📧 Support: support@orderprocessing.com
+📞 Phone: 1-800-123-4567
+🌐 Website: www.orderprocessing.com
+
+We appreciate your business and look forward to serving you again!
+
+""",
+    "PAYMENT_FAILED": f"""
+{_SEPARATOR}
+
+⚠️  WHAT TO DO NEXT:
+
+   1. Verify your payment details are correct
+   2. Ensure sufficient funds are available
+   3. Try placing your order again
+
+If you continue to experience issues, please contact our support team.
+
+📧 Support: support@orderprocessing.com
+📞 Phone: 1-800-123-4567
+
+""",
+    "FULFILLED": f"""
+{_SEPARATOR}
+
+📦 SHIPPING INFORMATION
+
+Your order is on its way! Estimated delivery: 3-5 business days
+
+Track your package using your Order Number above.
+
+""",
+    "PAYMENT_CONFIRMED": f"""
+{_SEPARATOR}
+
+💳 Your payment has been processed successfully.
+
+Your order will be prepared for shipping shortly. You'll receive
+another notification when your order ships.
+
+"""
+}
+
+_FOOTER = f"""
+{_SEPARATOR}
+This is an automated message from Order Processing System.
+Please do not reply directly to this email.
+
+© 2025 Order Processing Inc. All rights reserved.
+{_SEPARATOR}
+"""
+
+_BOX_DIVIDER = "├──────────────────────────────────────────────────────────────┤\n"
+_BOX_BOTTOM = "└──────────────────────────────────────────────────────────────┘\n"
+
+_DETAILS_ORDER_NUMBER = """
+┌──────────────────────────────────────────────────────────────┐
+│                      ORDER DETAILS                           │
+├──────────────────────────────────────────────────────────────┤
+│  Order Number:  #"""
+_DETAILS_ORDER_DATE = "                              \n│  Order Date:    "
+
+_ITEMS_HEADER = """
+┌──────────────────────────────────────────────────────────────┐
+│                       ORDER ITEMS                            │
+├──────────────────────────────────────────────────────────────┤
+"""
+
+_ITEMS_TOTALS = (
+    "│  SUBTOTAL:                                       {total}\n"
+    "│  SHIPPING:                                       $0.00\n"
+    "│  TAX:                                            $0.00\n"
+    + _BOX_DIVIDER +
+    "│  TOTAL:                                          {total}\n"
+)
+
+
+class EmailTemplate:
+    __slots__ = ("header", "blurb", "details_status", "closing", "subject_prefix")
+
+    def __init__(self, header: str, blurb: str, details_status: str, closing: str, subject_prefix: str):
+        self.header = header
+        self.blurb = blurb
+        self.details_status = details_status
+        self.closing = closing
+        self.subject_prefix = subject_prefix
+
+
+def _compile_template(event_type: str, message: str = None) -> EmailTemplate:
+    emoji, title, blurb, subject = _EVENT_DISPLAY.get(event_type, ("📋", "Order Update", message, "Order Update"))
+    return EmailTemplate(
+        header=f"""
+╔══════════════════════════════════════════════════════════════╗
+                    {emoji} {title.upper()} {emoji}
+╚══════════════════════════════════════════════════════════════╝
+
+""",
+        blurb=f"{blurb}\n\n",
+        details_status=f"\n│  Status:        {title}\n",
+        closing=_EVENT_SECTIONS.get(event_type, "") + _FOOTER,
+        subject_prefix=f"{emoji} {subject} - #"
+    )
+
+
+# Static parts of every email are rendered once at import; only the per-order fields
+# and the item rows are formatted for each notification
+EMAIL_TEMPLATES = {event_type: _compile_template(event_type) for event_type in _EVENT_DISPLAY}
+_DEFAULT_TEMPLATE = _compile_template(None)
+
 
 class SNSNotifier:
     def __init__(self, topic_arn: str, region: str = "us-east-1"):
         self.topic_arn = topic_arn
         self.sns_client = boto3.client("sns", region_name=region)
+        self._items_cache = OrderedDict()
+        self._items_lock = threading.Lock()
 
     def send_notification(
         self,
@@ -26,7 +170,7 @@ class SNSNotifier:
         attributes: Optional[dict] = None
     ) -> bool:
         try:
-            email_body = self._format_email_body(
+            entry = self.build_entry(
                 order_id=order_id,
                 event_type=event_type,
                 message=message,
@@ -36,19 +180,9 @@ class SNSNotifier:
                 total_amount=total_amount,
                 attributes=attributes
             )
-            subject = self._get_subject(event_type, order_id)
-
-            message_attributes = {
-                "event_type": {"DataType": "String", "StringValue": event_type},
-                "order_id": {"DataType": "String", "StringValue": order_id}
-            }
 
-            response = self.sns_client.publish(
-                TopicArn=self.topic_arn,
-                Message=email_body,
-                Subject=subject,
-                MessageAttributes=message_attributes
-            )
+            with SNS_PUBLISH_SECONDS.time(operation="publish"):
+                response = self.sns_client.publish(TopicArn=self.topic_arn, **entry)
 
             logger.info(f"SNS notification sent: {event_type} for order {order_id} (MessageId: {response.get('MessageId')})")
             return True
@@ -60,6 +194,57 @@ class SNSNotifier:
             logger.error(f"Unexpected error sending SNS notification: {e}")
             return False
 
+    def build_entry(
+        self,
+        order_id: str,
+        event_type: str,
+        message: str,
+        customer_name: str = None,
+        customer_email: str = None,
+        items: List[Dict] = None,
+        total_amount: float = None,
+        attributes: Optional[dict] = None
+    ) -> dict:
+        email_body = self._format_email_body(
+            order_id=order_id,
+            event_type=event_type,
+            message=message,
+            customer_name=customer_name,
+            customer_email=customer_email,
+            items=items,
+            total_amount=total_amount,
+            attributes=attributes
+        )
+        return {
+            "Message": email_body,
+            "Subject": self._get_subject(event_type, order_id),
+            "MessageAttributes": {
+                "event_type": {"DataType": "String", "StringValue": event_type},
+                "order_id": {"DataType": "String", "StringValue": order_id}
+            }
+        }
+
+    def publish_batch(self, entries: List[dict]) -> List[Tuple[dict, bool]]:
+        # Returns the entries that were not published, each with whether a retry may succeed
+        batch = {str(i): entry for i, entry in enumerate(entries)}
+        try:
+            with SNS_PUBLISH_SECONDS.time(operation="publish_batch"):
+                response = self.sns_client.publish_batch(
+                    TopicArn=self.topic_arn,
+                    PublishBatchRequestEntries=[{"Id": entry_id, **entry} for entry_id, entry in batch.items()]
+                )
+        except Exception as e:
+            logger.error(f"Failed to publish SNS batch: {e}")
+            return [(entry, True) for entry in entries]
+
+        if response.get("Successful"):
+            logger.info(f"SNS batch published: {len(response['Successful'])} notification(s)")
+        failed = []
+        for failure in response.get("Failed", []):
+            logger.error(f"SNS rejected notification: {failure.get('Code')} - {failure.get('Message')}")
+            failed.append((batch[failure["Id"]], not failure.get("SenderFault")))
+        return failed
+
     def _format_email_body(
         self,
         order_id: str,
@@ -71,184 +256,157 @@ class SNSNotifier:
         total_amount: float = None,
         attributes: Optional[dict] = None
     ) -> str:
+        template = EMAIL_TEMPLATES.get(event_type) or _compile_template(event_type, message)
         timestamp = datetime.utcnow().strftime("%B %d, %Y at %I:%M %p UTC")
-        
-        status_emoji = {
-            "ORDER_CREATED": "🛒",
-            "PROCESSING": "⚙️",
-            "PAYMENT_CONFIRMED": "💳",
-            "PAYMENT_FAILED": "❌",
-            "FULFILLED": "📦",
-            "COMPLETED": "✅",
-            "CANCELLED": "🚫",
-            "FAILED": "⚠️"
-        }
-        
-        status_title = {
-            "ORDER_CREATED": "Order Received",
-            "PROCESSING": "Order Processing",
-            "PAYMENT_CONFIRMED": "Payment Confirmed",
-            "PAYMENT_FAILED": "Payment Failed",
-            "FULFILLED": "Order Shipped",
-            "COMPLETED": "Order Completed",
-            "CANCELLED": "Order Cancelled",
-            "FAILED": "Order Issue"
-        }
-        
-        status_message = {
-            "ORDER_CREATED": "We've received your order and it's being prepared for processing.",
-            "PROCESSING": "Your order is now being processed. We'll update you on the progress.",
-            "PAYMENT_CONFIRMED": "Great news! Your payment has been successfully processed.",
-            "PAYMENT_FAILED": "Unfortunately, we couldn't process your payment. Please check your payment details.",
-            "FULFILLED": "Your order has been packed and is on its way!",
-            "COMPLETED": "Your order has been completed successfully. Thank you for your purchase!",
-            "CANCELLED": "Your order has been cancelled as requested.",
-            "FAILED": "We encountered an issue with your order. Our team is looking into it."
-        }
-        
-        emoji = status_emoji.get(event_type, "📋")
-        title = status_title.get(event_type, "Order Update")
-        friendly_message = status_message.get(event_type, message)
-        
-        # Header
-        email_body = f"""
-╔══════════════════════════════════════════════════════════════╗
-                    {emoji} {title.upper()} {emoji}
-╚══════════════════════════════════════════════════════════════╝
 
-"""
-        
-        # Customer greeting
-        if customer_name:
-            email_body += f"Hello {customer_name},\n\n"
-        else:
-            email_body += "Hello,\n\n"
-        
-        email_body += f"{friendly_message}\n\n"
-        
-        # Order details box
-        email_body += f"""
-┌──────────────────────────────────────────────────────────────┐
-│                      ORDER DETAILS                           │
-├──────────────────────────────────────────────────────────────┤
-│  Order Number:  #{order_id[:8].upper()}                              
-│  Order Date:    {timestamp}
-│  Status:        {title}
-"""
+        parts = [
+            template.header,
+            f"Hello {customer_name},\n\n" if customer_name else "Hello,\n\n",
+            template.blurb,
+            _DETAILS_ORDER_NUMBER,
+            order_id[:8].upper(),
+            _DETAILS_ORDER_DATE,
+            timestamp,
+            template.details_status
+        ]
         if customer_email:
-            email_body += f"│  Email:         {customer_email}\n"
-        
-        email_body += "└──────────────────────────────────────────────────────────────┘\n"
-        
-        # Items table
-        if items and len(items) > 0:
-            email_body += """
-┌──────────────────────────────────────────────────────────────┐
-│                       ORDER ITEMS                            │
-├──────────────────────────────────────────────────────────────┤
-"""
-            for item in items:
-                product_name = item.get('product_name', 'Unknown Item')
-                quantity = item.get('quantity', 1)
-                unit_price = item.get('unit_price', 0)
-                subtotal = item.get('subtotal', quantity * unit_price)
-                
-                # Truncate long product names
-                if len(product_name) > 30:
-                    product_name = product_name[:27] + "..."
-                
-                email_body += f"│  {product_name:<32}\n"
-                email_body += f"│      {quantity} x ${unit_price:,.2f}                          ${subtotal:,.2f}\n"
-                email_body += "│\n"
-            
-            email_body += "├──────────────────────────────────────────────────────────────┤\n"
-            
-            if total_amount is not None:
-                email_body += f"│  SUBTOTAL:                                       ${total_amount:,.2f}\n"
-                email_body += f"│  SHIPPING:                                       $0.00\n"
-                email_body += f"│  TAX:                                            $0.00\n"
-                email_body += "├──────────────────────────────────────────────────────────────┤\n"
-                email_body += f"│  TOTAL:                                          ${total_amount:,.2f}\n"
-            
-            email_body += "└──────────────────────────────────────────────────────────────┘\n"
-        
-        # Status-specific additional content
-        if event_type == "COMPLETED":
-            email_body += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+            parts.append(f"│  Email:         {customer_email}\n")
+        parts.append(_BOX_BOTTOM)
 
-🎉 Thank you for your purchase!
+        if items:
+            parts.append(self._render_items(order_id, items, total_amount))
 
-We hope you enjoy your order. If you have any questions or need
-assistance, our customer support team is here to help.
+        parts.append(template.closing)
+        return "".join(parts)
 
-📧 Support: support@orderprocessing.com
-📞 Phone: 1-800-123-4567
-🌐 Website: www.orderprocessing.com
+    def _render_items(self, order_id: str, items: List[Dict], total_amount: float) -> str:
+        # Every notification for an order repeats the same items table, so it is rendered once
+        key = (order_id, len(items), total_amount)
+        with self._items_lock:
+            cached = self._items_cache.get(key)
+            if cached is not None:
+                self._items_cache.move_to_end(key)
+                return cached
 
-We appreciate your business and look forward to serving you again!
+        parts = [_ITEMS_HEADER]
+        for item in items:
+            product_name = item.get('product_name', 'Unknown Item')
+            quantity = item.get('quantity', 1)
+            unit_price = item.get('unit_price', 0)
+            subtotal = item.get('subtotal', quantity * unit_price)
 
-"""
-        elif event_type == "PAYMENT_FAILED":
-            email_body += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+            # Truncate long product names
+            if len(product_name) > 30:
+                product_name = product_name[:27] + "..."
 
-⚠️  WHAT TO DO NEXT:
+            parts.append(
+                f"│  {product_name:<32}\n"
+                f"│      {quantity} x ${unit_price:,.2f}                          ${subtotal:,.2f}\n"
+                "│\n"
+            )
 
-   1. Verify your payment details are correct
-   2. Ensure sufficient funds are available
-   3. Try placing your order again
+        parts.append(_BOX_DIVIDER)
+        if total_amount is not None:
+            parts.append(_ITEMS_TOTALS.format(total=f"${total_amount:,.2f}"))
+        parts.append(_BOX_BOTTOM)
+        rendered = "".join(parts)
 
-If you continue to experience issues, please contact our support team.
+        with self._items_lock:
+            self._items_cache[key] = rendered
+            if len(self._items_cache) > ITEMS_CACHE_SIZE:
+                self._items_cache.popitem(last=False)
+        return rendered
 
-📧 Support: support@orderprocessing.com
-📞 Phone: 1-800-123-4567
+    def _get_subject(self, event_type: str, order_id: str) -> str:
+        template = EMAIL_TEMPLATES.get(event_type, _DEFAULT_TEMPLATE)
+        return template.subject_prefix + order_id[:8].upper()
 
-"""
-        elif event_type == "FULFILLED":
-            email_body += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-📦 SHIPPING INFORMATION
+# Takes SNS publishing off the order path: notifications are queued in memory and a
+# background thread renders them and sends them with PublishBatch (10 per call),
+# retrying with exponential backoff. When the queue is full the caller publishes
+# synchronously, so a slow SNS slows processing down instead of dropping emails.
+class NotificationDispatcher:
+    def __init__(
+        self,
+        notifier: SNSNotifier,
+        max_queue_size: int = 1000,
+        max_attempts: int = 5,
+        base_backoff: float = 0.5,
+        batch_linger: float = 0.05,
+        workers: int = 1
+    ):
+        self.notifier = notifier
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.batch_linger = batch_linger
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"sns-dispatcher-{i}", daemon=True)
+            for i in range(workers)
+        ]
 
-Your order is on its way! Estimated delivery: 3-5 business days
+    def start(self):
+        for thread in self._threads:
+            thread.start()
 
-Track your package using your Order Number above.
+    def send_notification(self, order_id: str, event_type: str, message: str, **kwargs) -> bool:
+        notification = dict(order_id=order_id, event_type=event_type, message=message, **kwargs)
+        try:
+            self._queue.put_nowait(notification)
+            return True
+        except queue.Full:
+            logger.warning(f"Notification queue full, publishing {event_type} for order {order_id} inline")
+            return self.notifier.send_notification(**notification)
 
-"""
-        elif event_type == "PAYMENT_CONFIRMED":
-            email_body += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    def close(self, timeout: float = 30):
+        logger.info(f"Flushing {self._queue.qsize()} queued notification(s)")
+        self._stopped.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0, deadline - time.monotonic()))
+        if any(thread.is_alive() for thread in self._threads):
+            logger.error(f"Gave up flushing notifications; {self._queue.qsize()} left unsent")
 
-💳 Your payment has been processed successfully.
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._publish(batch)
 
-Your order will be prepared for shipping shortly. You'll receive
-another notification when your order ships.
+    def _next_batch(self) -> List[dict]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
 
-"""
-        
-        # Footer
-        email_body += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-This is an automated message from Order Processing System.
-Please do not reply directly to this email.
+        # Wait briefly for more notifications so bursts share one PublishBatch call
+        deadline = time.monotonic() + self.batch_linger
+        while len(batch) < 10:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
 
-© 2025 Order Processing Inc. All rights reserved.
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-        
-        return email_body
+    def _publish(self, batch: List[dict]):
+        entries = []
+        for notification in batch:
+            try:
+                entries.append(self.notifier.build_entry(**notification))
+            except Exception as e:
+                logger.error(f"Failed to render {notification['event_type']} notification for order {notification['order_id']}: {e}")
 
-    def _get_subject(self, event_type: str, order_id: str) -> str:
-        short_id = order_id[:8].upper()
-        subjects = {
-            "ORDER_CREATED": f"🛒 Order Confirmed - #{short_id}",
-            "PROCESSING": f"⚙️ Processing Your Order - #{short_id}",
-            "PAYMENT_CONFIRMED": f"💳 Payment Received - #{short_id}",
-            "PAYMENT_FAILED": f"❌ Payment Issue - #{short_id}",
-            "FULFILLED": f"📦 Your Order Has Shipped! - #{short_id}",
-            "COMPLETED": f"✅ Order Delivered - #{short_id}",
-            "CANCELLED": f"🚫 Order Cancelled - #{short_id}",
-            "FAILED": f"⚠️ Order Issue - #{short_id}"
-        }
-        return subjects.get(event_type, f"📋 Order Update - #{short_id}")
\ No newline at end of file
+        for attempt in range(1, self.max_attempts + 1):
+            if not entries:
+                return
+            failed = self.notifier.publish_batch(entries)
+            entries = [entry for entry, retryable in failed if retryable]
+            if entries and attempt < self.max_attempts:
+                RETRIES.inc(len(entries), operation="sns_publish")
+                time.sleep(self.base_backoff * 2 ** (attempt - 1))
+
+        if entries:
+            logger.error(f"Dropping {len(entries)} notification(s) after {self.max_attempts} attempts")
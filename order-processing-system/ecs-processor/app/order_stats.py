@@ -0,0 +1,98 @@
+import logging
+import threading
+from typing import Callable
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# Held for a rollup transaction so only one ECS task at a time updates the totals
+ADVISORY_LOCK_KEY = 727_002
+
+# Deltas from transactions that haven't committed yet are invisible here and are picked
+# up by a later rollup
+ROLLUP_QUERY = """
+    WITH moved AS (
+        DELETE FROM order_stats_deltas
+        WHERE id IN (SELECT id FROM order_stats_deltas ORDER BY id LIMIT %s)
+        RETURNING status, day, order_count, total_amount
+    ), by_status AS (
+        INSERT INTO order_status_totals AS t (status, order_count, total_amount)
+        SELECT status, sum(order_count), sum(total_amount) FROM moved GROUP BY status
+        ON CONFLICT (status) DO UPDATE
+        SET order_count = t.order_count + EXCLUDED.order_count, total_amount = t.total_amount + EXCLUDED.total_amount
+    ), by_day AS (
+        INSERT INTO order_daily_totals AS t (day, status, order_count, total_amount)
+        SELECT day, status, sum(order_count), sum(total_amount) FROM moved WHERE day IS NOT NULL GROUP BY day, status
+        ON CONFLICT (day, status) DO UPDATE
+        SET order_count = t.order_count + EXCLUDED.order_count, total_amount = t.total_amount + EXCLUDED.total_amount
+    )
+    SELECT count(*) FROM moved
+"""
+
+
+# Folds the order_stats_deltas rows written by the triggers on orders into
+# order_status_totals and order_daily_totals, so GET /orders/stats only has to add up
+# the few deltas written since the last rollup
+class OrderStatsRollup:
+    def __init__(self, connect: Callable, interval: float = 10, batch_size: int = 10000):
+        self._connect = connect
+        self.interval = interval
+        self.batch_size = batch_size
+        # Kept across rollups and only replaced after an error
+        self._conn = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="order-stats-rollup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._close_connection()
+
+    def rollup(self) -> int:
+        moved = 0
+        conn = self._connection()
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                while True:
+                    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ADVISORY_LOCK_KEY,))
+                    if not cur.fetchone()[0]:
+                        conn.rollback()
+                        break
+                    cur.execute(ROLLUP_QUERY, (self.batch_size,))
+                    count = cur.fetchone()[0]
+                    conn.commit()
+                    moved += count
+                    if count < self.batch_size:
+                        break
+        except psycopg2.Error:
+            self._close_connection()
+            raise
+        if moved:
+            logger.info(f"Rolled {moved} order stats delta(s) into the totals")
+        return moved
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.rollup()
+            except Exception as e:
+                logger.error(f"Error rolling up order stats: {e}")
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._connect()
+        return self._conn
+
+    def _close_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
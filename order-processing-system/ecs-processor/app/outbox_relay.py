@@ -0,0 +1,232 @@
+import logging
+import select
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# SendMessageBatch takes at most 10 messages and 256 KB in total
+SQS_BATCH_SIZE = 10
+SQS_BATCH_MAX_BYTES = 262144
+# Allowance per message for the OrderId attribute, which counts toward the size too
+SQS_ATTRIBUTE_BYTES = 64
+OUTBOX_CHANNEL = "order_outbox"
+
+CLAIM_QUERY = """
+    SELECT id, order_id, message_body
+    FROM order_outbox
+    WHERE sent_at IS NULL
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+PRUNE_QUERY = """
+    DELETE FROM order_outbox
+    WHERE id IN (
+        SELECT id FROM order_outbox
+        WHERE sent_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+        LIMIT %s
+    )
+"""
+
+
+# Moves messages written to order_outbox by create-order onto the SQS queue. Rows are
+# claimed with FOR UPDATE SKIP LOCKED, so every ECS task can run a relay without two of
+# them sending the same row, and are marked sent in the transaction that claimed them.
+# A crash between SendMessageBatch and the commit sends those rows again: delivery is
+# at least once, same as SQS itself.
+class OutboxRelay:
+    def __init__(
+        self,
+        connect: Callable,
+        sqs_client,
+        queue_url: str,
+        batch_size: int = 100,
+        poll_interval: float = 5.0,
+        retention_hours: float = 24,
+        prune_interval: float = 300,
+        send_concurrency: int = 4
+    ):
+        self._connect = connect
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention_hours = retention_hours
+        self.prune_interval = prune_interval
+        self._executor = ThreadPoolExecutor(max_workers=send_concurrency, thread_name_prefix="outbox-send")
+        self._conn = None
+        self._last_pruned = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._close_connection()
+        logger.info("Outbox relay stopped")
+
+    def relay_once(self) -> int:
+        conn = self._connection()
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                cur.execute(CLAIM_QUERY, (self.batch_size,))
+                rows = cur.fetchall()
+                if not rows:
+                    conn.rollback()
+                    return 0
+
+                sent_ids = self._send(rows)
+                if sent_ids:
+                    cur.execute("UPDATE order_outbox SET sent_at = CURRENT_TIMESTAMP WHERE id = ANY(%s)", (sent_ids,))
+            conn.commit()
+        except psycopg2.Error:
+            self._close_connection()
+            raise
+
+        if sent_ids:
+            logger.info(f"Relayed {len(sent_ids)} outbox message(s) to SQS")
+        return len(sent_ids)
+
+    def prune(self) -> int:
+        conn = self._connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(PRUNE_QUERY, (self.retention_hours, 1000))
+                deleted = cur.rowcount
+            conn.commit()
+        except psycopg2.Error:
+            self._close_connection()
+            raise
+
+        if deleted:
+            logger.info(f"Pruned {deleted} sent outbox row(s)")
+        return deleted
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                # Keep draining while full batches go out; otherwise wait for a NOTIFY
+                if self.relay_once() >= self.batch_size:
+                    continue
+                if time.monotonic() - self._last_pruned >= self.prune_interval:
+                    self._last_pruned = time.monotonic()
+                    self.prune()
+                self._wait_for_notify()
+            except Exception as e:
+                logger.error(f"Error relaying outbox messages: {e}")
+                self._stopped.wait(self.poll_interval)
+
+    def _wait_for_notify(self):
+        # Sleeps in short slices so close() is not held up; the poll interval is only a
+        # backstop for rows whose NOTIFY went out while no relay was listening
+        conn = self._connection()
+        deadline = time.monotonic() + self.poll_interval
+        while not self._stopped.is_set():
+            if conn.notifies:
+                conn.notifies.clear()
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if select.select([conn], [], [], min(remaining, 1.0))[0]:
+                conn.poll()
+
+    def _send(self, rows: List[Tuple]) -> List[int]:
+        chunks, chunk, size = [], [], 0
+        for row in rows:
+            row_size = len(row[2].encode()) + SQS_ATTRIBUTE_BYTES
+            if chunk and (len(chunk) == SQS_BATCH_SIZE or size + row_size > SQS_BATCH_MAX_BYTES):
+                chunks.append(chunk)
+                chunk, size = [], 0
+            chunk.append(row)
+            size += row_size
+        if chunk:
+            chunks.append(chunk)
+        sent_ids = []
+        for chunk_ids in self._executor.map(self._send_chunk, chunks):
+            sent_ids.extend(chunk_ids)
+        return sent_ids
+
+    def _send_chunk(self, chunk: List[Tuple]) -> List[int]:
+        try:
+            response = self.sqs_client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {
+                        "Id": str(outbox_id),
+                        "MessageBody": message_body,
+                        "MessageAttributes": {"OrderId": {"DataType": "String", "StringValue": str(order_id)}}
+                    }
+                    for outbox_id, order_id, message_body in chunk
+                ]
+            )
+        except Exception as e:
+            # Left unsent; the next pass picks them up again
+            logger.error(f"Error sending outbox batch to SQS: {e}")
+            return []
+
+        for failure in response.get("Failed", []):
+            logger.error(f"SQS rejected outbox message {failure['Id']}: {failure.get('Code')} - {failure.get('Message')}")
+        return [int(success["Id"]) for success in response.get("Successful", [])]
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {OUTBOX_CHANNEL}")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _close_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def main():
+    # Standalone entry point (python outbox_relay.py) for running the relay apart from the processor
+    import main as app
+
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping outbox relay...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    relay = OutboxRelay(
+        app.get_db_connection,
+        app.sqs_client,
+        app.SQS_QUEUE_URL,
+        batch_size=app.OUTBOX_BATCH_SIZE,
+        poll_interval=app.OUTBOX_POLL_INTERVAL,
+        retention_hours=app.OUTBOX_RETENTION_HOURS
+    )
+    logger.info(f"Outbox relay started for {app.SQS_QUEUE_URL}")
+    relay.start()
+    while not stop.wait(timeout=1):
+        pass
+    relay.close()
+
+
+if __name__ == "__main__":
+    main()
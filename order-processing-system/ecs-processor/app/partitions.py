@@ -0,0 +1,328 @@
+import argparse
+import gzip
+import logging
+import os
+import re
+import tempfile
+import threading
+from datetime import date, datetime
+from typing import Callable, List, Optional
+
+import psycopg2
+from psycopg2 import extensions, sql
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "order_status_log"
+DEFAULT_PARTITION = "order_status_log_default"
+PARTITION_NAME = re.compile(r"^order_status_log_(\d{4})_(\d{2})$")
+# Held for a maintenance run so only one ECS task at a time changes partitions
+ADVISORY_LOCK_KEY = 727_001
+
+# Same layout as database/init.sql; used by migrate()
+PARTITIONED_TABLE_DDL = """
+    CREATE TABLE order_status_log (
+        id UUID NOT NULL,
+        order_id UUID NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+        status VARCHAR(50) NOT NULL,
+        message TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    CREATE TABLE order_status_log_default PARTITION OF order_status_log DEFAULT;
+    CREATE INDEX idx_order_status_log_created_at ON order_status_log(order_id, created_at DESC);
+"""
+
+ATTACHED_QUERY = """
+    SELECT c.relname
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'order_status_log'::regclass
+"""
+
+# Monthly tables detached earlier and not archived yet
+DETACHED_QUERY = """
+    SELECT c.relname
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind = 'r' AND NOT c.relispartition
+      AND n.nspname = current_schema() AND c.relname ~ '^order_status_log_[0-9]{4}_[0-9]{2}$'
+"""
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+# Keeps order_status_log partitioned by month: creates partitions months_ahead of time,
+# moves rows that landed in the default partition into their month, and takes months
+# older than retention_months out of the table. Those are detached and left as plain
+# tables, or, with archive_bucket set, uploaded to S3 as gzipped CSV and dropped once the
+# upload is confirmed. retention_months=0 keeps everything.
+class StatusLogPartitions:
+    def __init__(
+        self,
+        connect: Callable,
+        months_ahead: int = 3,
+        retention_months: int = 12,
+        archive_bucket: Optional[str] = None,
+        archive_prefix: str = "",
+        s3_client=None,
+        interval: float = 6 * 3600
+    ):
+        self._connect = connect
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.archive_bucket = archive_bucket
+        self.archive_prefix = archive_prefix
+        self.s3_client = s3_client
+        self.interval = interval
+        # Kept between runs and only replaced after a database error
+        self._conn = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="partition-maintenance", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._close_connection()
+
+    def maintain(self, today: Optional[date] = None) -> bool:
+        today = today or datetime.utcnow().date()
+        conn = self._connection()
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+                if not cur.fetchone()[0]:
+                    logger.info("Partition maintenance is running elsewhere, skipping")
+                    conn.rollback()
+                    return False
+                conn.commit()
+                try:
+                    return self._maintain(conn, cur, today)
+                finally:
+                    # A session lock outlives the run on a kept connection; a failed
+                    # transaction has to be ended before it can be unlocked
+                    conn.rollback()
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+                    conn.commit()
+        except psycopg2.Error:
+            self._close_connection()
+            raise
+
+    def archive(self, conn, table: str) -> str:
+        # The task's disk doesn't outlive it, so it only stages the dump; the table is
+        # dropped once S3 reports an object of the same size under the key
+        key = f"{self.archive_prefix}{table}.csv.gz"
+        location = f"s3://{self.archive_bucket}/{key}"
+        with tempfile.TemporaryDirectory() as staging:
+            path = os.path.join(staging, f"{table}.csv.gz")
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                with gzip.open(path, "wb") as f:
+                    cur.copy_expert(sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(sql.Identifier(table)), f)
+            conn.rollback()
+            size = os.path.getsize(path)
+            self.s3_client.upload_file(path, self.archive_bucket, key)
+        stored = self.s3_client.head_object(Bucket=self.archive_bucket, Key=key)["ContentLength"]
+        if stored != size:
+            raise RuntimeError(f"{location} has {stored} bytes, expected {size}; keeping {table}")
+
+        with conn.cursor(cursor_factory=extensions.cursor) as cur:
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(table)))
+        conn.commit()
+        logger.info(f"Archived {table} to {location}")
+        return location
+
+    def migrate(self, keep_old: bool = False):
+        # Converts an unpartitioned order_status_log in one transaction. Writers wait on
+        # the table lock until it commits, so run it when traffic is low.
+        conn = self._connect()
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (PARENT_TABLE,))
+                if cur.fetchone():
+                    logger.info(f"{PARENT_TABLE} is already partitioned")
+                    return
+
+                old = f"{PARENT_TABLE}_unpartitioned"
+                cur.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {old}")
+                cur.execute(f"ALTER INDEX IF EXISTS {PARENT_TABLE}_pkey RENAME TO {old}_pkey")
+                cur.execute(f"ALTER INDEX IF EXISTS idx_order_status_log_order_id RENAME TO idx_{old}_order_id")
+                cur.execute(f"ALTER INDEX IF EXISTS idx_order_status_log_created_at RENAME TO idx_{old}_created_at")
+                cur.execute(PARTITIONED_TABLE_DDL)
+
+                cur.execute(f"SELECT DISTINCT date_trunc('month', created_at)::date FROM {old} WHERE created_at IS NOT NULL")
+                months = {month for (month,) in cur.fetchall()}
+                current = month_start(datetime.utcnow().date())
+                months.update(add_months(current, i) for i in range(self.months_ahead + 1))
+                for month in sorted(months):
+                    self._create_partition(cur, month)
+
+                cur.execute(f"""
+                    INSERT INTO {PARENT_TABLE} (id, order_id, status, message, created_at)
+                    SELECT id, order_id, status, message, COALESCE(created_at, CURRENT_TIMESTAMP) FROM {old}
+                """)
+                copied = cur.rowcount
+                if not keep_old:
+                    cur.execute(f"DROP TABLE {old}")
+            conn.commit()
+            logger.info(f"Moved {copied} status log row(s) into {len(months)} monthly partition(s)")
+        finally:
+            conn.close()
+
+    def _maintain(self, conn, cur, today: date) -> bool:
+        cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (PARENT_TABLE,))
+        if not cur.fetchone():
+            logger.warning(f"{PARENT_TABLE} is not partitioned; run `python partitions.py migrate`")
+            return False
+
+        for month in self._missing_months(cur, today):
+            self._create_partition(cur, month)
+            conn.commit()
+            logger.info(f"Created partition {partition_name(month)}")
+
+        if self.retention_months > 0:
+            cutoff = add_months(month_start(today), -self.retention_months)
+            for name in self._expired(cur, cutoff):
+                cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                    sql.Identifier(PARENT_TABLE), sql.Identifier(name)
+                ))
+                conn.commit()
+                logger.info(f"Detached partition {name}")
+
+        if self.archive_bucket:
+            cur.execute(DETACHED_QUERY)
+            for (name,) in sorted(cur.fetchall()):
+                self.archive(conn, name)
+        return True
+
+    def _missing_months(self, cur, today: date) -> List[date]:
+        cur.execute(ATTACHED_QUERY)
+        existing = {partition_month(name) for (name,) in cur.fetchall()}
+        current = month_start(today)
+        months = {add_months(current, i) for i in range(self.months_ahead + 1)}
+        # Months that already have rows sitting in the default partition
+        cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+        if cur.fetchone()[0]:
+            cur.execute(sql.SQL("SELECT DISTINCT date_trunc('month', created_at)::date FROM {}").format(
+                sql.Identifier(DEFAULT_PARTITION)
+            ))
+            months.update(month for (month,) in cur.fetchall())
+        return sorted(months - existing)
+
+    def _create_partition(self, cur, month: date):
+        name, end = partition_name(month), add_months(month, 1)
+        cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+        has_default = cur.fetchone()[0] is not None
+        if has_default:
+            cur.execute(
+                sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE created_at >= %s AND created_at < %s)").format(sql.Identifier(DEFAULT_PARTITION)),
+                (month, end)
+            )
+            has_default = cur.fetchone()[0]
+
+        if not has_default:
+            cur.execute(
+                sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(sql.Identifier(name), sql.Identifier(PARENT_TABLE)),
+                (month, end)
+            )
+            return
+
+        # The month's rows went to the default partition while it had no partition of its
+        # own; attaching would fail on them, so move them into the new table first
+        cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(sql.Identifier(name), sql.Identifier(PARENT_TABLE)))
+        cur.execute(
+            sql.SQL("""
+                WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *)
+                INSERT INTO {partition} SELECT * FROM moved
+            """).format(default=sql.Identifier(DEFAULT_PARTITION), partition=sql.Identifier(name)),
+            (month, end)
+        )
+        logger.info(f"Moving {cur.rowcount} row(s) from {DEFAULT_PARTITION} into {name}")
+        cur.execute(
+            sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(sql.Identifier(PARENT_TABLE), sql.Identifier(name)),
+            (month, end)
+        )
+
+    def _expired(self, cur, cutoff: date) -> List[str]:
+        # Partitions whose whole month is before the cutoff
+        cur.execute(ATTACHED_QUERY)
+        return sorted(
+            name for (name,) in cur.fetchall()
+            if partition_month(name) and add_months(partition_month(name), 1) <= cutoff
+        )
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.maintain()
+            except Exception as e:
+                logger.error(f"Error maintaining {PARENT_TABLE} partitions: {e}")
+            self._stopped.wait(self.interval)
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                # DDL on the parent must not queue up behind a long transaction and
+                # block every writer waiting behind it
+                cur.execute("SET lock_timeout = '5s'")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _close_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def main():
+    # Standalone entry point, e.g. as a scheduled ECS task:
+    #   python partitions.py maintain [--archive-bucket BUCKET]
+    #   python partitions.py migrate [--keep-old]
+    import boto3
+    import main as app
+
+    parser = argparse.ArgumentParser(description=f"Maintain the monthly partitions of {PARENT_TABLE}")
+    parser.add_argument("command", choices=["maintain", "migrate"])
+    parser.add_argument("--archive-bucket", default=app.STATUS_LOG_ARCHIVE_BUCKET, help="Upload expired months to this S3 bucket as CSV.gz and drop them")
+    parser.add_argument("--archive-prefix", default=app.STATUS_LOG_ARCHIVE_PREFIX)
+    parser.add_argument("--retention-months", type=int, default=app.STATUS_LOG_RETENTION_MONTHS)
+    parser.add_argument("--keep-old", action="store_true", help="migrate: keep the unpartitioned table as order_status_log_unpartitioned")
+    args = parser.parse_args()
+
+    partitions = StatusLogPartitions(
+        app.get_db_connection,
+        months_ahead=app.STATUS_LOG_MONTHS_AHEAD,
+        retention_months=args.retention_months,
+        archive_bucket=args.archive_bucket or None,
+        archive_prefix=args.archive_prefix,
+        s3_client=boto3.client("s3", region_name=app.AWS_REGION) if args.archive_bucket else None
+    )
+    if args.command == "migrate":
+        partitions.migrate(keep_old=args.keep_old)
+    partitions.maintain()
+
+
+if __name__ == "__main__":
+    main()
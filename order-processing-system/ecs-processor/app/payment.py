@@ -0,0 +1,144 @@
+import asyncio
+import importlib
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import NamedTuple, Optional
+
+from metrics import PAYMENT_SECONDS, RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentResult(NamedTuple):
+    success: bool
+    transaction_id: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 1
+
+
+# Transient gateway failure (timeout, 5xx, throttling). Retried; a decline is not.
+class PaymentError(Exception):
+    pass
+
+
+# Interface for payment providers. charge() must be safe to retry with the same
+# idempotency key: the provider may have seen an attempt that timed out on our side.
+class PaymentGateway:
+    async def charge(self, order_id: str, amount: float, idempotency_key: str) -> PaymentResult:
+        raise NotImplementedError
+
+
+# Local stand-in for the payment provider. Latency is log-normal around latency_median
+# (latency_sigma=0 makes it fixed); decline_rate is the share of charges the card issuer
+# refuses and error_rate the share that fail transiently and get retried.
+class StubPaymentGateway(PaymentGateway):
+    def __init__(self, latency_median: float = 2.0, latency_sigma: float = 0.25, decline_rate: float = 0.05, error_rate: float = 0.0):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.decline_rate = decline_rate
+        self.error_rate = error_rate
+
+    def sample_latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+    async def charge(self, order_id: str, amount: float, idempotency_key: str) -> PaymentResult:
+        await asyncio.sleep(self.sample_latency())
+        if random.random() < self.error_rate:
+            raise PaymentError("Payment gateway unavailable")
+        if random.random() < self.decline_rate:
+            return PaymentResult(success=False, error="Card declined")
+        return PaymentResult(success=True, transaction_id=str(uuid.uuid4()))
+
+
+def create_gateway(spec: str, **stub_options) -> PaymentGateway:
+    # "stub" or "package.module:ClassName" for a real provider adapter
+    if spec == "stub":
+        return StubPaymentGateway(**stub_options)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Invalid payment gateway {spec!r}; expected 'stub' or 'module:ClassName'")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# Runs gateway calls on a private asyncio loop so a charge waiting on the provider holds
+# a coroutine instead of a worker thread. Callers get a concurrent.futures.Future from
+# charge_async(); its done-callbacks run on the loop's thread and must not block. At
+# most max_concurrency charges are in flight;
+# each attempt is cut off after timeout seconds and transient failures are retried
+# with jittered exponential backoff.
+class PaymentClient:
+    def __init__(
+        self,
+        gateway: PaymentGateway,
+        max_concurrency: int = 100,
+        timeout: float = 10,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.gateway = gateway
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="payment-loop", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        # Charges still running were given up on by a shutdown that ran out of time;
+        # their futures end up cancelled
+        asyncio.run_coroutine_threadsafe(self._cancel_pending(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _cancel_pending(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def charge_async(self, order_id: str, amount: float, idempotency_key: str) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._charge(order_id, amount, idempotency_key), self._loop)
+
+    async def _charge(self, order_id: str, amount: float, idempotency_key: str) -> PaymentResult:
+        start = time.perf_counter()
+        try:
+            return await self._charge_with_retries(order_id, amount, idempotency_key)
+        finally:
+            PAYMENT_SECONDS.observe(time.perf_counter() - start)
+
+    async def _charge_with_retries(self, order_id: str, amount: float, idempotency_key: str) -> PaymentResult:
+        async with self._semaphore:
+            error = None
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    # Every attempt reuses the caller's key so a retry can't charge twice
+                    result = await asyncio.wait_for(self.gateway.charge(order_id, amount, idempotency_key), self.timeout)
+                    return result._replace(attempts=attempt)
+                except asyncio.TimeoutError:
+                    error = f"Payment gateway timed out after {self.timeout}s"
+                except PaymentError as e:
+                    error = str(e)
+
+                if attempt < self.max_attempts:
+                    delay = self.backoff_base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                    RETRIES.inc(operation="payment")
+                    logger.warning(f"Payment attempt {attempt} for order {order_id} failed ({error}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+            return PaymentResult(success=False, error=error, attempts=self.max_attempts)
@@ -0,0 +1,347 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Optional
+
+from messages import decode_order_message
+from metrics import ORDERS
+from processor import ALREADY_PROCESSED, CLAIMED, IN_PROGRESS, ItemsPrefetch, OrderProcessor
+from scaling import ServiceTime
+from sqs_batcher import SQSMessageBatcher
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class OrderJob:
+    def __init__(self, message: dict, prefetch: Optional[ItemsPrefetch] = None):
+        self.message = message
+        self.prefetch = prefetch
+        self.order_id = None
+        self.customer_name = "Valued Customer"
+        self.customer_email = ""
+        self.items = []
+        self.total_amount = 0
+        self.created_at = None
+        # Names this delivery's claim on the order and keys its charge with the provider
+        self.claim_id = str(uuid.uuid4())
+        # Set once this worker's PROCESSING claim is committed; until then the order's
+        # status belongs to whoever else holds it
+        self.claimed = False
+        # Transitions waiting to be written with the final commit
+        self.transitions = []
+        # The settled charge, a concurrent.futures.Future from the payment client
+        self.payment: Optional[Future] = None
+        self.payment_started = 0.0
+
+    def apply(self, body: dict):
+        self.customer_name = body.get("customer_name", "Valued Customer")
+        self.customer_email = body.get("customer_email", "")
+        self.items = body.get("items", [])
+        self.total_amount = body.get("total_amount", 0)
+        self.created_at = body.get("created_at")
+
+
+# A fixed set of threads working through a bounded queue. put() blocks while the queue
+# is full, so a slow stage holds up the one in front of it instead of piling up work.
+class Stage:
+    def __init__(self, name: str, handler: Callable, concurrency: int, queue_size: int):
+        if concurrency < 1:
+            raise ValueError(f"{name} stage concurrency must be at least 1")
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.service_time = ServiceTime()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, job: OrderJob):
+        self.queue.put(job)
+
+    def throughput(self) -> Optional[float]:
+        seconds = self.service_time.value
+        return self.concurrency / seconds if seconds else None
+
+    def drain(self) -> list:
+        # Takes whatever is still queued without handling it
+        jobs = []
+        while True:
+            try:
+                jobs.append(self.queue.get_nowait())
+            except queue.Empty:
+                return jobs
+
+    def shutdown(self):
+        # Queued jobs are handled before the stop markers are reached
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                return
+            start = time.perf_counter()
+            self.handler(job)
+            self.service_time.record(time.perf_counter() - start)
+
+
+# Runs each order through intake (PROCESSING) -> payment -> fulfillment (FULFILLED,
+# COMPLETED) so slow payments don't leave fulfillment idle. Intake and fulfillment are
+# thread stages. Payments take no thread: intake starts the charge on the payment
+# client's event loop, and its done-callback hands the job straight to fulfillment.
+# payment_concurrency caps the charges in flight plus the settled ones waiting for
+# fulfillment, so that hand-off never blocks the loop. Notifications go through the
+# notifier, which is its own stage when async.
+# On shutdown, messages still in the intake queue are released unclaimed and only those
+# already past intake are waited for, for at most shutdown_timeout seconds.
+# Same submit/free_slots/wait_for_slot surface as WorkerPool for the poll loop.
+class OrderPipeline:
+    def __init__(
+        self,
+        processor: OrderProcessor,
+        notifier,
+        batcher: SQSMessageBatcher,
+        intake_concurrency: int = 4,
+        payment_concurrency: int = 50,
+        fulfillment_concurrency: int = 6,
+        queue_size: int = 100,
+        max_in_flight: Optional[int] = None,
+        shutdown_timeout: Optional[float] = None
+    ):
+        self.processor = processor
+        self.notifier = notifier
+        self.batcher = batcher
+        if payment_concurrency < 1:
+            raise ValueError("payment concurrency must be at least 1")
+        self.intake = Stage("intake", self._intake, intake_concurrency, queue_size)
+        self.payment_concurrency = payment_concurrency
+        self.payment_slots = threading.Semaphore(payment_concurrency)
+        self.payment_time = ServiceTime()
+        self.fulfillment = Stage("fulfillment", self._fulfill, fulfillment_concurrency, payment_concurrency)
+        self.concurrency = max_in_flight or (
+            intake_concurrency + queue_size + payment_concurrency + fulfillment_concurrency
+        )
+        self.shutdown_timeout = shutdown_timeout
+        self._condition = threading.Condition()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        with self._condition:
+            return self._in_flight
+
+    def start(self):
+        for stage in (self.fulfillment, self.intake):
+            stage.start()
+
+    def free_slots(self) -> int:
+        with self._condition:
+            return self.concurrency - self._in_flight
+
+    def wait_for_slot(self, timeout: Optional[float] = None, slots: int = 1) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: self.concurrency - self._in_flight >= slots, timeout=timeout)
+
+    def throughput(self) -> Optional[float]:
+        # Orders per second the slowest stage can sustain, from its measured handler time
+        payment_seconds = self.payment_time.value
+        rates = [
+            self.intake.throughput(),
+            self.payment_concurrency / payment_seconds if payment_seconds else None,
+            self.fulfillment.throughput()
+        ]
+        rates = [rate for rate in rates if rate]
+        return min(rates) if rates else None
+
+    def submit(self, message: dict, prefetch: Optional[ItemsPrefetch] = None):
+        with self._condition:
+            self._in_flight += 1
+        self.intake.put(OrderJob(message, prefetch))
+
+    def shutdown(self):
+        # Nothing queued for intake has been claimed yet; working through a full queue
+        # would outlast the time ECS gives a stopping task
+        queued = self.intake.drain()
+        for job in queued:
+            self.batcher.release(job.message)
+            self._finish()
+        logger.info(f"Released {len(queued)} queued message(s), waiting for {self.in_flight} in-flight message(s) to finish")
+        with self._condition:
+            finished = self._condition.wait_for(lambda: self._in_flight == 0, timeout=self.shutdown_timeout)
+        if not finished:
+            # Their claims go stale and SQS redelivers their messages once the heartbeat stops
+            logger.warning(f"{self.in_flight} message(s) still in flight after {self.shutdown_timeout:.0f}s, shutting down anyway")
+            return
+        for stage in (self.intake, self.fulfillment):
+            stage.shutdown()
+
+    def _intake(self, job: OrderJob):
+        try:
+            body = decode_order_message(job.message["Body"])
+            job.order_id = body.get("order_id")
+            if not job.order_id:
+                logger.error("Message missing order_id")
+                ORDERS.inc(result="invalid")
+                self._release(job)
+                return
+            job.apply(body)
+        except Exception as e:
+            logger.error(f"Invalid message: {e}")
+            ORDERS.inc(result="invalid")
+            self._release(job)
+            return
+
+        if job.order_id in self.processor.processed:
+            logger.info(f"Order {job.order_id} already processed, skipping duplicate delivery")
+            ORDERS.inc(result="duplicate")
+            self._ack(job)
+            return
+
+        logger.info(f"Processing order: {job.order_id}")
+        try:
+            with self.processor.connection() as conn:
+                claim = self.processor.claim_order(conn, job.order_id, job.claim_id)
+                if claim == CLAIMED and body.get("claim_check"):
+                    # Too large to inline; the details come from the order row instead
+                    job.apply(self.processor.load_order(conn, job.order_id) or body)
+                conn.commit()
+            if claim == CLAIMED:
+                job.claimed = True
+                # PROCESSING is committed here and not touched again until the order is done;
+                # the batcher's visibility heartbeat keeps it from going stale meanwhile
+                self.batcher.claimed(job.message, job.order_id)
+            if claim == ALREADY_PROCESSED:
+                ORDERS.inc(result="duplicate")
+                self._ack(job)
+                return
+            if claim == IN_PROGRESS:
+                ORDERS.inc(result="in_progress")
+                self._release(job)
+                return
+            self._notify(job, "PROCESSING", f"Order {job.order_id} is now being processed")
+        except Exception as e:
+            self._fail(job, e)
+            return
+        self._pay(job)
+
+    def _pay(self, job: OrderJob):
+        # Blocks intake while payment_concurrency orders are paying or waiting for fulfillment
+        self.payment_slots.acquire()
+        job.payment_started = time.perf_counter()
+        try:
+            future = self.processor.start_payment(job.order_id, job.total_amount, job.claim_id)
+        except Exception as e:
+            self.payment_slots.release()
+            self._fail(job, e)
+            return
+        future.add_done_callback(lambda settled: self._paid(job, settled))
+
+    def _paid(self, job: OrderJob, settled: Future):
+        # On the payment loop's thread: only hand over. The job holds a payment slot, so
+        # the fulfillment queue, sized to the slots, always has room.
+        if settled.cancelled():
+            # Given up on at shutdown: the claim goes stale and SQS redelivers the message
+            return
+        self.payment_time.record(time.perf_counter() - job.payment_started)
+        job.payment = settled
+        self.fulfillment.queue.put_nowait(job)
+
+    def _fulfill(self, job: OrderJob):
+        self.payment_slots.release()
+        try:
+            payment_success = self.processor.payment_succeeded(job.order_id, job.payment.result())
+        except Exception as e:
+            self._fail(job, e)
+            return
+
+        if not payment_success:
+            # PROCESSING is already committed, so record the failure to let the redelivered
+            # message claim the order again and retry the payment
+            try:
+                with self.processor.connection() as conn:
+                    self.processor.update_order_status(conn, job.order_id, "PAYMENT_FAILED", "Payment processing failed")
+                    conn.commit()
+            except Exception as e:
+                self._fail(job, e)
+                return
+            self._notify(job, "PAYMENT_FAILED", f"Payment failed for order {job.order_id}")
+            ORDERS.inc(result="payment_failed")
+            self._release(job)
+            return
+
+        job.transitions.append(("PAYMENT_CONFIRMED", "Payment processed successfully", datetime.utcnow()))
+        self._notify(job, "PAYMENT_CONFIRMED", f"Payment confirmed for order {job.order_id}")
+        try:
+            with self.processor.connection() as conn:
+                logger.info(f"Fulfilling order {job.order_id}")
+                self.processor.fulfill_order(conn, job.order_id, job.items, job.total_amount, job.prefetch)
+                job.transitions.append(("FULFILLED", "Order has been fulfilled", datetime.utcnow()))
+                job.transitions.append(("COMPLETED", "Order completed successfully", datetime.utcnow()))
+                self.processor.record_transitions(conn, job.order_id, job.transitions)
+                conn.commit()
+        except Exception as e:
+            self._fail(job, e)
+            return
+
+        self._notify(job, "FULFILLED", f"Order {job.order_id} has been fulfilled!")
+        self._notify(job, "COMPLETED", f"Order {job.order_id} completed. Thank you!")
+        self.processor.mark_completed(job.order_id, job.created_at)
+        ORDERS.inc(result="completed")
+        logger.info(f"Successfully processed order: {job.order_id}")
+        self._ack(job)
+
+    def _fail(self, job: OrderJob, error: Exception):
+        logger.error(f"Error processing order {job.order_id}: {error}")
+        ORDERS.inc(result="failed")
+        if not job.claimed:
+            # The claim itself failed; the row is left to whoever holds it, or to the retry
+            self._release(job)
+            return
+        try:
+            with self.processor.connection() as conn:
+                self.processor.update_order_status(conn, job.order_id, "FAILED", str(error))
+                conn.commit()
+            self._notify(job, "FAILED", f"Order {job.order_id} failed: {str(error)}")
+        except Exception as e:
+            logger.error(f"Could not record failure for order {job.order_id}: {e}")
+        self._release(job)
+
+    def _notify(self, job: OrderJob, event_type: str, message: str):
+        self.notifier.send_notification(
+            order_id=job.order_id,
+            event_type=event_type,
+            message=message,
+            customer_name=job.customer_name,
+            customer_email=job.customer_email,
+            items=job.items,
+            total_amount=job.total_amount
+        )
+
+    def _ack(self, job: OrderJob):
+        self.batcher.ack(job.message)
+        self._finish()
+
+    def _release(self, job: OrderJob):
+        self.batcher.release(job.message)
+        logger.warning("Message processing failed, will retry")
+        self._finish()
+
+    def _finish(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
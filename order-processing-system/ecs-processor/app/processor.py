@@ -1,38 +1,290 @@
 import logging
-import random
+import threading
 import time
 import uuid
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from db_pool import ConnectionPool
+from messages import InvalidMessage, decode_order_message
+from metrics import DB_SECONDS, FULFILLMENT_SECONDS, ORDER_LATENCY_SECONDS
+from payment import PaymentClient, PaymentResult
 
 logger = logging.getLogger(__name__)
 
+TRANSITION_QUERY = """
+    WITH updated AS (
+        UPDATE orders SET status = %s, updated_at = %s WHERE id = %s
+        RETURNING id, status, updated_at
+    ), logged AS (
+        INSERT INTO order_status_log (id, order_id, status, message, created_at)
+        SELECT log.id::uuid, updated.id, log.status, log.message, log.created_at::timestamp
+        FROM updated CROSS JOIN (VALUES {log_values}) AS log (id, status, message, created_at)
+    )
+    SELECT id, status, updated_at FROM updated
+"""
+
+# Moves the order to PROCESSING only if nobody else holds it: it must be waiting for a
+# (re)try, or stuck in PROCESSING longer than a live worker could be. SKIP LOCKED makes a
+# concurrent claim come back empty instead of waiting for the other transaction.
+CLAIM_QUERY = """
+    WITH claimed AS (
+        UPDATE orders SET status = 'PROCESSING', updated_at = %(now)s
+        WHERE id = (
+            SELECT id FROM orders
+            WHERE id = %(order_id)s
+              AND (status = ANY(%(claimable)s) OR (status = 'PROCESSING' AND updated_at < %(stale_before)s))
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    ), logged AS (
+        INSERT INTO order_status_log (id, order_id, status, message, created_at)
+        SELECT %(log_id)s, id, 'PROCESSING', 'Order processing started', %(now)s FROM claimed
+    )
+    SELECT id FROM claimed
+"""
+
+# Keeps held claims from looking abandoned; rows locked by another transaction are
+# skipped rather than waited on
+REFRESH_CLAIMS_QUERY = """
+    UPDATE orders SET updated_at = %s
+    WHERE id IN (
+        SELECT id FROM orders
+        WHERE id = ANY(%s::uuid[]) AND status = 'PROCESSING'
+        FOR UPDATE SKIP LOCKED
+    )
+"""
+
+# What an order message carries, for claim-check messages that only name the order
+ORDER_MESSAGE_QUERY = """
+    SELECT
+        o.id::text AS order_id, o.customer_email, o.customer_name, o.total_amount::float AS total_amount, o.created_at,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'product_name', i.product_name, 'quantity', i.quantity,
+                'unit_price', i.unit_price::float, 'subtotal', i.subtotal::float
+            ))
+            FROM order_items i WHERE i.order_id = o.id
+        ), '[]') AS items
+    FROM orders o
+    WHERE o.id = %s
+"""
+
+ORDER_ITEMS_QUERY = "SELECT order_id::text AS order_id, product_name, quantity FROM order_items WHERE order_id = ANY(%s::uuid[])"
+
+# Statuses a delivery may (re)start processing from
+CLAIMABLE_STATUSES = ["PENDING", "FAILED", "PAYMENT_FAILED"]
+
+CLAIMED = "claimed"
+# Already finished (or gone); the delivery is a duplicate and can be acknowledged
+ALREADY_PROCESSED = "already_processed"
+# Another worker is on it right now; leave the message for redelivery
+IN_PROGRESS = "in_progress"
+
+
+def verified_items(items, total_amount) -> Optional[List[dict]]:
+    # Items from a message are used as they are only if every line is well formed and the
+    # subtotals add up to the order total; anything else is read from order_items instead
+    if not items or total_amount is None:
+        return None
+    try:
+        for item in items:
+            if not item.get("product_name") or int(item["quantity"]) < 1:
+                return None
+        if abs(sum(float(item["subtotal"]) for item in items) - float(total_amount)) >= 0.01:
+            return None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return items
+
+
+def fetch_items(conn, order_ids: List[str]) -> Dict[str, List[dict]]:
+    items = {order_id: [] for order_id in order_ids}
+    with DB_SECONDS.time(operation="items"), conn.cursor() as cur:
+        cur.execute(ORDER_ITEMS_QUERY, (list(order_ids),))
+        for row in cur.fetchall():
+            items[row["order_id"]].append(row)
+    return items
+
+
+# Order items for one polled SQS batch, for the orders whose messages don't carry usable
+# items. The first order that needs them reads them for the whole batch in one query.
+class ItemsPrefetch:
+    def __init__(self, messages: List[dict]):
+        self._messages = messages
+        self._lock = threading.Lock()
+        self._items: Optional[Dict[str, List[dict]]] = None
+
+    def get(self, conn, order_id: str) -> List[dict]:
+        with self._lock:
+            if self._items is None:
+                order_ids = {order_id}
+                for message in self._messages:
+                    try:
+                        body = decode_order_message(message["Body"])
+                    except InvalidMessage:
+                        continue
+                    if body.get("claim_check"):
+                        # load_order has read these items along with the order already
+                        continue
+                    if body.get("order_id") and verified_items(body.get("items"), body.get("total_amount")) is None:
+                        order_ids.add(body["order_id"])
+                self._items = fetch_items(conn, sorted(order_ids))
+            if order_id not in self._items:
+                self._items.update(fetch_items(conn, [order_id]))
+            return self._items[order_id]
+
+
+# Bounded LRU of order ids this task has finished, so duplicates are recognised
+# without a database round trip
+class ProcessedOrders:
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._order_ids = OrderedDict()
+
+    def __contains__(self, order_id: str) -> bool:
+        with self._lock:
+            if order_id not in self._order_ids:
+                return False
+            self._order_ids.move_to_end(order_id)
+            return True
+
+    def add(self, order_id: str):
+        with self._lock:
+            self._order_ids[order_id] = None
+            self._order_ids.move_to_end(order_id)
+            while len(self._order_ids) > self.max_size:
+                self._order_ids.popitem(last=False)
+
 
 class OrderProcessor:
-    def update_order_status(self, conn, order_id: str, status: str, message: str = None):
-        with conn.cursor() as cur:
-            cur.execute("UPDATE orders SET status = %s, updated_at = %s WHERE id = %s", (status, datetime.utcnow(), order_id))
-            cur.execute(
-                "INSERT INTO order_status_log (id, order_id, status, message, created_at) VALUES (%s, %s, %s, %s, %s)",
-                (str(uuid.uuid4()), order_id, status, message, datetime.utcnow())
-            )
-        logger.info(f"Order {order_id} status updated to {status}")
-
-    def process_payment(self, conn, order_id: str, amount: float) -> bool:
+    def __init__(self, pool: ConnectionPool, payments: PaymentClient, claim_stale_after: float = 300, processed_cache_size: int = 10000):
+        self.pool = pool
+        self.payments = payments
+        self.claim_stale_after = claim_stale_after
+        self.processed = ProcessedOrders(processed_cache_size)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def close(self):
+        self.pool.close()
+
+    def refresh_claims(self, order_ids: List[str]) -> int:
+        # A committed PROCESSING claim counts as abandoned after claim_stale_after; this
+        # moves that point on for orders still being worked on
+        with self.connection() as conn:
+            with DB_SECONDS.time(operation="refresh_claims"), conn.cursor() as cur:
+                cur.execute(REFRESH_CLAIMS_QUERY, (datetime.utcnow(), order_ids))
+                refreshed = cur.rowcount
+            conn.commit()
+        logger.info(f"Refreshed {refreshed} held claim(s)")
+        return refreshed
+
+    def update_order_status(self, conn, order_id: str, status: str, message: str = None) -> Optional[dict]:
+        return self.record_transitions(conn, order_id, [(status, message)])
+
+    def claim_order(self, conn, order_id: str, claim_id: Optional[str] = None) -> str:
+        # claim_id names this claim: it becomes the id of its PROCESSING log row and keys
+        # the charge made under it
+        if order_id in self.processed:
+            return ALREADY_PROCESSED
+
+        now = datetime.utcnow()
+        with DB_SECONDS.time(operation="claim"), conn.cursor() as cur:
+            cur.execute(CLAIM_QUERY, {
+                "now": now,
+                "order_id": order_id,
+                "claimable": CLAIMABLE_STATUSES,
+                "stale_before": now - timedelta(seconds=self.claim_stale_after),
+                "log_id": claim_id or str(uuid.uuid4())
+            })
+            if cur.fetchone():
+                logger.info(f"Order {order_id} status updated to PROCESSING")
+                return CLAIMED
+
+            cur.execute("SELECT status FROM orders WHERE id = %s", (order_id,))
+            row = cur.fetchone()
+
+        if row is None:
+            logger.warning(f"Order {order_id} not found, dropping message")
+        elif row["status"] in CLAIMABLE_STATUSES or row["status"] == "PROCESSING":
+            logger.info(f"Order {order_id} is being processed elsewhere ({row['status']})")
+            return IN_PROGRESS
+        else:
+            logger.info(f"Order {order_id} already {row['status']}, skipping duplicate delivery")
+        self.processed.add(order_id)
+        return ALREADY_PROCESSED
+
+    def load_order(self, conn, order_id: str) -> Optional[dict]:
+        # The order as a version 1 message body would have carried it
+        with DB_SECONDS.time(operation="load_order"), conn.cursor() as cur:
+            cur.execute(ORDER_MESSAGE_QUERY, (order_id,))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        order = dict(row)
+        order["created_at"] = order["created_at"].isoformat() if order["created_at"] else None
+        return order
+
+    def record_transitions(self, conn, order_id: str, transitions: List[Tuple]) -> Optional[dict]:
+        # Moves the order to the last status and logs every (status, message[, at]) step in one
+        # round trip. Returns the new state, or None if the order does not exist.
+        now = datetime.utcnow()
+        steps = [(status, message, rest[0] if rest else now) for status, message, *rest in transitions]
+        final_status, _, final_at = steps[-1]
+
+        params = [final_status, final_at, order_id]
+        for status, message, at in steps:
+            params.extend((str(uuid.uuid4()), status, message, at))
+
+        with DB_SECONDS.time(operation="transition"), conn.cursor() as cur:
+            cur.execute(TRANSITION_QUERY.format(log_values=", ".join(["(%s, %s, %s, %s)"] * len(steps))), params)
+            state = cur.fetchone()
+
+        if state is None:
+            logger.warning(f"Order {order_id} not found, status {final_status} not recorded")
+        else:
+            logger.info(f"Order {order_id} status updated to {' -> '.join(step[0] for step in steps)}")
+        return state
+
+    def mark_completed(self, order_id: str, created_at: Optional[str] = None):
+        self.processed.add(order_id)
+        if created_at:
+            try:
+                ORDER_LATENCY_SECONDS.observe((datetime.utcnow() - datetime.fromisoformat(created_at)).total_seconds())
+            except ValueError:
+                pass
+
+    def start_payment(self, order_id: str, amount: float, claim_id: str) -> Future:
+        # Returns right away; the charge runs on the payment client's event loop. Keyed per
+        # claim: retries within it can't charge twice, but an order claimed again after
+        # PAYMENT_FAILED gets a fresh charge instead of the provider replaying the decline.
         logger.info(f"Processing payment of ${amount:.2f} for order {order_id}")
-        time.sleep(2)
-        success = random.random() < 0.95
-        if success:
-            logger.info(f"Payment successful for order {order_id}")
+        return self.payments.charge_async(order_id, amount, f"{order_id}:{claim_id}")
+
+    def process_payment(self, conn, order_id: str, amount: float, claim_id: str) -> bool:
+        # Blocks for the whole charge; only for sequential mode, where the worker thread
+        # holds the order's claim until the message is done anyway
+        return self.payment_succeeded(order_id, self.start_payment(order_id, amount, claim_id).result())
+
+    def payment_succeeded(self, order_id: str, result: PaymentResult) -> bool:
+        if result.success:
+            logger.info(f"Payment successful for order {order_id} (transaction {result.transaction_id})")
         else:
-            logger.warning(f"Payment failed for order {order_id}")
-        return success
+            logger.warning(f"Payment failed for order {order_id} after {result.attempts} attempt(s): {result.error}")
+        return result.success
 
-    def fulfill_order(self, conn, order_id: str):
+    def fulfill_order(self, conn, order_id: str, items: Optional[List[dict]] = None, total_amount: Optional[float] = None, prefetch: Optional[ItemsPrefetch] = None):
         logger.info(f"Fulfilling order {order_id}")
-        time.sleep(1)
-        with conn.cursor() as cur:
-            cur.execute("SELECT product_name, quantity FROM order_items WHERE order_id = %s", (order_id,))
-            items = cur.fetchall()
+        with FULFILLMENT_SECONDS.time():
+            time.sleep(1)
+            items = verified_items(items, total_amount)
+            if items is None:
+                items = prefetch.get(conn, order_id) if prefetch else fetch_items(conn, [order_id])[order_id]
             for item in items:
                 logger.info(f"Fulfilling: {item['quantity']}x {item['product_name']}")
         logger.info(f"Order {order_id} fulfilled successfully")
@@ -0,0 +1,133 @@
+import logging
+import threading
+from typing import Callable, Optional, Tuple
+
+from metrics import REGISTRY, emit_emf
+
+logger = logging.getLogger(__name__)
+
+SQS_MAX_BATCH = 10
+SQS_MAX_WAIT_SECONDS = 20
+
+BACKLOG_PER_TASK = REGISTRY.gauge("order_processor_backlog_per_task", "Visible SQS messages per running processor task")
+BACKLOG_SECONDS_PER_TASK = REGISTRY.gauge(
+    "order_processor_backlog_seconds_per_task",
+    "Estimated seconds for one task to work through its share of the backlog"
+)
+THROUGHPUT = REGISTRY.gauge("order_processor_estimated_throughput", "Orders per second this task can process, from measured service times")
+
+
+# Exponentially weighted moving average of how long a unit of work takes
+class ServiceTime:
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._value: Optional[float] = None
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._value = seconds if self._value is None else self._value + self.alpha * (seconds - self._value)
+
+    @property
+    def value(self) -> Optional[float]:
+        with self._lock:
+            return self._value
+
+
+def poll_parameters(free_slots: int, concurrency: int, in_flight: int) -> Tuple[int, int]:
+    # Receive only what can start right away. An idle task long-polls for the full 20s;
+    # a busy one waits less the less room it has, so it comes back for a bigger batch
+    # once work finishes instead of sitting on a small one.
+    max_messages = max(1, min(SQS_MAX_BATCH, free_slots))
+    if in_flight == 0:
+        return max_messages, SQS_MAX_WAIT_SECONDS
+    wait_seconds = round(SQS_MAX_WAIT_SECONDS * free_slots / max(concurrency, 1))
+    return max_messages, max(1, min(SQS_MAX_WAIT_SECONDS, wait_seconds))
+
+
+# Publishes how far behind the service is, for ECS target tracking. CPU is a poor signal
+# here because workers mostly wait on payment and I/O. Every interval this reads the
+# visible queue depth and the running task count, divides the per-task share of the
+# backlog by this task's measured throughput, and writes BacklogSecondsPerTask as an
+# EMF log line. Every task reports the same backlog, so the Average statistic is right.
+class BacklogReporter:
+    def __init__(
+        self,
+        sqs_client,
+        queue_url: str,
+        throughput: Callable[[], Optional[float]],
+        namespace: str,
+        ecs_client=None,
+        cluster: Optional[str] = None,
+        service: Optional[str] = None,
+        interval: float = 60,
+        dimensions: Optional[dict] = None
+    ):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.throughput = throughput
+        self.namespace = namespace
+        self.ecs_client = ecs_client
+        self.cluster = cluster
+        self.service = service
+        self.interval = interval
+        self.dimensions = dimensions or {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="backlog-reporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def report(self):
+        attributes = self.sqs_client.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=["ApproximateNumberOfMessages"]
+        )["Attributes"]
+        backlog = int(attributes.get("ApproximateNumberOfMessages", 0))
+        tasks = self._running_tasks()
+        backlog_per_task = backlog / tasks
+        BACKLOG_PER_TASK.set(backlog_per_task)
+
+        throughput = self.throughput()
+        THROUGHPUT.set(throughput or 0)
+        metrics = {"BacklogPerTask": (backlog_per_task, "Count")}
+        if backlog == 0:
+            backlog_seconds = 0.0
+        elif throughput:
+            backlog_seconds = backlog_per_task / throughput
+        else:
+            # Nothing measured yet; skip rather than guess
+            backlog_seconds = None
+        if backlog_seconds is not None:
+            BACKLOG_SECONDS_PER_TASK.set(backlog_seconds)
+            metrics["BacklogSecondsPerTask"] = (backlog_seconds, "Seconds")
+
+        for name, (value, unit) in metrics.items():
+            emit_emf(self.namespace, name, value, unit, self.dimensions)
+        logger.info(
+            f"Backlog: {backlog} message(s) across {tasks} task(s), "
+            f"~{throughput or 0:.2f} orders/s per task, "
+            f"{'unknown' if backlog_seconds is None else f'{backlog_seconds:.0f}s'} to drain"
+        )
+
+    def _running_tasks(self) -> int:
+        if not (self.ecs_client and self.cluster and self.service):
+            return 1
+        try:
+            response = self.ecs_client.describe_services(cluster=self.cluster, services=[self.service])
+            return max(1, response["services"][0]["runningCount"])
+        except Exception as e:
+            logger.warning(f"Could not read running task count, assuming 1: {e}")
+            return 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.report()
+            except Exception as e:
+                logger.error(f"Error reporting backlog metrics: {e}")
@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import RETRIES
+
+logger = logging.getLogger(__name__)
+
+SQS_BATCH_SIZE = 10
+
+
+# Collects acknowledgements into DeleteMessageBatch calls and keeps in-flight
+# messages invisible with ChangeMessageVisibilityBatch while they are still
+# being worked on. A single background thread does both. After each extension,
+# on_extend gets the order ids claimed (see claimed()) by the extended messages,
+# so their claims can be kept fresh for exactly as long as the messages are held.
+class SQSMessageBatcher:
+    def __init__(
+        self,
+        sqs_client,
+        queue_url: str,
+        visibility_timeout: int = 300,
+        heartbeat_margin: int = 60,
+        flush_interval: float = 1.0,
+        max_delete_attempts: int = 3,
+        on_extend: Optional[Callable[[List[str]], None]] = None
+    ):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self.heartbeat_margin = heartbeat_margin
+        self.flush_interval = flush_interval
+        self.max_delete_attempts = max_delete_attempts
+        self.on_extend = on_extend
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        # receipt handle -> monotonic time the current visibility timeout runs out
+        self._in_flight: Dict[str, float] = {}
+        # receipt handle -> order id claimed for it
+        self._claims: Dict[str, str] = {}
+        # (receipt handle, attempts so far)
+        self._pending_deletes: List[Tuple[str, int]] = []
+        self._thread = threading.Thread(target=self._run, name="sqs-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def track(self, message: dict):
+        with self._lock:
+            self._in_flight[message["ReceiptHandle"]] = time.monotonic() + self.visibility_timeout
+
+    def claimed(self, message: dict, order_id: str):
+        with self._lock:
+            if message["ReceiptHandle"] in self._in_flight:
+                self._claims[message["ReceiptHandle"]] = order_id
+
+    def ack(self, message: dict):
+        receipt_handle = message["ReceiptHandle"]
+        with self._lock:
+            self._in_flight.pop(receipt_handle, None)
+            self._claims.pop(receipt_handle, None)
+            self._pending_deletes.append((receipt_handle, 0))
+            if len(self._pending_deletes) >= SQS_BATCH_SIZE:
+                self._wakeup.set()
+
+    def release(self, message: dict):
+        # Stop extending visibility so SQS redelivers the message once the current timeout expires
+        with self._lock:
+            self._in_flight.pop(message["ReceiptHandle"], None)
+            self._claims.pop(message["ReceiptHandle"], None)
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        # Anything still queued after the final pass gets one more synchronous attempt
+        self.flush_deletes()
+
+    def flush_deletes(self):
+        with self._lock:
+            pending, self._pending_deletes = self._pending_deletes, []
+
+        for start in range(0, len(pending), SQS_BATCH_SIZE):
+            self._delete_batch(pending[start:start + SQS_BATCH_SIZE])
+
+    def extend_visibility(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [handle for handle, deadline in self._in_flight.items() if deadline - now <= self.heartbeat_margin]
+
+        for start in range(0, len(due), SQS_BATCH_SIZE):
+            self._extend_batch(due[start:start + SQS_BATCH_SIZE])
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush_deletes()
+                self.extend_visibility()
+            except Exception as e:
+                logger.error(f"Error in SQS batcher: {e}")
+
+    def _delete_batch(self, batch: List[Tuple[str, int]]):
+        entries = {str(i): entry for i, entry in enumerate(batch)}
+        try:
+            response = self.sqs_client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": entry_id, "ReceiptHandle": handle} for entry_id, (handle, _) in entries.items()]
+            )
+        except Exception as e:
+            logger.error(f"Error deleting message batch from SQS: {e}")
+            self._retry_deletes(list(entries.values()))
+            return
+
+        deleted = len(response.get("Successful", []))
+        if deleted:
+            logger.info(f"Deleted {deleted} message(s) from SQS")
+
+        retry = []
+        for failure in response.get("Failed", []):
+            entry = entries[failure["Id"]]
+            if failure.get("SenderFault"):
+                # Invalid or expired receipt handle; retrying won't help and SQS will redeliver
+                logger.error(f"SQS rejected delete: {failure.get('Code')} - {failure.get('Message')}")
+            else:
+                retry.append(entry)
+        self._retry_deletes(retry)
+
+    def _retry_deletes(self, entries: List[Tuple[str, int]]):
+        retry = []
+        for handle, attempts in entries:
+            if attempts + 1 >= self.max_delete_attempts:
+                logger.error(f"Giving up deleting message after {attempts + 1} attempts; it will be redelivered")
+            else:
+                retry.append((handle, attempts + 1))
+        if retry:
+            RETRIES.inc(len(retry), operation="sqs_delete")
+            with self._lock:
+                self._pending_deletes.extend(retry)
+
+    def _extend_batch(self, handles: List[str]):
+        entries = {str(i): handle for i, handle in enumerate(handles)}
+        deadline = time.monotonic() + self.visibility_timeout
+        try:
+            response = self.sqs_client.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": entry_id, "ReceiptHandle": handle, "VisibilityTimeout": self.visibility_timeout}
+                    for entry_id, handle in entries.items()
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Error extending message visibility: {e}")
+            return
+
+        claims = []
+        with self._lock:
+            for success in response.get("Successful", []):
+                handle = entries[success["Id"]]
+                # Skip messages that were acked or released while the call was in flight
+                if handle in self._in_flight:
+                    self._in_flight[handle] = deadline
+                    if handle in self._claims:
+                        claims.append(self._claims[handle])
+        if claims and self.on_extend:
+            try:
+                self.on_extend(claims)
+            except Exception as e:
+                logger.error(f"Error refreshing claims of {len(claims)} extended message(s): {e}")
+
+        if response.get("Successful"):
+            logger.info(f"Extended visibility of {len(response['Successful'])} in-flight message(s)")
+        for failure in response.get("Failed", []):
+            logger.error(f"Failed to extend message visibility: {failure.get('Code')} - {failure.get('Message')}")
+            if failure.get("SenderFault"):
+                with self._lock:
+                    self._in_flight.pop(entries[failure["Id"]], None)
+                    self._claims.pop(entries[failure["Id"]], None)
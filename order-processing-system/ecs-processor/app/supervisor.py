@@ -0,0 +1,221 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Forked rather than spawned: workers start from the supervisor's already imported
+# modules and share its pages until they write to them
+_fork = multiprocessing.get_context("fork")
+
+
+class WorkerSlot:
+    def __init__(self, index: int, backoff: float):
+        self.index = index
+        self.backoff = backoff
+        self.process = None
+        self.started_at = 0.0
+        self.restart_at: Optional[float] = None
+        self.restarts = 0
+
+
+# Runs target(index, heartbeat) in `processes` forked worker processes and keeps them
+# running: a worker that exits is restarted, after a delay that doubles while it keeps
+# dying within min_uptime of starting, and a worker whose heartbeat is older than
+# heartbeat_timeout is killed and restarted. SIGTERM and SIGINT are passed on to every
+# worker; those still running after shutdown_timeout are killed. The supervisor itself
+# starts no threads, so forking a replacement worker is always safe.
+#
+# Aggregate health is logged whenever it changes and written to health_file every
+# health_interval seconds for `python supervisor.py health`.
+class WorkerSupervisor:
+    def __init__(
+        self,
+        target: Callable[[int, Callable[[], None]], None],
+        processes: int,
+        heartbeat_timeout: float = 90,
+        shutdown_timeout: float = 25,
+        restart_backoff: float = 1,
+        max_restart_backoff: float = 60,
+        min_uptime: float = 30,
+        health_file: Optional[str] = None,
+        health_interval: float = 10
+    ):
+        self.target = target
+        self.processes = processes
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.min_uptime = min_uptime
+        self.health_file = health_file
+        self.health_interval = health_interval
+        # Written by each worker's poll loop, read here; shared memory survives the fork
+        self._heartbeats = _fork.RawArray("d", processes)
+        self._slots = [WorkerSlot(index, restart_backoff) for index in range(processes)]
+        self._stopping = False
+        self._last_health = None
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._signal)
+        signal.signal(signal.SIGINT, self._signal)
+        logger.info(f"Supervisor starting {self.processes} worker process(es)")
+        for slot in self._slots:
+            self._spawn(slot)
+
+        next_health = 0.0
+        while not self._stopping:
+            wait([slot.process.sentinel for slot in self._slots if slot.process and slot.process.is_alive()], timeout=1)
+            if self._stopping:
+                break
+            now = time.time()
+            for slot in self._slots:
+                self._check(slot, now)
+            if now >= next_health:
+                self._report_health(now)
+                next_health = now + self.health_interval
+
+        self._shutdown()
+
+    def health(self, now: Optional[float] = None) -> dict:
+        now = now or time.time()
+        workers = []
+        for slot in self._slots:
+            alive = bool(slot.process and slot.process.is_alive())
+            age = max(0.0, now - self._heartbeats[slot.index])
+            workers.append({
+                "index": slot.index,
+                "pid": slot.process.pid if alive else None,
+                "healthy": alive and age <= self.heartbeat_timeout,
+                "heartbeat_age": round(age, 1) if alive else None,
+                "restarts": slot.restarts
+            })
+        healthy = sum(1 for worker in workers if worker["healthy"])
+        return {
+            "time": now,
+            "processes": self.processes,
+            "healthy_workers": healthy,
+            # Losing one worker of several to a restart shouldn't take the whole task down
+            "healthy": healthy * 2 >= self.processes,
+            "workers": workers
+        }
+
+    def _signal(self, signum, frame):
+        logger.info(f"Supervisor received signal {signum}, stopping workers...")
+        self._stopping = True
+
+    def _spawn(self, slot: WorkerSlot):
+        # Counts as a heartbeat so a worker gets heartbeat_timeout to start up
+        self._heartbeats[slot.index] = time.time()
+        slot.process = _fork.Process(target=self._worker, args=(slot.index,), name=f"worker-{slot.index}")
+        slot.process.start()
+        slot.started_at = time.time()
+        slot.restart_at = None
+        logger.info(f"Started worker {slot.index} (pid {slot.process.pid})")
+
+    def _worker(self, index: int):
+        # The supervisor's handlers came along with the fork; the worker installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        def heartbeat():
+            self._heartbeats[index] = time.time()
+
+        self.target(index, heartbeat)
+
+    def _check(self, slot: WorkerSlot, now: float):
+        if slot.restart_at is None:
+            if slot.process.is_alive():
+                if now - self._heartbeats[slot.index] <= self.heartbeat_timeout:
+                    return
+                # A stuck poll loop won't act on SIGTERM either. Its in-flight messages
+                # reappear on the queue and its claims go stale and are taken over.
+                logger.error(f"Worker {slot.index} (pid {slot.process.pid}) missed heartbeats for {self.heartbeat_timeout:.0f}s, killing it")
+                slot.process.kill()
+            slot.process.join()
+
+            if now - slot.started_at >= self.min_uptime:
+                slot.backoff = self.restart_backoff
+            delay = slot.backoff
+            slot.backoff = min(slot.backoff * 2, self.max_restart_backoff)
+            slot.restart_at = now + delay
+            logger.warning(f"Worker {slot.index} exited with code {slot.process.exitcode}, restarting in {delay:.0f}s")
+
+        if now >= slot.restart_at:
+            slot.restarts += 1
+            self._spawn(slot)
+
+    def _report_health(self, now: float):
+        health = self.health(now)
+        summary = (health["healthy_workers"], health["healthy"])
+        if summary != self._last_health:
+            log = logger.info if health["healthy_workers"] == self.processes else logger.warning
+            log(f"Workers healthy: {health['healthy_workers']}/{self.processes}")
+            self._last_health = summary
+        if self.health_file:
+            try:
+                with open(self.health_file + ".tmp", "w") as f:
+                    json.dump(health, f)
+                os.replace(self.health_file + ".tmp", self.health_file)
+            except OSError as e:
+                logger.error(f"Error writing {self.health_file}: {e}")
+
+    def _shutdown(self):
+        for slot in self._slots:
+            if slot.process and slot.process.is_alive():
+                slot.process.terminate()
+        deadline = time.time() + self.shutdown_timeout
+        for slot in self._slots:
+            if slot.process:
+                slot.process.join(max(0, deadline - time.time()))
+        for slot in self._slots:
+            if slot.process and slot.process.is_alive():
+                logger.warning(f"Worker {slot.index} (pid {slot.process.pid}) still running after {self.shutdown_timeout:.0f}s, killing it")
+                slot.process.kill()
+                slot.process.join()
+        logger.info("Supervisor shut down")
+
+
+def check_health(path: str, max_age: float) -> Optional[str]:
+    # None when healthy, otherwise the reason
+    try:
+        with open(path) as f:
+            health = json.load(f)
+    except (OSError, ValueError) as e:
+        return f"Cannot read {path}: {e}"
+    age = time.time() - health["time"]
+    if age > max_age:
+        return f"{path} is {age:.0f}s old; the supervisor is not updating it"
+    if not health["healthy"]:
+        return f"Only {health['healthy_workers']}/{health['processes']} worker(s) healthy"
+    return None
+
+
+def main():
+    # ECS container health check:
+    #   python supervisor.py health
+    import main as app
+
+    parser = argparse.ArgumentParser(description="Order processor supervisor")
+    parser.add_argument("command", choices=["health"])
+    parser.parse_args()
+
+    if app.PROCESS_COUNT <= 1:
+        # No supervisor; ECS already replaces the task when its only process exits
+        sys.exit(0)
+    problem = check_health(app.WORKER_HEALTH_FILE, max_age=app.WORKER_HEALTH_INTERVAL * 3)
+    if problem:
+        print(problem)
+        sys.exit(1)
+    print("healthy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from scaling import ServiceTime
+
+logger = logging.getLogger(__name__)
+
+
+# Thread pool that never holds more than `concurrency` messages in flight. The poll
+# loop only receives as many messages as there are free slots, so nothing waits in a
+# local queue while its visibility timeout runs down.
+class WorkerPool:
+    def __init__(self, concurrency: int):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="order-worker")
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self.service_time = ServiceTime()
+
+    @property
+    def in_flight(self) -> int:
+        with self._condition:
+            return self._in_flight
+
+    def free_slots(self) -> int:
+        with self._condition:
+            return self.concurrency - self._in_flight
+
+    def wait_for_slot(self, timeout: Optional[float] = None, slots: int = 1) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: self.concurrency - self._in_flight >= slots, timeout=timeout)
+
+    def throughput(self) -> Optional[float]:
+        # Messages per second with every worker busy; None until one has finished
+        seconds = self.service_time.value
+        return self.concurrency / seconds if seconds else None
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._condition:
+            if self._in_flight >= self.concurrency:
+                raise RuntimeError("No free worker slot; call wait_for_slot() before submit()")
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(self._timed, fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        logger.info(f"Waiting for {self.in_flight} in-flight message(s) to finish")
+        self._executor.shutdown(wait=wait)
+
+    def _timed(self, fn: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.service_time.record(time.perf_counter() - start)
+
+    def _on_done(self, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Worker raised an unhandled error: {future.exception()}")
+        self._release()
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
@@ -1,31 +1,70 @@
+import base64
 import json
 import os
+import time
 import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
 
-import boto3
 import logging
 import psycopg2
-from fastapi import FastAPI, HTTPException
-from mangum import Mangum
-from pydantic import BaseModel, EmailStr, Field
-
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from starlette.exceptions import HTTPException
 
+# FastAPI/Mangum and boto3 are imported on first use (see create_app and get_sqs_client):
+# together they are most of the import time, and a cold start that only serves
+# POST /orders through the fast path with the outbox needs neither
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-app = FastAPI(title="Create Order Service", version="1.0.0")
-
 DB_HOST = os.environ.get("DB_HOST")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USERNAME = os.environ.get("DB_USERNAME")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 SQS_QUEUE_URL = os.environ.get("SQS_QUEUE_URL")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
-
-sqs_client = boto3.client("sqs", region_name=AWS_REGION)
+# Ping a cached connection before reuse when it has been idle (frozen) this long
+DB_VALIDATE_AFTER_SECONDS = float(os.environ.get("DB_VALIDATE_AFTER_SECONDS", "60"))
+# Set to "false" once database/init.sql is applied as a migration
+DB_SCHEMA_BOOTSTRAP = os.environ.get("DB_SCHEMA_BOOTSTRAP", "true").lower() == "true"
+MAX_BATCH_ORDERS = int(os.environ.get("MAX_BATCH_ORDERS", "1000"))
+# Orders per INSERT statement when writing a batch
+DB_INSERT_CHUNK_SIZE = int(os.environ.get("DB_INSERT_CHUNK_SIZE", "500"))
+# Parallel SendMessageBatch calls when enqueueing a batch
+SQS_SEND_CONCURRENCY = int(os.environ.get("SQS_SEND_CONCURRENCY", "8"))
+# "outbox": write the SQS message to order_outbox in the order's transaction and let the
+# processor's relay send it; "direct": send to SQS from the request after committing
+ORDER_ENQUEUE_MODE = os.environ.get("ORDER_ENQUEUE_MODE", "outbox").lower()
+OUTBOX_CHANNEL = "order_outbox"
+# "compact": version 2 messages with short keys, zlib-compressed past
+# MESSAGE_COMPRESS_THRESHOLD bytes; "json": the original format, for processors that
+# can't read version 2 yet
+MESSAGE_FORMAT = os.environ.get("MESSAGE_FORMAT", "compact").lower()
+MESSAGE_COMPRESS_THRESHOLD = int(os.environ.get("MESSAGE_COMPRESS_THRESHOLD", "1024"))
+# Compact messages larger than this become a claim check that the processor resolves from
+# the order row; SQS bills each 64 KB of a message as a separate request
+MESSAGE_INLINE_LIMIT = int(os.environ.get("MESSAGE_INLINE_LIMIT", "65536"))
+MESSAGE_COMPRESSED_PREFIX = "z:"
+# SendMessageBatch takes at most 10 messages and 256 KB in total
+SQS_BATCH_SIZE = 10
+SQS_BATCH_MAX_BYTES = 262144
+# Allowance per message for the OrderId attribute, which counts toward the size too
+SQS_ATTRIBUTE_BYTES = 64
+# Serve successful POST /orders requests without going through FastAPI
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+# API Gateway stage prefix on rawPath
+API_BASE_PATH = "/dev"
+
+# Survive across warm invocations of the same container
+_db_connection = None
+_db_last_used = 0.0
+_schema_ready = False
+_sqs_client = None
+_app = None
+_asgi_handler = None
 
 
 class OrderItem(BaseModel):
@@ -59,8 +98,175 @@ class CreateOrderResponse(BaseModel):
     message: str
 
 
+class BatchCreateOrderRequest(BaseModel):
+    # Validated one by one so a bad order is reported instead of failing the whole batch
+    orders: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BATCH_ORDERS)
+
+
+class BatchOrderResult(BaseModel):
+    index: int
+    order_id: Optional[str] = None
+    status: str
+    total_amount: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchCreateOrderResponse(BaseModel):
+    results: List[BatchOrderResult]
+    queued: int
+    rejected: int
+    enqueue_failed: int
+    message: str
+
+
+def get_sqs_client():
+    global _sqs_client
+    if _sqs_client is None:
+        import boto3
+        _sqs_client = boto3.client("sqs", region_name=AWS_REGION)
+    return _sqs_client
+
+
 def get_db_connection():
-    return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD)
+    global _db_connection, _db_last_used
+
+    if _db_connection is not None and not _is_connection_usable(_db_connection):
+        logger.info("Cached database connection is no longer usable, reconnecting")
+        discard_db_connection()
+
+    if _db_connection is None:
+        _db_connection = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD, connect_timeout=5)
+
+    _db_last_used = time.monotonic()
+    return _db_connection
+
+
+def _is_connection_usable(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - _db_last_used < DB_VALIDATE_AFTER_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def reset_db_connection():
+    if _db_connection is None:
+        return
+    try:
+        _db_connection.rollback()
+    except psycopg2.Error:
+        discard_db_connection()
+
+
+def discard_db_connection():
+    global _db_connection
+    conn, _db_connection = _db_connection, None
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# Monthly partitions are added by the processor's partition maintenance; until then
+# rows go to the default partition
+STATUS_LOG_DDL = """
+    CREATE TABLE IF NOT EXISTS order_status_log (
+        id UUID NOT NULL,
+        order_id UUID REFERENCES orders(id) ON DELETE CASCADE,
+        status VARCHAR(50) NOT NULL,
+        message TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    CREATE TABLE IF NOT EXISTS order_status_log_default PARTITION OF order_status_log DEFAULT;
+    CREATE INDEX IF NOT EXISTS idx_order_status_log_created_at ON order_status_log(order_id, created_at DESC);
+"""
+
+# Aggregates behind GET /orders/stats (see database/init.sql). The triggers are
+# installed together with a backfill from the existing orders, with writers locked
+# out, so each order is counted exactly once.
+ORDER_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS order_stats_deltas (
+        id BIGSERIAL PRIMARY KEY,
+        status VARCHAR(50) NOT NULL,
+        day DATE,
+        order_count INTEGER NOT NULL,
+        total_amount DECIMAL(14, 2) NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS order_status_totals (
+        status VARCHAR(50) PRIMARY KEY,
+        order_count BIGINT NOT NULL,
+        total_amount DECIMAL(16, 2) NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS order_daily_totals (
+        day DATE NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        order_count BIGINT NOT NULL,
+        total_amount DECIMAL(16, 2) NOT NULL,
+        PRIMARY KEY (day, status)
+    );
+    CREATE OR REPLACE FUNCTION record_order_stats()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO order_stats_deltas (status, day, order_count, total_amount)
+            SELECT status, created_at::date, count(*), sum(total_amount)
+            FROM new_rows GROUP BY 1, 2;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO order_stats_deltas (status, day, order_count, total_amount)
+            SELECT status, created_at::date, -count(*), -sum(total_amount)
+            FROM old_rows GROUP BY 1, 2;
+        ELSE
+            INSERT INTO order_stats_deltas (status, day, order_count, total_amount)
+            SELECT status, day, sum(order_count), sum(total_amount)
+            FROM (
+                SELECT status, created_at::date AS day, -1 AS order_count, -total_amount AS total_amount FROM old_rows
+                UNION ALL
+                SELECT status, created_at::date, 1, total_amount FROM new_rows
+            ) changes
+            GROUP BY status, day
+            HAVING sum(order_count) <> 0 OR sum(total_amount) <> 0;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ language 'plpgsql';
+    DO $$
+    BEGIN
+        LOCK TABLE orders IN SHARE ROW EXCLUSIVE MODE;
+        IF EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'orders_stats_insert' AND tgrelid = 'orders'::regclass) THEN
+            RETURN;
+        END IF;
+        CREATE TRIGGER orders_stats_insert AFTER INSERT ON orders
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION record_order_stats();
+        CREATE TRIGGER orders_stats_update AFTER UPDATE ON orders
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION record_order_stats();
+        CREATE TRIGGER orders_stats_delete AFTER DELETE ON orders
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION record_order_stats();
+        DELETE FROM order_stats_deltas;
+        DELETE FROM order_status_totals;
+        DELETE FROM order_daily_totals;
+        INSERT INTO order_status_totals (status, order_count, total_amount)
+        SELECT status, count(*), sum(total_amount) FROM orders GROUP BY status;
+        INSERT INTO order_daily_totals (day, status, order_count, total_amount)
+        SELECT created_at::date, status, count(*), sum(total_amount) FROM orders WHERE created_at IS NOT NULL GROUP BY 1, 2;
+    END
+    $$;
+"""
+
+
+def ensure_schema(conn):
+    global _schema_ready
+    if _schema_ready or not DB_SCHEMA_BOOTSTRAP:
+        return
+    create_tables_if_not_exist(conn)
+    _schema_ready = True
 
 
 def create_tables_if_not_exist(conn):
@@ -83,47 +289,85 @@ def create_tables_if_not_exist(conn):
                 unit_price DECIMAL(10, 2) NOT NULL,
                 subtotal DECIMAL(10, 2) NOT NULL
             );
-            CREATE TABLE IF NOT EXISTS order_status_log (
-                id UUID PRIMARY KEY,
-                order_id UUID REFERENCES orders(id) ON DELETE CASCADE,
-                status VARCHAR(50) NOT NULL,
-                message TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS order_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                order_id UUID NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+                message_body TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP
             );
             CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
             CREATE INDEX IF NOT EXISTS idx_orders_customer_email ON orders(customer_email);
+            CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders(status, created_at DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_orders_customer_email_created_at ON orders(customer_email, created_at DESC, id DESC);
             CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
-            CREATE INDEX IF NOT EXISTS idx_order_status_log_order_id ON order_status_log(order_id);
+            CREATE INDEX IF NOT EXISTS idx_order_outbox_unsent ON order_outbox(id) WHERE sent_at IS NULL;
+            CREATE INDEX IF NOT EXISTS idx_order_outbox_sent_at ON order_outbox(sent_at) WHERE sent_at IS NOT NULL;
         """)
+        cur.execute("""
+            SELECT to_regclass('order_status_log') IS NOT NULL,
+                   EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('order_status_log'))
+        """)
+        status_log_exists, status_log_partitioned = cur.fetchone()
+        if status_log_exists and not status_log_partitioned:
+            # A table from before partitioning; the default partition can't be attached to
+            # it, and orders can still be written to it as it is
+            logger.warning("order_status_log is not partitioned; run `python partitions.py migrate` from the ECS processor")
+        else:
+            cur.execute(STATUS_LOG_DDL)
+        cur.execute("SELECT 1 FROM pg_trigger WHERE tgname = 'orders_stats_insert' AND tgrelid = 'orders'::regclass")
+        if not cur.fetchone():
+            cur.execute(ORDER_STATS_DDL)
         conn.commit()
 
 
-def send_to_sqs(order_id: str, order_data: dict):
-    message_body = {
-        "order_id": order_id,
-        "customer_email": order_data["customer_email"],
-        "customer_name": order_data["customer_name"],
-        "total_amount": order_data["total_amount"],
-        "items": order_data["items"],
-        "created_at": order_data["created_at"]
-    }
-    sqs_client.send_message(
-        QueueUrl=SQS_QUEUE_URL,
-        MessageBody=json.dumps(message_body),
-        MessageAttributes={"OrderId": {"DataType": "String", "StringValue": order_id}}
+def insert_orders(cur, orders: List[dict], outbox: bool = False):
+    # Orders, their items and the initial status log rows go out as one statement
+    # (one round trip) no matter how many orders or line items there are. With outbox
+    # set, the SQS messages are written alongside them so they commit (or not) together.
+    order_rows = b",".join(
+        cur.mogrify(
+            "(%s, %s, %s, %s, %s, %s, %s)",
+            (o["order_id"], o["customer_email"], o["customer_name"], o["total_amount"], "PENDING", o["created_at"], o["created_at"])
+        )
+        for o in orders
     )
+    item_rows = b",".join(
+        cur.mogrify(
+            "(%s, %s, %s, %s, %s, %s)",
+            (item["id"], o["order_id"], item["product_name"], item["quantity"], item["unit_price"], item["subtotal"])
+        )
+        for o in orders
+        for item in o["items"]
+    )
+    # Stamped with the order's own created_at: history reads only scan partitions from
+    # that point on, so the first entry must not fall before it
+    log_rows = b",".join(
+        cur.mogrify(
+            "(%s, %s, %s, %s, %s)",
+            (str(uuid.uuid4()), o["order_id"], "PENDING", "Order created and queued for processing", o["created_at"])
+        )
+        for o in orders
+    )
+    statement = (
+        b"WITH new_orders AS ("
+        b"INSERT INTO orders (id, customer_email, customer_name, total_amount, status, created_at, updated_at) VALUES " + order_rows +
+        b"), new_items AS ("
+        b"INSERT INTO order_items (id, order_id, product_name, quantity, unit_price, subtotal) VALUES " + item_rows +
+        b")"
+    )
+    if outbox:
+        outbox_rows = b",".join(cur.mogrify("(%s, %s)", (o["order_id"], build_message_body(o))) for o in orders)
+        statement += b", new_outbox AS (INSERT INTO order_outbox (order_id, message_body) VALUES " + outbox_rows + b")"
+    statement += b" INSERT INTO order_status_log (id, order_id, status, message, created_at) VALUES " + log_rows
+    if outbox:
+        # Delivered on commit; wakes the relay instead of waiting for its next poll
+        statement += b"; NOTIFY " + OUTBOX_CHANNEL.encode()
+    cur.execute(statement)
 
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "create-order"}
-
-
-@app.post("/orders", response_model=CreateOrderResponse)
-async def create_order(request: CreateOrderRequest):
-    order_id = str(uuid.uuid4())
-    created_at = datetime.utcnow()
-
+def build_order(request: CreateOrderRequest, created_at: datetime) -> dict:
     items_with_subtotal = []
     total_amount = 0.0
 
@@ -138,61 +382,277 @@ async def create_order(request: CreateOrderRequest):
             "subtotal": subtotal
         })
 
-    total_amount = round(total_amount, 2)
+    return {
+        "order_id": str(uuid.uuid4()),
+        "customer_email": request.customer_email,
+        "customer_name": request.customer_name,
+        "total_amount": round(total_amount, 2),
+        "created_at": created_at,
+        "items": items_with_subtotal
+    }
+
+
+def build_message_body(order: dict) -> str:
+    if MESSAGE_FORMAT != "compact":
+        return json.dumps({
+            "order_id": order["order_id"],
+            "customer_email": order["customer_email"],
+            "customer_name": order["customer_name"],
+            "total_amount": order["total_amount"],
+            "items": order["items"],
+            "created_at": order["created_at"].isoformat()
+        })
+
+    # Version 2; the processor's messages.py decodes it. Items go without their ids,
+    # which the processor never uses.
+    body = json.dumps({
+        "v": 2,
+        "id": order["order_id"],
+        "e": order["customer_email"],
+        "n": order["customer_name"],
+        "t": order["total_amount"],
+        "c": order["created_at"].isoformat(),
+        "i": [[item["product_name"], item["quantity"], item["unit_price"], item["subtotal"]] for item in order["items"]]
+    }, separators=(",", ":"))
+    if len(body) > MESSAGE_COMPRESS_THRESHOLD:
+        compressed = MESSAGE_COMPRESSED_PREFIX + base64.b64encode(zlib.compress(body.encode())).decode()
+        if len(compressed) < len(body):
+            body = compressed
+    if len(body) > MESSAGE_INLINE_LIMIT:
+        # The order row is committed before the message can be received
+        body = json.dumps({"v": 2, "id": order["order_id"], "ref": "db"}, separators=(",", ":"))
+    return body
+
+
+def sqs_batches(entries: List[dict]) -> List[List[dict]]:
+    batches, batch, size = [], [], 0
+    for entry in entries:
+        entry_size = len(entry["MessageBody"].encode()) + SQS_ATTRIBUTE_BYTES
+        if batch and (len(batch) == SQS_BATCH_SIZE or size + entry_size > SQS_BATCH_MAX_BYTES):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(entry)
+        size += entry_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def send_to_sqs(order: dict):
+    get_sqs_client().send_message(
+        QueueUrl=SQS_QUEUE_URL,
+        MessageBody=build_message_body(order),
+        MessageAttributes={"OrderId": {"DataType": "String", "StringValue": order["order_id"]}}
+    )
+
+
+def send_to_sqs_batch(orders: List[dict]) -> Dict[str, str]:
+    entries = [
+        {
+            "Id": str(i),
+            "MessageBody": build_message_body(order),
+            "MessageAttributes": {"OrderId": {"DataType": "String", "StringValue": order["order_id"]}}
+        }
+        for i, order in enumerate(orders)
+    ]
+    chunks = sqs_batches(entries)
+    failures = {}
+
+    def send_chunk(chunk: List[dict]) -> Dict[str, str]:
+        try:
+            response = get_sqs_client().send_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=chunk)
+        except Exception as e:
+            return {orders[int(entry["Id"])]["order_id"]: str(e) for entry in chunk}
+        return {
+            orders[int(failure["Id"])]["order_id"]: f"{failure.get('Code')}: {failure.get('Message')}"
+            for failure in response.get("Failed", [])
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, min(SQS_SEND_CONCURRENCY, len(chunks)))) as executor:
+        for chunk_failures in executor.map(send_chunk, chunks):
+            failures.update(chunk_failures)
+
+    return failures
+
+
+async def health_check():
+    return {"status": "healthy", "service": "create-order"}
+
+
+async def create_order(request: CreateOrderRequest):
+    return save_order(request)
+
+
+def save_order(request: CreateOrderRequest) -> CreateOrderResponse:
+    created_at = datetime.utcnow()
+    order = build_order(request, created_at)
 
     try:
         conn = get_db_connection()
-        create_tables_if_not_exist(conn)
+        ensure_schema(conn)
 
         with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO orders (id, customer_email, customer_name, total_amount, status, created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (order_id, request.customer_email, request.customer_name, total_amount, "PENDING", created_at, created_at)
-            )
-
-            for item in items_with_subtotal:
-                cur.execute(
-                    "INSERT INTO order_items (id, order_id, product_name, quantity, unit_price, subtotal) VALUES (%s, %s, %s, %s, %s, %s)",
-                    (item["id"], order_id, item["product_name"], item["quantity"], item["unit_price"], item["subtotal"])
-                )
-
-            cur.execute(
-                "INSERT INTO order_status_log (id, order_id, status, message) VALUES (%s, %s, %s, %s)",
-                (str(uuid.uuid4()), order_id, "PENDING", "Order created and queued for processing")
-            )
+            insert_orders(cur, [order], outbox=ORDER_ENQUEUE_MODE == "outbox")
             conn.commit()
 
-        conn.close()
-
-        order_data = {
-            "customer_email": request.customer_email,
-            "customer_name": request.customer_name,
-            "total_amount": total_amount,
-            "items": items_with_subtotal,
-            "created_at": created_at.isoformat()
-        }
-        send_to_sqs(order_id, order_data)
+        if ORDER_ENQUEUE_MODE != "outbox":
+            send_to_sqs(order)
 
         return CreateOrderResponse(
-            order_id=order_id,
+            order_id=order["order_id"],
             customer_email=request.customer_email,
             customer_name=request.customer_name,
-            total_amount=total_amount,
+            total_amount=order["total_amount"],
             status="PENDING",
-            items=[OrderItemResponse(**item) for item in items_with_subtotal],
+            items=[OrderItemResponse(**item) for item in order["items"]],
             created_at=created_at.isoformat(),
             message="Order created successfully and queued for processing"
         )
 
     except Exception as e:
+        reset_db_connection()
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
 
-mangum_handler = Mangum(app, lifespan="off",api_gateway_base_path="/dev")
+async def create_orders_batch(request: BatchCreateOrderRequest):
+    created_at = datetime.utcnow()
+    results = []
+    orders = []
+
+    for index, raw_order in enumerate(request.orders):
+        try:
+            order_request = CreateOrderRequest.model_validate(raw_order)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors())
+            results.append(BatchOrderResult(index=index, status="REJECTED", error=error))
+            continue
+        order = build_order(order_request, created_at)
+        orders.append(order)
+        results.append(BatchOrderResult(index=index, order_id=order["order_id"], status="PENDING", total_amount=order["total_amount"]))
+
+    if orders:
+        try:
+            conn = get_db_connection()
+            ensure_schema(conn)
+
+            with conn.cursor() as cur:
+                for start in range(0, len(orders), DB_INSERT_CHUNK_SIZE):
+                    insert_orders(cur, orders[start:start + DB_INSERT_CHUNK_SIZE], outbox=ORDER_ENQUEUE_MODE == "outbox")
+                conn.commit()
+
+        except Exception as e:
+            reset_db_connection()
+            raise HTTPException(status_code=500, detail=f"Failed to create orders: {str(e)}")
+
+        if ORDER_ENQUEUE_MODE != "outbox":
+            # Orders are already committed; a failed send is reported per order rather than failing the batch
+            failures = send_to_sqs_batch(orders)
+            for result in results:
+                if result.order_id in failures:
+                    result.status = "ENQUEUE_FAILED"
+                    result.error = failures[result.order_id]
+
+    queued = sum(1 for r in results if r.status == "PENDING")
+    rejected = sum(1 for r in results if r.status == "REJECTED")
+    enqueue_failed = sum(1 for r in results if r.status == "ENQUEUE_FAILED")
+    logger.info(f"Batch of {len(results)} order(s): {queued} queued, {rejected} rejected, {enqueue_failed} failed to enqueue")
+
+    return BatchCreateOrderResponse(
+        results=results,
+        queued=queued,
+        rejected=rejected,
+        enqueue_failed=enqueue_failed,
+        message=f"{queued} of {len(results)} order(s) created and queued for processing"
+    )
+
+
+def create_app():
+    from fastapi import FastAPI
+
+    app = FastAPI(title="Create Order Service", version="1.0.0")
+    app.add_api_route("/health", health_check, methods=["GET"])
+    app.add_api_route("/orders", create_order, methods=["POST"], response_model=CreateOrderResponse)
+    app.add_api_route("/orders/batch", create_orders_batch, methods=["POST"], response_model=BatchCreateOrderResponse)
+    return app
+
+
+def get_app():
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+
+def get_asgi_handler():
+    global _asgi_handler
+    if _asgi_handler is None:
+        from mangum import Mangum
+        _asgi_handler = Mangum(get_app(), lifespan="off", api_gateway_base_path=API_BASE_PATH)
+    return _asgi_handler
+
+
+def __getattr__(name):
+    # `handler.app` still works for uvicorn and TestClient; the app is built on first access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def json_response(status_code: int, content) -> dict:
+    # The body and headers Mangum returns for a FastAPI JSONResponse
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return {
+        "statusCode": status_code,
+        "headers": {"content-length": str(len(body.encode())), "content-type": "application/json"},
+        "body": body,
+        "isBase64Encoded": False
+    }
+
+
+def fast_path(event) -> Optional[dict]:
+    # Handles a valid POST /orders directly. Returns None for anything else (other routes,
+    # non-JSON or invalid bodies) so FastAPI produces exactly the responses it always has.
+    method = event.get("requestContext", {}).get("http", {}).get("method")
+    path = event.get("rawPath", "")
+    if path.startswith(API_BASE_PATH):
+        path = path[len(API_BASE_PATH):]
+    if method != "POST" or path != "/orders":
+        return None
+    content_type = {k.lower(): v for k, v in (event.get("headers") or {}).items()}.get("content-type", "application/json")
+    if "json" not in content_type:
+        return None
+
+    try:
+        body = event.get("body") or ""
+        if event.get("isBase64Encoded"):
+            body = base64.b64decode(body)
+        request = CreateOrderRequest.model_validate(json.loads(body))
+    except (ValueError, ValidationError):
+        return None
+
+    try:
+        response = save_order(request)
+    except HTTPException as e:
+        return json_response(e.status_code, {"detail": e.detail})
+    return json_response(200, response.model_dump(mode="json"))
+
 
 def handler(event, context):
-    import json
     logger.info(f"EVENT: {json.dumps(event)}")
     logger.info(f"HTTP Method: {event.get('requestContext', {}).get('http', {}).get('method')}")
     logger.info(f"Path: {event.get('rawPath')}")
-    return mangum_handler(event, context)
\ No newline at end of file
+    if FAST_PATH_ENABLED:
+        response = fast_path(event)
+        if response is not None:
+            return response
+    return get_asgi_handler()(event, context)
+
+
+# Whatever the hot path will need is loaded during init, which runs at full CPU
+# regardless of the function's memory size. Email validation loads its IDNA tables
+# on first use, so validate one request up front.
+CreateOrderRequest.model_validate({"customer_email": "init@example.com", "customer_name": "init", "items": [{"product_name": "init", "quantity": 1, "unit_price": 1}]})
+if not FAST_PATH_ENABLED:
+    get_asgi_handler()
+if ORDER_ENQUEUE_MODE != "outbox":
+    get_sqs_client()
\ No newline at end of file
@@ -1,17 +1,150 @@
+import base64
+import binascii
+import csv
+import io
+import json
+import logging
 import os
-from typing import List, Optional
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
 
 import psycopg2
-from fastapi import FastAPI, HTTPException, Path, Query
-from mangum import Mangum
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
 from pydantic import BaseModel
+from starlette.exceptions import HTTPException
 
-app = FastAPI(title="Get Order Status Service", version="1.0.0")
+# FastAPI and Mangum are imported on first use (see create_app); a cold start that only
+# serves GET /orders/{order_id} through the fast path doesn't need them
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
 
 DB_HOST = os.environ.get("DB_HOST")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USERNAME = os.environ.get("DB_USERNAME")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
+# Ping a cached connection before reuse when it has been idle (frozen) this long
+DB_VALIDATE_AFTER_SECONDS = float(os.environ.get("DB_VALIDATE_AFTER_SECONDS", "60"))
+# Orders kept in the per-container cache for GET /orders/{order_id}; 0 disables it
+ORDER_CACHE_SIZE = int(os.environ.get("ORDER_CACHE_SIZE", "1024"))
+ORDER_CACHE_TTL_SECONDS = float(os.environ.get("ORDER_CACHE_TTL_SECONDS", "300"))
+# Rows per round trip on the server-side cursors behind GET /orders/export
+EXPORT_FETCH_SIZE = int(os.environ.get("EXPORT_FETCH_SIZE", "2000"))
+# Serve GET /orders/{order_id} without going through FastAPI
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+# API Gateway stage prefix on rawPath
+API_BASE_PATH = "/dev"
+
+# Orders in these states never change again, so cached copies are served without asking RDS.
+# PAYMENT_FAILED is not one of them: the processor retries it when SQS redelivers the order.
+TERMINAL_STATUSES = {"COMPLETED", "CANCELLED"}
+
+# Paid for; counted as revenue by GET /orders/stats
+REVENUE_STATUSES = {"PAYMENT_CONFIRMED", "FULFILLED", "COMPLETED"}
+
+# Totals per status, then per status and bucket of days, from the aggregates the orders
+# triggers maintain plus the deltas the processor hasn't folded in yet. One statement, so
+# both come from the same snapshot even if a rollup commits meanwhile.
+ORDER_STATS_QUERY = """
+    WITH pending AS (
+        SELECT status, day, order_count, total_amount FROM order_stats_deltas
+    )
+    SELECT NULL::date AS bucket, status, sum(order_count), sum(total_amount)
+    FROM (
+        SELECT status, order_count, total_amount FROM order_status_totals
+        UNION ALL
+        SELECT status, order_count, total_amount FROM pending
+    ) totals
+    GROUP BY status
+    UNION ALL
+    SELECT date_trunc(%(bucket)s, day)::date, status, sum(order_count), sum(total_amount)
+    FROM (
+        SELECT day, status, order_count, total_amount FROM order_daily_totals WHERE day >= %(since)s
+        UNION ALL
+        SELECT day, status, order_count, total_amount FROM pending WHERE day >= %(since)s
+    ) daily
+    GROUP BY 1, 2
+    ORDER BY status
+"""
+
+EXPORT_COLUMNS = ["order_id", "customer_email", "customer_name", "total_amount", "status", "created_at", "updated_at"]
+EXPORT_ITEM_COLUMNS = ["product_name", "quantity", "unit_price", "subtotal"]
+
+# Both in (created_at, id) order, which Postgres reads off idx_orders_created_at with at
+# most a small incremental sort, so rows start flowing at once and the items stream
+# lines up with the orders stream
+EXPORT_ORDERS_QUERY = """
+    SELECT o.id, o.customer_email, o.customer_name, o.total_amount, o.status, o.created_at, o.updated_at
+    FROM orders o
+    WHERE {filters}
+    ORDER BY o.created_at, o.id
+"""
+
+EXPORT_ITEMS_QUERY = """
+    SELECT o.id, i.product_name, i.quantity, i.unit_price, i.subtotal
+    FROM orders o JOIN order_items i ON i.order_id = o.id
+    WHERE {filters}
+    ORDER BY o.created_at, o.id
+"""
+
+ORDER_DETAIL_QUERY = """
+    SELECT
+        o.id, o.customer_email, o.customer_name, o.total_amount, o.status, o.created_at, o.updated_at,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', i.id, 'product_name', i.product_name, 'quantity', i.quantity,
+                'unit_price', i.unit_price, 'subtotal', i.subtotal
+            ))
+            FROM order_items i WHERE i.order_id = o.id
+        ), '[]') AS items,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'status', l.status, 'message', l.message, 'created_at', l.created_at
+            ) ORDER BY l.created_at DESC)
+            FROM order_status_log l
+            -- The created_at bound lets Postgres skip status log partitions from before
+            -- the order existed; the margin allows for clock skew between writers
+            WHERE l.order_id = o.id AND l.created_at >= o.created_at - INTERVAL '1 day'
+        ), '[]') AS status_history
+    FROM orders o
+    WHERE o.id = %s
+"""
+
+# Survive across warm invocations of the same container
+_db_connection = None
+_db_last_used = 0.0
+_app = None
+_asgi_handler = None
+
+
+class TTLCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+order_cache = TTLCache(ORDER_CACHE_SIZE, ORDER_CACHE_TTL_SECONDS) if ORDER_CACHE_SIZE > 0 else None
 
 
 class OrderItemResponse(BaseModel):
@@ -51,62 +184,123 @@ class OrderListItem(BaseModel):
 
 class OrderListResponse(BaseModel):
     orders: List[OrderListItem]
+    # Only counted when include_total=true; counting is a scan over every matching order
+    total_count: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+
+class StatusStats(BaseModel):
+    count: int
+    total_amount: float
+
+
+class StatsBucket(BaseModel):
+    start: str
+    order_count: int
+    total_amount: float
+    revenue: float
+    statuses: Dict[str, StatusStats]
+
+
+class OrderStatsResponse(BaseModel):
     total_count: int
+    total_amount: float
+    revenue: float
+    statuses: Dict[str, StatusStats]
+    # Orders are bucketed by the day they were placed
+    bucket: str
+    buckets: List[StatsBucket]
 
 
 def get_db_connection():
-    return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD)
+    global _db_connection, _db_last_used
+
+    if _db_connection is not None and not _is_connection_usable(_db_connection):
+        logger.info("Cached database connection is no longer usable, reconnecting")
+        discard_db_connection()
+
+    if _db_connection is None:
+        conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD, connect_timeout=5)
+        # Read-only autocommit so a cached connection never sits idle in a transaction
+        conn.set_session(readonly=True, autocommit=True)
+        _db_connection = conn
+
+    _db_last_used = time.monotonic()
+    return _db_connection
+
+
+def _is_connection_usable(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - _db_last_used < DB_VALIDATE_AFTER_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def discard_db_connection():
+    global _db_connection
+    conn, _db_connection = _db_connection, None
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 
-@app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "get-order-status"}
 
 
-@app.get("/orders/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: str = Path(..., description="Order ID (UUID)")):
+def fetch_order(order_id: str) -> dict:
+    cached = order_cache.get(order_id) if order_cache else None
+    if cached and cached["status"] in TERMINAL_STATUSES:
+        return cached
+
     try:
         conn = get_db_connection()
 
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, customer_email, customer_name, total_amount, status, created_at, updated_at FROM orders WHERE id = %s",
-                (order_id,)
-            )
+            if cached:
+                # Still moving through its lifecycle: reuse the cached copy only if it hasn't changed
+                cur.execute("SELECT updated_at FROM orders WHERE id = %s", (order_id,))
+                row = cur.fetchone()
+                if row and row[0] and row[0].isoformat() == cached["updated_at"]:
+                    return cached
+
+            # Order, items and status history in one round trip
+            cur.execute(ORDER_DETAIL_QUERY, (order_id,))
             order_row = cur.fetchone()
 
             if not order_row:
                 raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
 
-            order = {
-                "order_id": str(order_row[0]),
-                "customer_email": order_row[1],
-                "customer_name": order_row[2],
-                "total_amount": float(order_row[3]),
-                "status": order_row[4],
-                "created_at": order_row[5].isoformat() if order_row[5] else None,
-                "updated_at": order_row[6].isoformat() if order_row[6] else None
-            }
-
-            cur.execute("SELECT id, product_name, quantity, unit_price, subtotal FROM order_items WHERE order_id = %s", (order_id,))
-            items = [OrderItemResponse(id=str(r[0]), product_name=r[1], quantity=r[2], unit_price=float(r[3]), subtotal=float(r[4])) for r in cur.fetchall()]
-
-            cur.execute("SELECT status, message, created_at FROM order_status_log WHERE order_id = %s ORDER BY created_at DESC", (order_id,))
-            status_history = [StatusLogEntry(status=r[0], message=r[1], created_at=r[2].isoformat() if r[2] else None) for r in cur.fetchall()]
-
-        conn.close()
-
-        return OrderResponse(
-            order_id=order["order_id"],
-            customer_email=order["customer_email"],
-            customer_name=order["customer_name"],
-            total_amount=order["total_amount"],
-            status=order["status"],
-            items=items,
-            status_history=status_history,
-            created_at=order["created_at"],
-            updated_at=order["updated_at"]
-        )
+        status_history = order_row[8]
+        for entry in status_history:
+            # json_agg trims trailing zeros from fractional seconds; keep the isoformat() shape
+            if entry["created_at"]:
+                entry["created_at"] = datetime.fromisoformat(entry["created_at"]).isoformat()
+
+        order = {
+            "order_id": str(order_row[0]),
+            "customer_email": order_row[1],
+            "customer_name": order_row[2],
+            "total_amount": float(order_row[3]),
+            "status": order_row[4],
+            "items": order_row[7],
+            "status_history": status_history,
+            "created_at": order_row[5].isoformat() if order_row[5] else None,
+            "updated_at": order_row[6].isoformat() if order_row[6] else None
+        }
+
+        if order_cache:
+            order_cache.set(order_id, order)
+
+        return order
 
     except HTTPException:
         raise
@@ -114,38 +308,63 @@ async def get_order(order_id: str = Path(..., description="Order ID (UUID)")):
         raise HTTPException(status_code=500, detail=f"Failed to retrieve order: {str(e)}")
 
 
-@app.get("/orders", response_model=OrderListResponse)
-async def list_orders(
-    status: Optional[str] = Query(None),
-    customer_email: Optional[str] = Query(None),
-    limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
-):
+def encode_cursor(created_at: datetime, order_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{order_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), order_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def find_orders(
+    status: Optional[str],
+    customer_email: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    include_total: bool,
+    offset: int
+) -> OrderListResponse:
+    after = decode_cursor(cursor) if cursor else None
+
     try:
         conn = get_db_connection()
 
         with conn.cursor() as cur:
-            query = "SELECT id, customer_email, customer_name, total_amount, status, created_at FROM orders WHERE 1=1"
-            count_query = "SELECT COUNT(*) FROM orders WHERE 1=1"
+            filters = ""
             params = []
 
             if status:
-                query += " AND status = %s"
-                count_query += " AND status = %s"
+                filters += " AND status = %s"
                 params.append(status)
 
             if customer_email:
-                query += " AND customer_email = %s"
-                count_query += " AND customer_email = %s"
+                filters += " AND customer_email = %s"
                 params.append(customer_email)
 
-            cur.execute(count_query, params)
-            total_count = cur.fetchone()[0]
+            total_count = None
+            if include_total:
+                cur.execute("SELECT COUNT(*) FROM orders WHERE 1=1" + filters, params)
+                total_count = cur.fetchone()[0]
+
+            # Keyset pagination on (created_at, id): each page is an index range scan on
+            # idx_orders_created_at or the status/customer_email composites, however deep it is
+            query = "SELECT id, customer_email, customer_name, total_amount, status, created_at FROM orders WHERE 1=1" + filters
+            if after:
+                query += " AND (created_at, id) < (%s, %s)"
+                params.extend(after)
 
-            query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
+            query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+            params.append(limit + 1)
+            if offset and not after:
+                query += " OFFSET %s"
+                params.append(offset)
 
             cur.execute(query, params)
+            rows = cur.fetchall()
             orders = [
                 OrderListItem(
                     order_id=str(r[0]),
@@ -154,15 +373,272 @@ async def list_orders(
                     total_amount=float(r[3]),
                     status=r[4],
                     created_at=r[5].isoformat() if r[5] else None
-                ) for r in cur.fetchall()
+                ) for r in rows[:limit]
             ]
 
-        conn.close()
+        next_cursor = None
+        if len(rows) > limit and rows[limit - 1][5] is not None:
+            next_cursor = encode_cursor(rows[limit - 1][5], str(rows[limit - 1][0]))
 
-        return OrderListResponse(orders=orders, total_count=total_count)
+        return OrderListResponse(orders=orders, total_count=total_count, next_cursor=next_cursor)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list orders: {str(e)}")
 
 
-handler = Mangum(app, lifespan="off", api_gateway_base_path="/dev")
\ No newline at end of file
+def fetch_stats(bucket: str, days: int) -> OrderStatsResponse:
+    # Back to the start of the bucket the first requested day falls in, so it is counted whole
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    if bucket == "week":
+        since -= timedelta(days=since.weekday())
+    elif bucket == "month":
+        since = since.replace(day=1)
+
+    try:
+        conn = get_db_connection()
+
+        with conn.cursor() as cur:
+            cur.execute(ORDER_STATS_QUERY, {"bucket": bucket, "since": since})
+            rows = cur.fetchall()
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read order stats: {str(e)}")
+
+    # Summed as Decimal and converted once, so totals don't pick up float rounding
+    totals = {}
+    by_bucket = {}
+    for start, status, count, amount in rows:
+        if count or amount:
+            (totals if start is None else by_bucket.setdefault(start, {}))[status] = (count, amount)
+
+    def summarize(statuses: dict) -> dict:
+        return {
+            "order_count": sum(count for count, _ in statuses.values()),
+            "total_amount": float(sum(amount for _, amount in statuses.values())),
+            "revenue": float(sum(amount for status, (_, amount) in statuses.items() if status in REVENUE_STATUSES)),
+            "statuses": {status: StatusStats(count=count, total_amount=float(amount)) for status, (count, amount) in statuses.items()}
+        }
+
+    overall = summarize(totals)
+    return OrderStatsResponse(
+        total_count=overall.pop("order_count"),
+        **overall,
+        bucket=bucket,
+        buckets=[StatsBucket(start=start.isoformat(), **summarize(by_bucket[start])) for start in sorted(by_bucket)]
+    )
+
+
+def export_orders(
+    fmt: str,
+    created_from: datetime,
+    created_to: Optional[datetime],
+    status: Optional[str],
+    customer_email: Optional[str],
+    include_items: bool
+) -> Iterator[str]:
+    filters = ["o.created_at >= %s"]
+    params = [created_from]
+    if created_to:
+        filters.append("o.created_at < %s")
+        params.append(created_to)
+    if status:
+        filters.append("o.status = %s")
+        params.append(status)
+    if customer_email:
+        filters.append("o.customer_email = %s")
+        params.append(customer_email)
+    filters = " AND ".join(filters)
+
+    # Its own connection: the export holds a transaction open while it streams, which
+    # the cached autocommit connection must never do
+    conn = None
+    try:
+        conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD, connect_timeout=5)
+        # One snapshot for both cursors, so every item belongs to an exported order
+        conn.set_session(isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        orders = conn.cursor(name="export_orders")
+        orders.itersize = EXPORT_FETCH_SIZE
+        orders.execute(EXPORT_ORDERS_QUERY.format(filters=filters), params)
+        items = None
+        if include_items:
+            items = conn.cursor(name="export_items")
+            items.itersize = EXPORT_FETCH_SIZE
+            items.execute(EXPORT_ITEMS_QUERY.format(filters=filters), params)
+    except Exception as e:
+        if conn is not None:
+            conn.close()
+        raise HTTPException(status_code=500, detail=f"Failed to export orders: {str(e)}")
+
+    return stream_export(conn, orders, items, fmt)
+
+
+def merge_items(orders, items):
+    # Merge join of the two streams: both are in (created_at, id) order, so an order's
+    # items come next in the items stream and only one order's items are held at a time
+    pending = next(items, None)
+    for order in orders:
+        order_items = []
+        while pending is not None and pending[0] == order[0]:
+            order_items.append(pending[1:])
+            pending = next(items, None)
+        yield order, order_items
+
+
+def stream_export(conn, orders, items, fmt: str) -> Iterator[str]:
+    rows = merge_items(orders, items) if items is not None else ((order, None) for order in orders)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(EXPORT_COLUMNS + (EXPORT_ITEM_COLUMNS if items is not None else []))
+
+    exported = 0
+    try:
+        for order, order_items in rows:
+            fields = [
+                str(order[0]), order[1], order[2], order[3], order[4],
+                order[5].isoformat(), order[6].isoformat() if order[6] else None
+            ]
+            if fmt == "csv":
+                if order_items is None:
+                    writer.writerow(fields)
+                else:
+                    # One line per item; an order without items still gets one, with the item columns empty
+                    for item in order_items or [(None,) * len(EXPORT_ITEM_COLUMNS)]:
+                        writer.writerow(fields + list(item))
+            else:
+                record = dict(zip(EXPORT_COLUMNS, fields), total_amount=float(order[3]))
+                if order_items is not None:
+                    record["items"] = [
+                        {"product_name": i[0], "quantity": i[1], "unit_price": float(i[2]), "subtotal": float(i[3])}
+                        for i in order_items
+                    ]
+                buffer.write(json.dumps(record) + "\n")
+
+            exported += 1
+            # Hand the output over a fetch's worth at a time
+            if exported % EXPORT_FETCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        logger.info(f"Exported {exported} order(s)")
+    finally:
+        conn.close()
+
+
+def create_app():
+    from fastapi import FastAPI, Path, Query
+
+    app = FastAPI(title="Get Order Status Service", version="1.0.0")
+    app.add_api_route("/health", health_check, methods=["GET"])
+
+    # Declared here because their Path/Query parameters need FastAPI. /orders/stats and
+    # /orders/export go first so they aren't taken for an order id.
+    @app.get("/orders/stats", response_model=OrderStatsResponse)
+    async def order_stats(
+        bucket: str = Query("day", pattern="^(day|week|month)$"),
+        days: int = Query(30, ge=1, le=366, description="How far back the buckets go")
+    ):
+        return fetch_stats(bucket, days)
+
+    @app.get("/orders/export")
+    def export(
+        created_from: datetime = Query(..., description="Orders created at or after this time"),
+        created_to: Optional[datetime] = Query(None, description="Orders created before this time"),
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        status: Optional[str] = Query(None),
+        customer_email: Optional[str] = Query(None),
+        include_items: bool = Query(False, description="Embed each order's items")
+    ):
+        from starlette.responses import StreamingResponse
+
+        return StreamingResponse(
+            export_orders(format, created_from, created_to, status, customer_email, include_items),
+            media_type="text/csv" if format == "csv" else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="orders-{created_from:%Y%m%d}.{format}"'}
+        )
+
+    @app.get("/orders/{order_id}", response_model=OrderResponse)
+    async def get_order(order_id: str = Path(..., description="Order ID (UUID)")):
+        return fetch_order(order_id)
+
+    @app.get("/orders", response_model=OrderListResponse)
+    async def list_orders(
+        status: Optional[str] = Query(None),
+        customer_email: Optional[str] = Query(None),
+        limit: int = Query(50, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        include_total: bool = Query(False, description="Also count every matching order"),
+        offset: int = Query(0, ge=0, description="Deprecated, use cursor; ignored when cursor is set")
+    ):
+        return find_orders(status, customer_email, limit, cursor, include_total, offset)
+
+    return app
+
+
+def get_app():
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+
+def get_asgi_handler():
+    global _asgi_handler
+    if _asgi_handler is None:
+        from mangum import Mangum
+        _asgi_handler = Mangum(get_app(), lifespan="off", api_gateway_base_path=API_BASE_PATH)
+    return _asgi_handler
+
+
+def __getattr__(name):
+    # `handler.app` still works for uvicorn and TestClient; the app is built on first access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def json_response(status_code: int, content) -> dict:
+    # The body and headers Mangum returns for a FastAPI JSONResponse
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return {
+        "statusCode": status_code,
+        "headers": {"content-length": str(len(body.encode())), "content-type": "application/json"},
+        "body": body,
+        "isBase64Encoded": False
+    }
+
+
+def fast_path(event) -> Optional[dict]:
+    # Handles GET /orders/{order_id} for a well-formed order id directly; returns None for
+    # everything else so FastAPI serves it
+    method = event.get("requestContext", {}).get("http", {}).get("method")
+    path = event.get("rawPath", "")
+    if path.startswith(API_BASE_PATH):
+        path = path[len(API_BASE_PATH):]
+    prefix, _, order_id = path.rpartition("/")
+    if method != "GET" or prefix != "/orders":
+        return None
+    try:
+        uuid.UUID(order_id)
+    except ValueError:
+        return None
+
+    try:
+        order = fetch_order(order_id)
+    except HTTPException as e:
+        return json_response(e.status_code, {"detail": e.detail})
+    return json_response(200, OrderResponse.model_validate(order).model_dump(mode="json"))
+
+
+def handler(event, context):
+    if FAST_PATH_ENABLED:
+        response = fast_path(event)
+        if response is not None:
+            return response
+    return get_asgi_handler()(event, context)
+
+
+# Load the framework during init, which runs at full CPU, when every request needs it
+if not FAST_PATH_ENABLED:
+    get_asgi_handler()
\ No newline at end of file
@@ -57,6 +57,12 @@ resource "aws_apigatewayv2_route" "create_order" {
   target    = "integrations/${aws_apigatewayv2_integration.create_order.id}"
 }
 
+resource "aws_apigatewayv2_route" "create_orders_batch" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /orders/batch"
+  target    = "integrations/${aws_apigatewayv2_integration.create_order.id}"
+}
+
 resource "aws_apigatewayv2_route" "get_order_status" {
   api_id    = aws_apigatewayv2_api.main.id
   route_key = "GET /orders/{order_id}"
@@ -68,3 +74,15 @@ resource "aws_apigatewayv2_route" "list_orders" {
   route_key = "GET /orders"
   target    = "integrations/${aws_apigatewayv2_integration.get_order_status.id}"
 }
+
+resource "aws_apigatewayv2_route" "order_stats" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /orders/stats"
+  target    = "integrations/${aws_apigatewayv2_integration.get_order_status.id}"
+}
+
+resource "aws_apigatewayv2_route" "export_orders" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /orders/export"
+  target    = "integrations/${aws_apigatewayv2_integration.get_order_status.id}"
+}
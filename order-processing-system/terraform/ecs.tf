@@ -24,6 +24,11 @@ resource "aws_cloudwatch_log_group" "ecs" {
   retention_in_days = 14
 }
 
+locals {
+  # One worker process per whole vCPU unless set explicitly
+  ecs_worker_processes = var.ecs_worker_processes > 0 ? var.ecs_worker_processes : max(1, floor(var.ecs_cpu / 1024))
+}
+
 resource "aws_ecs_task_definition" "order_processor" {
   family                   = "${var.project_name}-order-processor"
   requires_compatibilities = ["FARGATE"]
@@ -37,6 +42,8 @@ resource "aws_ecs_task_definition" "order_processor" {
     name      = "order-processor"
     image     = "${aws_ecr_repository.order_processor.repository_url}:latest"
     essential = true
+    # Time for payments already under way to finish after SIGTERM instead of the default 30 seconds
+    stopTimeout = var.ecs_stop_timeout
 
     environment = [
       { name = "DB_HOST", value = aws_db_instance.main.address },
@@ -46,9 +53,42 @@ resource "aws_ecs_task_definition" "order_processor" {
       { name = "SQS_QUEUE_URL", value = aws_sqs_queue.order_queue.url },
       { name = "SNS_TOPIC_ARN", value = aws_sns_topic.order_events.arn },
       { name = "AWS_REGION", value = var.aws_region },
-      { name = "ENVIRONMENT", value = var.environment }
+      { name = "ENVIRONMENT", value = var.environment },
+      { name = "PROCESSING_MODE", value = var.ecs_processing_mode },
+      { name = "WORKER_CONCURRENCY", value = tostring(var.ecs_worker_concurrency) },
+      { name = "PIPELINE_INTAKE_CONCURRENCY", value = tostring(var.ecs_pipeline_intake_concurrency) },
+      { name = "PIPELINE_PAYMENT_CONCURRENCY", value = tostring(var.ecs_pipeline_payment_concurrency) },
+      { name = "PIPELINE_FULFILLMENT_CONCURRENCY", value = tostring(var.ecs_pipeline_fulfillment_concurrency) },
+      { name = "PIPELINE_QUEUE_SIZE", value = tostring(var.ecs_pipeline_queue_size) },
+      { name = "PIPELINE_MAX_IN_FLIGHT", value = tostring(var.ecs_pipeline_max_in_flight) },
+      { name = "DB_POOL_MAX_SIZE", value = tostring(var.ecs_db_pool_max_size) },
+      { name = "PROCESS_COUNT", value = tostring(local.ecs_worker_processes) },
+      { name = "WORKER_SHUTDOWN_TIMEOUT", value = tostring(var.ecs_stop_timeout - 5) },
+      { name = "SQS_VISIBILITY_TIMEOUT", value = tostring(aws_sqs_queue.order_queue.visibility_timeout_seconds) },
+      { name = "METRICS_PORT", value = tostring(var.ecs_metrics_port) },
+      { name = "METRICS_EMF_ENABLED", value = tostring(var.ecs_emf_metrics_enabled) },
+      { name = "METRICS_NAMESPACE", value = "${var.project_name}/order-processor" },
+      { name = "STATUS_LOG_RETENTION_MONTHS", value = tostring(var.status_log_retention_months) },
+      { name = "STATUS_LOG_ARCHIVE_BUCKET", value = var.status_log_archive_enabled ? aws_s3_bucket.status_log_archive[0].bucket : "" },
+      { name = "ECS_CLUSTER_NAME", value = aws_ecs_cluster.main.name },
+      # Not aws_ecs_service.order_processor.name: the service depends on this task definition
+      { name = "ECS_SERVICE_NAME", value = "${var.project_name}-order-processor" }
     ]
 
+    # Worker process N serves its metrics on ecs_metrics_port + N
+    portMappings = var.ecs_metrics_port > 0 ? [
+      for i in range(local.ecs_worker_processes) : { containerPort = var.ecs_metrics_port + i, protocol = "tcp" }
+    ] : []
+
+    # Fails while fewer than half the worker processes are healthy; always passes with one process
+    healthCheck = {
+      command     = ["CMD", "python", "supervisor.py", "health"]
+      interval    = 30
+      timeout     = 10
+      retries     = 3
+      startPeriod = 60
+    }
+
     logConfiguration = {
       logDriver = "awslogs"
       options = {
@@ -80,8 +120,8 @@ resource "aws_ecs_service" "order_processor" {
 }
 
 resource "aws_appautoscaling_target" "ecs" {
-  max_capacity       = 3
-  min_capacity       = 1
+  max_capacity       = var.ecs_max_count
+  min_capacity       = var.ecs_min_count
   resource_id        = "service/${aws_ecs_cluster.main.name}/${aws_ecs_service.order_processor.name}"
   scalable_dimension = "ecs:service:DesiredCount"
   service_namespace  = "ecs"
@@ -103,3 +143,32 @@ resource "aws_appautoscaling_policy" "ecs_scaling" {
     scale_out_cooldown = 60
   }
 }
+
+# Workers spend most of their time waiting on payments, so CPU stays low while a backlog
+# builds. Each task publishes how long its share of the queue would take at its measured
+# throughput; scale out when that exceeds the target. Both policies stay: the service
+# scales out if either is breached and only scales in once both allow it.
+resource "aws_appautoscaling_policy" "ecs_backlog_scaling" {
+  name               = "${var.project_name}-backlog-scaling"
+  policy_type        = "TargetTrackingScaling"
+  resource_id        = aws_appautoscaling_target.ecs.resource_id
+  scalable_dimension = aws_appautoscaling_target.ecs.scalable_dimension
+  service_namespace  = aws_appautoscaling_target.ecs.service_namespace
+
+  target_tracking_scaling_policy_configuration {
+    customized_metric_specification {
+      metric_name = "BacklogSecondsPerTask"
+      namespace   = "${var.project_name}/order-processor"
+      statistic   = "Average"
+      unit        = "Seconds"
+
+      dimensions {
+        name  = "Service"
+        value = "order-processor"
+      }
+    }
+    target_value       = var.ecs_backlog_target_seconds
+    scale_in_cooldown  = 300
+    scale_out_cooldown = 60
+  }
+}
@@ -96,7 +96,7 @@ resource "aws_iam_role_policy" "ecs_task_policy" {
     Statement = [
       {
         Effect   = "Allow"
-        Action   = ["sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:GetQueueAttributes", "sqs:GetQueueUrl"]
+        Action   = ["sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:ChangeMessageVisibility", "sqs:GetQueueAttributes", "sqs:GetQueueUrl", "sqs:SendMessage"]
         Resource = aws_sqs_queue.order_queue.arn
       },
       {
@@ -113,6 +113,34 @@ resource "aws_iam_role_policy" "ecs_task_policy" {
         Effect   = "Allow"
         Action   = ["logs:CreateLogStream", "logs:PutLogEvents"]
         Resource = "*"
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["ecs:DescribeServices"]
+        Resource = "arn:aws:ecs:${var.aws_region}:${data.aws_caller_identity.current.account_id}:service/${var.project_name}-cluster/${var.project_name}-order-processor"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "ecs_task_status_log_archive" {
+  count = var.status_log_archive_enabled ? 1 : 0
+  name  = "${var.project_name}-ecs-task-status-log-archive"
+  role  = aws_iam_role.ecs_task.id
+
+  # GetObject and ListBucket let the processor confirm an upload before dropping the table
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["s3:PutObject", "s3:GetObject"]
+        Resource = "${aws_s3_bucket.status_log_archive[0].arn}/*"
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["s3:ListBucket"]
+        Resource = aws_s3_bucket.status_log_archive[0].arn
       }
     ]
   })
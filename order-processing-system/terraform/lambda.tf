@@ -23,13 +23,16 @@ resource "aws_lambda_function" "create_order" {
 
   environment {
     variables = {
-      DB_HOST       = aws_db_instance.main.address
-      DB_NAME       = var.db_name
-      DB_USERNAME   = var.db_username
-      DB_PASSWORD   = var.db_password
-      SQS_QUEUE_URL = aws_sqs_queue.order_queue.url
-      ENVIRONMENT   = var.environment
-      AWS_REGION    = var.aws_region
+      DB_HOST            = aws_db_instance.main.address
+      DB_NAME            = var.db_name
+      DB_USERNAME        = var.db_username
+      DB_PASSWORD        = var.db_password
+      SQS_QUEUE_URL      = aws_sqs_queue.order_queue.url
+      ENVIRONMENT        = var.environment
+      AWS_REGION         = var.aws_region
+      ORDER_ENQUEUE_MODE = var.order_enqueue_mode
+      FAST_PATH_ENABLED  = tostring(var.lambda_fast_path_enabled)
+      MESSAGE_FORMAT     = var.sqs_message_format
     }
   }
 
@@ -52,11 +55,12 @@ resource "aws_lambda_function" "get_order_status" {
 
   environment {
     variables = {
-      DB_HOST     = aws_db_instance.main.address
-      DB_NAME     = var.db_name
-      DB_USERNAME = var.db_username
-      DB_PASSWORD = var.db_password
-      ENVIRONMENT = var.environment
+      DB_HOST           = aws_db_instance.main.address
+      DB_NAME           = var.db_name
+      DB_USERNAME       = var.db_username
+      DB_PASSWORD       = var.db_password
+      ENVIRONMENT       = var.environment
+      FAST_PATH_ENABLED = tostring(var.lambda_fast_path_enabled)
     }
   }
 
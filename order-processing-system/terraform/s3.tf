@@ -0,0 +1,36 @@
+# Expired order_status_log months, uploaded by the processor's partition maintenance
+# before it drops them from the database
+resource "aws_s3_bucket" "status_log_archive" {
+  count  = var.status_log_archive_enabled ? 1 : 0
+  bucket = "${var.project_name}-status-log-archive-${data.aws_caller_identity.current.account_id}"
+  tags   = { Name = "${var.project_name}-status-log-archive" }
+}
+
+resource "aws_s3_bucket_versioning" "status_log_archive" {
+  count  = var.status_log_archive_enabled ? 1 : 0
+  bucket = aws_s3_bucket.status_log_archive[0].id
+
+  versioning_configuration {
+    status = "Enabled"
+  }
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "status_log_archive" {
+  count  = var.status_log_archive_enabled ? 1 : 0
+  bucket = aws_s3_bucket.status_log_archive[0].id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "status_log_archive" {
+  count                   = var.status_log_archive_enabled ? 1 : 0
+  bucket                  = aws_s3_bucket.status_log_archive[0].id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
@@ -65,6 +65,146 @@ variable "ecs_desired_count" {
   default     = 1
 }
 
+variable "ecs_min_count" {
+  description = "Minimum number of ECS tasks when auto-scaling"
+  type        = number
+  default     = 1
+}
+
+variable "ecs_max_count" {
+  description = "Maximum number of ECS tasks when auto-scaling"
+  type        = number
+  default     = 3
+}
+
+variable "ecs_backlog_target_seconds" {
+  description = "Target seconds for each ECS task to work through its share of the SQS backlog; the service scales out above it"
+  type        = number
+  default     = 60
+}
+
+variable "ecs_processing_mode" {
+  description = "How the order processor works through messages: pipeline (separate intake, payment and fulfillment stages) or sequential (each worker takes a message through every phase)"
+  type        = string
+  default     = "pipeline"
+
+  validation {
+    condition     = contains(["pipeline", "sequential"], var.ecs_processing_mode)
+    error_message = "ecs_processing_mode must be pipeline or sequential."
+  }
+}
+
+variable "ecs_worker_concurrency" {
+  description = "Sequential mode: orders each ECS worker process handles concurrently"
+  type        = number
+  default     = 10
+}
+
+variable "ecs_pipeline_intake_concurrency" {
+  description = "Pipeline mode: intake (claim) workers per ECS worker process"
+  type        = number
+  default     = 4
+}
+
+variable "ecs_pipeline_payment_concurrency" {
+  description = "Pipeline mode: orders paying or waiting for fulfillment per ECS worker process"
+  type        = number
+  default     = 50
+}
+
+variable "ecs_pipeline_fulfillment_concurrency" {
+  description = "Pipeline mode: fulfillment workers per ECS worker process"
+  type        = number
+  default     = 6
+}
+
+variable "ecs_pipeline_queue_size" {
+  description = "Pipeline mode: orders queued for intake per ECS worker process"
+  type        = number
+  default     = 100
+}
+
+variable "ecs_pipeline_max_in_flight" {
+  description = "Pipeline mode: SQS messages held per ECS worker process (0 allows as many as the stages and intake queue hold)"
+  type        = number
+  default     = 0
+}
+
+variable "ecs_db_pool_max_size" {
+  description = "Maximum pooled PostgreSQL connections per ECS worker process (0 sizes it to the workers that use the database)"
+  type        = number
+  default     = 0
+}
+
+variable "ecs_worker_processes" {
+  description = "Worker processes per ECS task, each with its own SQS poll loop, DB pool and AWS clients (0 starts one per vCPU of ecs_cpu)"
+  type        = number
+  default     = 0
+}
+
+variable "ecs_stop_timeout" {
+  description = "Seconds ECS waits after SIGTERM before killing the order processor; workers give up on in-flight orders 5 seconds before that"
+  type        = number
+  default     = 120
+
+  validation {
+    condition     = var.ecs_stop_timeout >= 10 && var.ecs_stop_timeout <= 120
+    error_message = "ecs_stop_timeout must be between 10 and 120 seconds (the Fargate maximum)."
+  }
+}
+
+variable "ecs_metrics_port" {
+  description = "Port the order processor serves Prometheus metrics on (0 disables it)"
+  type        = number
+  default     = 9100
+}
+
+variable "ecs_emf_metrics_enabled" {
+  description = "Write order processor metrics to CloudWatch Logs in Embedded Metric Format"
+  type        = bool
+  default     = true
+}
+
+variable "status_log_retention_months" {
+  description = "Months of order status history kept attached to order_status_log (0 keeps everything)"
+  type        = number
+  default     = 12
+}
+
+variable "status_log_archive_enabled" {
+  description = "Upload order_status_log months past the retention to an S3 bucket and drop them, instead of only detaching them"
+  type        = bool
+  default     = false
+}
+
+variable "lambda_fast_path_enabled" {
+  description = "Serve POST /orders and GET /orders/{order_id} without going through FastAPI"
+  type        = bool
+  default     = true
+}
+
+variable "order_enqueue_mode" {
+  description = "How create-order enqueues orders: outbox (written with the order, relayed by ECS) or direct (sent to SQS by the Lambda)"
+  type        = string
+  default     = "outbox"
+
+  validation {
+    condition     = contains(["outbox", "direct"], var.order_enqueue_mode)
+    error_message = "order_enqueue_mode must be outbox or direct."
+  }
+}
+
+variable "sqs_message_format" {
+  description = "Order message format: compact (version 2, compressed when large, claim check when too large) or json (version 1)"
+  type        = string
+  default     = "compact"
+
+  validation {
+    condition     = contains(["compact", "json"], var.sqs_message_format)
+    error_message = "sqs_message_format must be compact or json."
+  }
+}
+
 variable "notification_email" {
   description = "Email for order notifications"
   type        = string
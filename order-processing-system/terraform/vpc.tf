@@ -92,6 +92,17 @@ resource "aws_security_group" "ecs" {
   description = "Security group for ECS tasks"
   vpc_id      = aws_vpc.main.id
 
+  # Prometheus scrapes of the processor's /metrics endpoint from inside the VPC
+  dynamic "ingress" {
+    for_each = var.ecs_metrics_port > 0 ? [var.ecs_metrics_port] : []
+    content {
+      from_port   = ingress.value
+      to_port     = ingress.value + local.ecs_worker_processes - 1
+      protocol    = "tcp"
+      cidr_blocks = [var.vpc_cidr]
+    }
+  }
+
   egress {
     from_port   = 0
     to_port     = 0